@@ -7,22 +7,31 @@ from PyQt5.QtWidgets import QLabel
 from pyqtgraph.Qt import QtCore, QtGui, QtWidgets
 
 class GraphicalDOA (pg.GraphicsLayoutWidget):
-    def __init__(self, color='w', show=True, size=(500, 500)):
+    """
+    Historique des angles estimés (le plus récent en haut).
+
+    Les angles sont écrits dans un anneau préalloué de 2 * tracking_length valeurs, chaque angle étant écrit
+    deux fois (à l'indice d'écriture et tracking_length plus loin) : les tracking_length derniers angles sont
+    toujours une tranche contiguë de l'anneau, sans copie ni allocation par angle. updateDATA ne fait que
+    marquer l'historique comme modifié ; la minuterie ne redessine que s'il l'a été, une seule fois quel que
+    soit le nombre d'angles reçus depuis le rafraîchissement précédent.
+    """
+
+    def __init__(self, color='w', show=True, size=(500, 500), tracking_length=1000, refresh_interval=10):
         super().__init__(show=show, size=size)
 
         self.color=color
 
-        self.tracking_length = 1000
+        self.tracking_length = tracking_length
         self.phase_cal = 0
-        self.tracking_angles = np.ones(self.tracking_length) * 180
-        self.tracking_angles[:-1] = -180   # make a line across the plot when tracking begins
+        self.set_history_length(tracking_length, setup=False)
 
         # Configuration de la fenêtre FFT
         self.setup_plot_widget()
 
         # Timer pour mettre à jour le graphique
         self.timer = QTimer()
-        self.timer.setInterval(10)
+        self.timer.setInterval(refresh_interval)
         self.timer.timeout.connect(self.update_plot)
         self.timer.start()
 
@@ -44,10 +53,35 @@ class GraphicalDOA (pg.GraphicsLayoutWidget):
         # Curves
         self.baseCurve = self.p1.plot(pen=pyqtgraph.mkPen(self.color, width=2))  # Red curve
 
+    def set_history_length(self, tracking_length, setup=True):
+        """ Nombre d'angles affichés (l'historique est effacé). """
+        self.tracking_length = tracking_length
+        self.ring = np.full(2 * tracking_length, -180.0)
+        self.write_index = 0  # Position du prochain angle dans la première moitié de l'anneau
+        self.updateDATA(180)  # make a line across the plot when tracking begins
+        self.last_angle = None
+        self.heights = np.arange(tracking_length)
+        if setup:
+            self.p1.setYRange(0, tracking_length)
+
+    @property
+    def tracking_angles(self):
+        """ Les tracking_length derniers angles, du plus ancien au plus récent (vue sur l'anneau). """
+        return self.ring[self.write_index:self.write_index + self.tracking_length]
+
     def update_plot(self):
 
-        self.baseCurve.setData(self.tracking_angles, np.arange(self.tracking_length))
+        # Un seul rafraîchissement pour tous les angles reçus depuis le précédent, aucun si rien n'a changé
+        if not self.dirty:
+            return
+        self.dirty = False
+        self.baseCurve.setData(self.tracking_angles, self.heights)
+        if self.last_angle is not None:
+            self.p1.setTitle(str(round(self.last_angle, 3)) + " °")
 
     def updateDATA(self, tracking_angle):
-        self.tracking_angles = np.append(self.tracking_angles, tracking_angle)
-        self.tracking_angles = self.tracking_angles[1:]
\ No newline at end of file
+        index = self.write_index
+        self.ring[index] = self.ring[index + self.tracking_length] = tracking_angle
+        self.write_index = (index + 1) % self.tracking_length
+        self.last_angle = tracking_angle
+        self.dirty = True
\ No newline at end of file
@@ -8,14 +8,19 @@ import os
 import numpy as np
 import csv
 import pandas as pd
+
+import precision as prec
 warnings.filterwarnings('default')
 
 
 class CustomSDR(adi.ad9361):
-    def __init__(self, uri):
+    def __init__(self, uri, precision=None):
         # Initialise la classe parente avec l'URI spécifié
         super().__init__(uri=uri)
 
+        # Précision des échantillons reçus ('double' ou 'single', cf. precision.py)
+        self.precision = prec.check_precision(precision)
+
         """ Experience properties """
         # Nous avons un signal utile de largeur de bande 1 MHz centré à 2.25 GHz qui arrive sur le Pluto
 
@@ -183,7 +188,8 @@ class CustomSDR(adi.ad9361):
         # Appel de la méthode Rx() de l'objet SDR pour recevoir des données
         data = self.rx()
 
-        return {'Rx_0': data[0], 'Rx_1': data[1]}
+        # pyadi fournit du complex128 : conversion dans la précision de la chaîne de traitement
+        return {'Rx_0': prec.as_complex(data[0], self.precision), 'Rx_1': prec.as_complex(data[1], self.precision)}
 
     def calibrate_rx(self):
         """
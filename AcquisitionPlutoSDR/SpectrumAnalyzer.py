@@ -1,20 +1,29 @@
+import collections
+import threading
 import time
 import numpy as np
 import pyqtgraph
 import pyqtgraph as pg
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import QLabel
+from PyQt5.QtCore import QRectF, QThread, QTimer
+
+import fft_cache
+import precision as prec
+import spectrum
 
 
 class SpectrumAnalyzer(pg.GraphicsLayoutWidget):
-    def __init__(self, cannal, color, span=10, num_samples=2**18, sampling_rate=10e6, show=True, size=(500, 500)):
+    def __init__(self, cannal, color, span=10, num_samples=2**18, sampling_rate=10e6, show=True, size=(500, 500),
+                 precision=None):
         super().__init__(show=show, size=size)
 
+        # Précision de calcul du spectre ('double' ou 'single', cf. precision.py)
+        self.precision = prec.check_precision(precision)
+
         self.ADC_bits = 12
 
-        # Paramètres SNR
-        self.SNRCenterFreq =  0
-        self.SNRSpan = 100 # KHz
+        # Paramètres SNR : canal de mesure de la puissance, du SNR et de la bande occupée
+        self.SNRCenterFreq = 0  # MHz
+        self.SNRSpan = 100  # KHz
 
 
         self.cannal = cannal
@@ -22,7 +31,16 @@ class SpectrumAnalyzer(pg.GraphicsLayoutWidget):
 
         # Variables du spectre à actualiser
         self.freqs = None
-        self.power_rx_dbm = None
+        self.power = None  # Dernier spectre (puissances linéaires ou dBm selon power_is_linear)
+        self.power_is_linear = False
+        # (fréquences, puissances, linéaire) du dernier spectre, publié en une seule affectation : copie que le
+        # thread de calcul ne modifie plus (la trace accumulée est mise à jour en place), lue par les marqueurs
+        self.spectrum = None
+
+        # Courbe prête pour setData (fréquences, puissances), publiée en une seule affectation par le thread de
+        # calcul : le rafraîchissement n'échange que la référence (cf. SpectrumWorkerThread)
+        self.display = None
+        self._displayed = None
 
         # Paramètres d'acquisition
         self.numsamples = num_samples
@@ -35,6 +53,33 @@ class SpectrumAnalyzer(pg.GraphicsLayoutWidget):
         self.y2_axis = +50 # limite haute axe des Y en dB
         self.markers = []
 
+        # Mesures sur chaque spectre (cf. spectrum.SpectrumMeasurements), publiées par le thread de calcul
+        self.measurer = spectrum.SpectrumMeasurements()
+        self.measurements = None
+        self._measurements_shown = None
+
+        # Résolution adaptée au span (cf. spectrum.SpanSpectrum) : transposition et décimation pour un span
+        # étroit, FFT courtes moyennées pour un span large. Sinon, FFT de tout le buffer.
+        self.span_processing = True
+        self.rbw = None  # Résolution en Hz (None : automatique, environ span_spectrum.points bins dans le span)
+        self.span_spectrum = spectrum.SpanSpectrum(self.precision)
+
+        # Mode de trace (dernier spectre, moyennes, max-hold, min-hold, cf. spectrum.TraceAccumulator), remis à
+        # zéro si l'axe des fréquences change
+        self.traces = spectrum.TraceAccumulator()
+        self._trace_axis = None
+
+        # Waterfall associé (cf. Waterfall.py), alimenté par chaque spectre calculé
+        self.waterfall = None
+
+        # Affichage de persistance (cf. spectrum.PersistenceHistogram), activé par set_persistence
+        self.persistence = None
+        self._persistence_shown = None
+
+        # Réduction min/max par colonne de pixels de la bande visible (cf. spectrum.MinMaxDecimator)
+        self.decimator = spectrum.MinMaxDecimator()
+        self.columns = size[0]  # Largeur du tracé en pixels, relue à chaque rafraîchissement
+
         # Configuration de la fenêtre FFT
         self.setup_plot_widget()
 
@@ -62,6 +107,17 @@ class SpectrumAnalyzer(pg.GraphicsLayoutWidget):
         # Curves
         self.baseCurve = self.p1.plot(pen=pyqtgraph.mkPen(self.color))  # Red curve
 
+        # Image de persistance, sous la courbe (masquée tant que la persistance n'est pas activée)
+        self.persistence_image = pg.ImageItem(axisOrder='row-major')
+        self.persistence_image.setZValue(-1)
+        self.persistence_image.setLookupTable(pg.colormap.get('inferno').getLookupTable(nPts=256))
+        self.persistence_image.setVisible(False)
+        self.p1.addItem(self.persistence_image)
+
+        # Texte des marqueurs et des mesures, sous le graphique
+        self.nextRow()
+        self.info_label = self.addLabel('', justify='left')
+
     def add_marker(self):
         """Add a movable marker to the plot."""
         if len(self.markers) < 2:
@@ -72,55 +128,254 @@ class SpectrumAnalyzer(pg.GraphicsLayoutWidget):
             self.update_marker_text()
 
     def update_marker_text(self):
-        """Update text labels for markers showing frequency and amplitude."""
-        for i in reversed(range(self.marker_info_layout.count())):
-            self.marker_info_layout.itemAt(i).widget().setParent(None)
-
-        if len(self.markers) == 2:
-            marker_info = []
-            for i, marker in enumerate(self.markers):
-                freq = marker.value()
-                idx = np.abs(self.freqs - freq).argmin()
-                amplitude_db = self.power_rx0[idx]
-                marker_info.append(f"M{i + 1}: {freq:.2f} kHz, {amplitude_db:.2f} dB")
-                self.marker_info_layout.addWidget(QLabel(marker_info[-1]))
-
-            delta_freq = abs(self.markers[1].value() - self.markers[0].value())
-            delta_amp = abs(
-                float(marker_info[1].split(', ')[1].split()[0]) -
-                float(marker_info[0].split(', ')[1].split()[0])
-            )
-            delta_label = QLabel(f"ΔF: {delta_freq:.2f} kHz, ΔA: {delta_amp:.2f} dB")
-            self.marker_info_layout.addWidget(delta_label)
+        """Update text labels for markers showing frequency and amplitude, and the last measurements."""
+        lines = []
+
+        # Marqueurs : bin le plus proche de chaque marqueur dans le dernier spectre
+        spectrum = self.spectrum
+        if spectrum is not None:
+            freqs, power, linear = spectrum
+            values = [self.measurer.marker(freqs, power, marker.value(), linear) for marker in self.markers]
+            for i, (freq, amplitude_db) in enumerate(values):
+                lines.append(f"M{i + 1}: {freq:.4f} MHz, {amplitude_db:.2f} dBm")
+            if len(values) == 2:
+                delta_freq = abs(values[1][0] - values[0][0]) * 1e3
+                delta_amp = abs(values[1][1] - values[0][1])
+                lines.append(f"ΔF: {delta_freq:.2f} kHz, ΔA: {delta_amp:.2f} dB")
+
+        # Mesures du dernier spectre
+        measurements = self.measurements
+        if measurements is not None:
+            if measurements['peaks']:
+                freq, level = measurements['peaks'][0]
+                lines.append(f"Pic: {freq:.4f} MHz, {level:.2f} dBm")
+            lines.append(f"Bruit: {measurements['noise_floor_dbm']:.2f} dBm/bin, "
+                         f"Canal: {measurements['channel_power_dbm']:.2f} dBm, "
+                         f"SNR: {measurements['snr_db']:.2f} dB, "
+                         f"OBW: {measurements['occupied_bandwidth'] * 1e3:.2f} kHz")
+
+        self.info_label.setText('<br>'.join(lines))
+        self._measurements_shown = measurements
+
+    def set_snr_channel(self, center=None, span=None):
+        """ Canal des mesures de puissance, de SNR et de bande occupée : centre en MHz, largeur en kHz. """
+        if center is not None:
+            self.SNRCenterFreq = center
+        if span is not None:
+            self.SNRSpan = span
 
     def set_span(self, span):
+        self.span = span
         self.p1.setXRange(-span/2, span/2)
 
-    # Calcul de la FFT
-    def compute_fft(self, Rx):
+    def set_trace_mode(self, mode, alpha=None, frames=None):
+        """ 'live', 'average' (poids alpha), 'welch' (frames spectres), 'max_hold' ou 'min_hold'. """
+        self.traces.configure(mode, alpha, frames)
 
-        # Calculer le signal fenêtré
-        windowed_Rx = Rx * np.hanning(len(Rx))
+    def reset_traces(self):
+        """ Remet les traces à zéro (changement de LO, de span ou de fréquence d'échantillonnage). """
+        self.traces.reset()
 
-        # Calculer la FFT pour les deux cannaux
-        fft_Rx = np.fft.fftshift(np.abs(np.fft.fft(windowed_Rx, len(Rx))))
-        fft_Rx /= np.sum(np.hanning(len(Rx)))
+    def set_persistence(self, enabled=True, decay=0.9, levels=200, columns=512):
+        """ Active l'affichage de persistance (histogramme amplitude x fréquence, oubli decay par spectre). """
+        if enabled:
+            self.persistence = spectrum.PersistenceHistogram(columns, levels, (self.y1_axis, self.y2_axis), decay)
+        else:
+            self.persistence = None
+        self._persistence_shown = None
+        self.persistence_image.setVisible(enabled)
 
-        # Conversion des amplitudes en puissances
-        self.power_rx = np.abs(fft_Rx) ** 2
+    def set_rbw(self, rbw):
+        """ Résolution du spectre en Hz (None : automatique selon le span). """
+        self.rbw = rbw
 
-        # Référence de puissances (1mW pour une conversion en dBm)
-        P_ref = 1e-3
-
-        # Conversion des puissances en dBm
-        self.power_rx_dbm = 10 * np.log10(abs(self.power_rx / P_ref) + 1e-9)
+    # Calcul de la FFT
+    def compute_fft(self, Rx):
 
-        # Calculer l'axe des fréquences en kHz
-        xf = np.fft.fftfreq(len(Rx), 1/self.sampling_rate)
-        self.freqs = np.fft.fftshift(xf) / 1e6
+        # Spectre de puissance fenêtré (cf. spectrum.py), converti en dBm seulement pour les points affichés
+        if self.span_processing:
+            # Seule la bande affichée est calculée, à la résolution adaptée au span
+            freqs, power = self.span_spectrum.compute(Rx, self.sampling_rate, self.central_freq * 1e6,
+                                                      min(self.span * 1e6, self.sampling_rate), self.rbw)
+            self.set_spectrum(power, linear=True, freqs=freqs / 1e6)
+        else:
+            self.set_spectrum(spectrum.power_spectrum(Rx, self.precision), linear=True)
+
+    def waterfall_row(self, data, iq=True):
+        """
+        Ajoute au waterfall une entrée du thread de calcul (buffer IQ, ou spectre en dBm si iq est faux).
+
+        Appelé pour chaque entrée reçue, y compris celles que le calcul complet (compute_fft) écarte : le
+        spectre d'un buffer IQ est calculé sur ses premiers échantillons seulement (cf. waterfall_fft_size),
+        soit quelques centaines de µs au lieu de la durée d'un buffer.
+        """
+        waterfall = self.waterfall
+        if waterfall is None:
+            return
+        if iq:
+            power = spectrum.power_spectrum(data[:self.waterfall_fft_size(len(data))], self.precision)
+        else:
+            power = data
+        freqs = fft_cache.fftfreq(len(power), self.sampling_rate, dtype=prec.real_dtype(self.precision), scale=1e6)
+        waterfall.add_spectrum(freqs, power, self.central_freq - self.span / 2, self.central_freq + self.span / 2,
+                               linear=iq)
+
+    def waterfall_fft_size(self, num_samples, max_size=2**16):
+        """ Taille (puissance de 2) de la FFT du waterfall : environ 4 bins par colonne sur le span affiché. """
+        span = min(self.span * 1e6, self.sampling_rate)
+        size = 2 ** int(np.ceil(np.log2(4 * self.waterfall.ring.columns * self.sampling_rate / span)))
+        return int(min(max(size, 1024), max_size, 2 ** int(np.log2(num_samples))))
+
+    def set_spectrum(self, power, linear=False, freqs=None):
+        """ Affiche un spectre en dBm (ou en puissances linéaires si linear) calculé par compute_fft ou par un processus de calcul. """
+        # Calculer l'axe des fréquences en MHz (spectre centré de tout le buffer, si l'axe n'est pas fourni)
+        if freqs is None:
+            freqs = fft_cache.fftfreq(len(power), self.sampling_rate,
+                                      dtype=prec.real_dtype(self.precision), scale=1e6)
+        low = self.central_freq - self.span / 2
+        high = self.central_freq + self.span / 2
+
+        # La persistance reçoit chaque spectre, avant le mode de trace (le waterfall est alimenté à part,
+        # pour chaque buffer : cf. waterfall_row)
+        persistence = self.persistence
+        if persistence is not None:
+            persistence.add(freqs, power, low, high, linear)
+
+        # Accumulation selon le mode de trace ; un nouvel axe des fréquences (span, fréquence
+        # d'échantillonnage, unité) fait repartir la trace
+        axis = (len(freqs), float(freqs[0]), float(freqs[-1]), linear)
+        if axis != self._trace_axis:
+            self.traces.reset()
+            self._trace_axis = axis
+        # Copie publiée : la trace est réécrite en place par le spectre suivant
+        power = self.traces.update(power).copy()
+
+        self.power = power
+        self.power_is_linear = linear
+        self.freqs = freqs
+        self.spectrum = (freqs, power, linear)
+
+        # Mesures (pics, bruit, canal) sur la trace
+        self.measurements = self.measurer.measure(freqs, power, low, high, self.SNRCenterFreq,
+                                                  self.SNRSpan / 1e3, linear)
+
+        # Courbe à afficher, publiée en dernier
+        self.display = self.display_arrays(freqs, power, linear)
+
+    def display_arrays(self, freqs, power, linear=False):
+        """
+        Tableaux (x, y) passés à setData : une paire (min, max) par colonne de pixels de la bande visible,
+        en dBm. Le coût ne dépend que du nombre de bins visibles, la conversion en dB du nombre de points tracés.
+        """
+        low = self.central_freq - self.span / 2
+        high = self.central_freq + self.span / 2
+        x, y = self.decimator.decimate(power, freqs, low, high, max(1, self.columns))
+        if linear:
+            y = spectrum.to_dbm(y)
+        return x, y
 
     def update_plot(self):
 
-        if self.power_rx_dbm is not None and self.freqs is not None:
+        # Largeur du tracé en pixels (lue ici, dans le thread de l'interface)
+        self.columns = int(self.p1.vb.width()) or self.columns
+
+        # Seule la dernière courbe publiée est affichée, et seulement si elle a changé
+        display = self.display
+        if display is not None and display is not self._displayed:
+            self.baseCurve.setData(*display)
+            self._displayed = display
+
+        # Texte des marqueurs et des mesures, si de nouvelles mesures ont été publiées
+        if self.measurements is not self._measurements_shown:
+            self.update_marker_text()
 
-            self.baseCurve.setData(self.freqs, self.power_rx_dbm)
\ No newline at end of file
+        # Dernier histogramme de persistance publié
+        persistence = self.persistence
+        frames = persistence.frames if persistence is not None else None
+        if persistence is not None and frames != self._persistence_shown:
+            # frames lu avant image() : une publication arrivée entre les deux sera affichée au prochain tour
+            image = persistence.image()
+            if image is not None:
+                self.persistence_image.setImage(image, autoLevels=False, levels=(0, persistence.saturation()))
+                (first, last), (levels, width) = persistence.extent, image.shape
+                half_column = (last - first) / max(1, width - 1) / 2
+                bottom, top = persistence.amplitude_range
+                self.persistence_image.setRect(QRectF(first - half_column, bottom,
+                                                      last - first + 2 * half_column, top - bottom))
+                self._persistence_shown = frames
+
+
+########################################################################################################################
+################################################# Class Thread #########################################################
+########################################################################################################################
+
+class SpectrumWorkerThread(QThread):
+    """
+    Calcule les spectres des SpectrumAnalyzer hors du thread de l'interface.
+
+    Seule la dernière trame reçue est traitée (les trames arrivées pendant un calcul sont écartées). Les
+    analyseurs publient une courbe prête à afficher que leur minuterie de rafraîchissement se contente
+    de passer à setData. Sans trame, le thread attend un threading.Event signalé par set_new_data et
+    set_spectra (pas de réveil périodique).
+
+    Le waterfall reçoit en revanche chaque trame : les entrées sont aussi placées dans une file (backlog),
+    vidée avant chaque calcul complet par le chemin peu coûteux SpectrumAnalyzer.waterfall_row. Si la file
+    déborde (plus de max_backlog entrées en attente), les plus anciennes sont perdues et comptées dans
+    Waterfall.dropped_rows.
+    """
+
+    def __init__(self, analyzers, max_backlog=64):
+        super().__init__()
+        self.analyzers = analyzers  # Un SpectrumAnalyzer par cannal
+        self.pending = None  # Dernière entrée : ('iq', buffers) ou ('dbm', spectres calculés par le pool)
+        self.backlog = collections.deque(maxlen=max_backlog)  # Entrées pas encore ajoutées aux waterfalls
+        self.new_data = threading.Event()
+        self._running = False
+
+    def run(self):
+        self._running = True
+        last_pending = None
+        while self._running:
+            # Effacé avant la lecture : une entrée publiée pendant le calcul signale à nouveau l'événement
+            self.new_data.clear()
+
+            # Chaque entrée reçue donne une ligne de waterfall, même si son calcul complet est écarté
+            while self.backlog:
+                kind, arrays = self.backlog.popleft()
+                for analyzer, data in zip(self.analyzers, arrays):
+                    analyzer.waterfall_row(data, kind == 'iq')
+
+            pending = self.pending
+            if pending is None or pending is last_pending:
+                self.new_data.wait()
+                continue
+            last_pending = pending
+
+            kind, arrays = pending
+            for analyzer, data in zip(self.analyzers, arrays):
+                if kind == 'iq':
+                    analyzer.compute_fft(data)
+                else:
+                    analyzer.set_spectrum(data)
+
+    def stop(self):
+        self._running = False
+        self.new_data.set()
+
+    def set_new_data(self, *buffers):
+        """ Buffers IQ (un par analyseur) dont le spectre est à calculer. """
+        self.publish(('iq', buffers))
+
+    def publish(self, entry):
+        # File pleine : l'entrée la plus ancienne est perdue pour les waterfalls (deque à taille maximale)
+        if len(self.backlog) == self.backlog.maxlen:
+            for analyzer in self.analyzers:
+                if analyzer.waterfall is not None:
+                    analyzer.waterfall.dropped_rows += 1
+        self.backlog.append(entry)
+        self.pending = entry
+        self.new_data.set()
+
+    def set_spectra(self, *spectra):
+        """ Spectres en dBm déjà calculés (un par analyseur), à préparer pour l'affichage. """
+        self.publish(('dbm', spectra))
\ No newline at end of file
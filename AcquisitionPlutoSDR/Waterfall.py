@@ -0,0 +1,114 @@
+import pyqtgraph as pg
+from PyQt5.QtCore import QRectF, QTimer
+
+import spectrum
+
+
+class Waterfall(pg.GraphicsLayoutWidget):
+    """
+    Waterfall (spectrogramme défilant) d'un cannal, affiché à côté de son SpectrumAnalyzer.
+
+    Les lignes sont écrites par le thread de calcul des spectres dans un anneau préalloué
+    (cf. spectrum.SpectrogramRing), une par buffer acquis (cf. SpectrumWorkerThread) ; la minuterie de
+    rafraîchissement ne fait que passer à l'ImageItem la tranche des depth dernières lignes, si de nouvelles
+    lignes ont été écrites. Les buffers perdus par le thread de calcul (file pleine) sont comptés dans
+    dropped_rows et affichés dans le titre de l'axe vertical.
+    """
+
+    def __init__(self, cannal, depth=256, columns=512, row_rate=None, colormap='viridis', levels=(-100, 0),
+                 show=True, size=(500, 300)):
+        super().__init__(show=show, size=size)
+
+        self.cannal = cannal
+
+        # Anneau des lignes : depth lignes de columns colonnes au plus, row_rate lignes par seconde au plus
+        # (None : une ligne par buffer acquis)
+        self.ring = spectrum.SpectrogramRing(depth, columns, 1 / row_rate if row_rate else 0.0)
+
+        # Échelle de couleurs
+        self.colormap = colormap
+        self.levels = levels  # Puissances (dB) des deux extrémités de l'échelle
+
+        self._shown_rows = None  # Version (nombre de lignes) de l'image affichée
+        self._shown_extent = None
+
+        self.dropped_rows = 0  # Buffers perdus par le thread de calcul (incrémenté par SpectrumWorkerThread)
+        self._shown_dropped = 0
+
+        self.setup_plot_widget()
+
+        # Timer pour mettre à jour l'image
+        self.timer = QTimer()
+        self.timer.setInterval(50)
+        self.timer.timeout.connect(self.update_plot)
+        self.timer.start()
+
+    def setup_plot_widget(self):
+
+        self.p1 = self.addPlot()
+        self.p1.setLabel('bottom', "Frequency (MHz)", **{'color': '#FFF', 'size': '40pt'})
+        self.p1.setLabel('left', self.cannal + " (lignes)", **{'color': '#FFF', 'size': '40pt'})
+
+        # Image en ordre ligne-majeur : une ligne de l'anneau par ligne de pixels, la plus récente en haut
+        self.image_item = pg.ImageItem(axisOrder='row-major')
+        self.p1.addItem(self.image_item)
+        self.set_colormap(self.colormap)
+
+    ########################################################################################################################
+    ############################################### Paramètres #############################################################
+    ########################################################################################################################
+
+    def set_depth(self, depth):
+        """ Nombre de lignes affichées (l'historique est effacé). """
+        self.ring.configure(depth=depth)
+
+    def set_row_rate(self, row_rate):
+        """ Nombre maximal de lignes par seconde (None : une ligne par buffer). """
+        self.ring.configure(row_interval=1 / row_rate if row_rate else 0.0)
+
+    def set_levels(self, low, high):
+        self.levels = (low, high)
+        self._shown_rows = None
+
+    def set_colormap(self, name):
+        self.colormap = name
+        self.image_item.setLookupTable(pg.colormap.get(name).getLookupTable(nPts=256))
+
+    ########################################################################################################################
+    ############################################### Données ################################################################
+    ########################################################################################################################
+
+    def add_spectrum(self, freqs, power, low, high, linear=False):
+        """ Ajoute un spectre (appelé par le thread de calcul des spectres, cf. SpectrumAnalyzer.waterfall_row). """
+        self.ring.add(freqs, power, low, high, linear)
+
+    def update_plot(self):
+
+        dropped = self.dropped_rows
+        if dropped != self._shown_dropped:
+            self.p1.setLabel('left', "%s (lignes, %d perdues)" % (self.cannal, dropped),
+                             **{'color': '#FFF', 'size': '40pt'})
+            self._shown_dropped = dropped
+
+        # Seulement si de nouvelles lignes ont été écrites (ou si l'échelle a changé)
+        rows = self.ring.rows
+        if rows == self._shown_rows:
+            return
+        image = self.ring.image()  # Copie (cf. SpectrogramRing.image)
+        if image is None:
+            return
+
+        self.image_item.setImage(image, autoLevels=False, levels=self.levels)
+        self._shown_rows = rows
+
+        # Position de l'image dans le repère du graphique : fréquences en x, lignes en y
+        extent = (self.ring.extent, image.shape)
+        if extent != self._shown_extent:
+            (first, last), (depth, width) = extent
+            # extent donne le centre des colonnes extrêmes : l'image déborde d'une demi-colonne de chaque côté
+            half_column = (last - first) / max(1, width - 1) / 2
+            low, high = first - half_column, last + half_column
+            self.image_item.setRect(QRectF(low, 0, high - low, depth))
+            self.p1.setXRange(low, high)
+            self.p1.setYRange(0, depth)
+            self._shown_extent = extent
@@ -9,6 +9,8 @@ import pyarrow as pa
 import pyarrow.parquet as pq
 import os
 import threading
+
+import precision as prec
 class AcquisitionThread(QThread):
     data_received = pyqtSignal(object, object)
 
@@ -16,9 +18,16 @@ class AcquisitionThread(QThread):
         super().__init__(parent)
         self.sdr = sdr
 
+        # Type des échantillons reçus (complex64 en précision simple, complex128 sinon)
+        self.sample_dtype = prec.complex_dtype(getattr(sdr, 'precision', None))
+
         # Initialiser la variable de classe qui contiendra les échantillons concaténés
-        self.Rx0_combined_samples = np.array([], dtype=complex)
-        self.Rx1_combined_samples = np.array([], dtype=complex)
+        self.Rx0_combined_samples = np.array([], dtype=self.sample_dtype)
+        self.Rx1_combined_samples = np.array([], dtype=self.sample_dtype)
+
+        # Consommateur appelé dans ce thread pour chaque trame (None : aucun), avant l'émission du signal : le pool
+        # de processus de calcul y copie la trame en mémoire partagée sans passer par le thread de l'interface
+        self.frame_sink = None
 
         #Les variables d'état
         self._running = False
@@ -34,6 +43,9 @@ class AcquisitionThread(QThread):
         self.sdr.calibrate_rx()
         while self._running:
             data = self.sdr.receive_data()
+            frame_sink = self.frame_sink
+            if frame_sink is not None:
+                frame_sink(data['Rx_0'], data['Rx_1'])
             self.data_received.emit(data['Rx_0'], data['Rx_1'])
             if self._scheduleSaving:
                 self.append_samples(data['Rx_0'], data['Rx_1'])
@@ -64,7 +76,7 @@ class AcquisitionThread(QThread):
         Paramètre:
             max_size_bytes (int): Taille maximale autorisée en octets pour les échantillons combinés.
         """
-        # Préparer les données à écrire
+        # Préparer les données à écrire (float32 en précision simple, float64 sinon)
         combined_data = np.column_stack((np.real(self.Rx0_combined_samples), np.imag(self.Rx0_combined_samples), np.real(self.Rx1_combined_samples), np.imag(self.Rx1_combined_samples)))
         header = 'Rx0_I, Rx0_Q, Rx1_I, Rx1_Q'
 
@@ -75,8 +87,8 @@ class AcquisitionThread(QThread):
         if current_size > max_size_bytes:
             TimeStamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             self.save_IQSamples_to_parquet_thread(combined_data, header, TimeStamp)
-            self.Rx0_combined_samples = np.array([], dtype=complex)
-            self.Rx1_combined_samples = np.array([], dtype=complex)
+            self.Rx0_combined_samples = np.array([], dtype=self.sample_dtype)
+            self.Rx1_combined_samples = np.array([], dtype=self.sample_dtype)
 
 ########################################################################################################################
     def append_samples(self, Rx0, Rx1):
@@ -0,0 +1,324 @@
+"""
+Micro-benchmarks des fonctions DSP de l'estimateur et de l'analyseur de spectre.
+
+Chaque fonction est mesurée pour des buffers de 2^12 à 2^20 échantillons, pour chaque bibliothèque FFT
+disponible (cf. fft_cache.available_backends) et chaque précision (cf. precision.py). Pour chaque cas sont
+relevés le débit (appels par seconde), la meilleure durée d'un appel et la mémoire allouée par appel
+(pic et mémoire conservée, mesurés avec tracemalloc qui suit aussi les tableaux numpy).
+
+Les résultats sont écrits en JSON et peuvent être comparés à une référence enregistrée : un cas dont le
+débit baisse de plus de --tolerance est signalé et le script se termine avec le code 1.
+
+Exemples:
+    python benchmark.py --output bench.json
+    python benchmark.py --save-baseline benchmarks_baseline.json
+    python benchmark.py --baseline benchmarks_baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import fft_cache
+import kernels
+import precision as prec
+import spectrum
+from dsp import MonopulseAngleEstimator
+
+# Tailles de buffer mesurées par défaut (2^12 à 2^20)
+DEFAULT_SIZES = [2 ** n for n in range(12, 21)]
+
+# Le balayage de calibration (360 pas de deux FFT) est limité par défaut aux petits buffers
+DEFAULT_SCAN_MAX_SIZE = 2 ** 16
+
+
+def make_signals(size, precision, seed=0):
+    """ Deux voies Rx simulées : une porteuse déphasée de 30° et un bruit, à l'échelle de l'ADC (12 bits). """
+    rng = np.random.default_rng(seed)
+    t = np.arange(size)
+    tone = 500 * np.exp(2j * np.pi * 0.05 * t)
+    noise = rng.normal(scale=10, size=(2, size)) + 1j * rng.normal(scale=10, size=(2, size))
+    Rx_0 = prec.as_complex(tone + noise[0], precision)
+    Rx_1 = prec.as_complex(tone * np.exp(1j * np.deg2rad(30)) + noise[1], precision)
+    return Rx_0, Rx_1
+
+
+########################################################################################################################
+################################################# Cas mesurés ##########################################################
+########################################################################################################################
+
+def _estimator(Rx_0, Rx_1, precision):
+    estimator = MonopulseAngleEstimator(precision=precision)
+    estimator.profiler.enabled = False
+    estimator.set_new_data(Rx_0, Rx_1)
+    return estimator
+
+
+def case_fft(Rx_0, Rx_1, precision):
+    estimator = _estimator(Rx_0, Rx_1, precision)
+    return lambda: estimator.fft(Rx_0)
+
+
+def case_dbfs(Rx_0, Rx_1, precision):
+    estimator = _estimator(Rx_0, Rx_1, precision)
+    s_shift = estimator.fft(Rx_0)
+    return lambda: estimator.dbfs(s_shift)
+
+
+def case_monopulse_angle(Rx_0, Rx_1, precision):
+    estimator = _estimator(Rx_0, Rx_1, precision)
+    sum_spectrum, delta_spectrum = estimator.fft(Rx_0 + Rx_1), estimator.fft(Rx_0 - Rx_1)
+    return lambda: estimator.monopulse_angle(sum_spectrum, delta_spectrum)
+
+
+def case_tracking(Rx_0, Rx_1, precision):
+    estimator = _estimator(Rx_0, Rx_1, precision)
+    return estimator.tracking
+
+
+def case_scan_for_DOA(Rx_0, Rx_1, precision):
+    estimator = _estimator(Rx_0, Rx_1, precision)
+    return estimator.scan_for_DOA
+
+
+def case_scan_for_DOA_hierarchical(Rx_0, Rx_1, precision):
+    estimator = _estimator(Rx_0, Rx_1, precision)
+    return estimator.scan_for_DOA_hierarchical
+
+
+def case_process_batch(Rx_0, Rx_1, precision):
+    # Le buffer découpé en 16 trames traitées en un appel
+    estimator = _estimator(Rx_0, Rx_1, precision)
+    Rx_0, Rx_1 = Rx_0.reshape(16, -1), Rx_1.reshape(16, -1)
+    return lambda: estimator.process_batch(Rx_0, Rx_1)
+
+
+def _compute_fft(Rx_0, precision, span=10e6, span_processing=True):
+    # Calcul de SpectrumAnalyzer.compute_fft puis set_spectrum, sans le widget (cf. SpectrumAnalyzer.py) :
+    # spectre de la bande affichée (SpanSpectrum, chemin par défaut) ou de tout le buffer, trace, mesures,
+    # réduction à 1000 colonnes et dBm des seuls points affichés
+    sampling_rate = 10e6
+    span_spectrum = spectrum.SpanSpectrum(precision)
+    traces = spectrum.TraceAccumulator()
+    measurer = spectrum.SpectrumMeasurements()
+    decimator = spectrum.MinMaxDecimator()
+    full_freqs = fft_cache.fftfreq(len(Rx_0), sampling_rate, dtype=prec.real_dtype(precision), scale=1e6)
+    low, high = -span / 2e6, span / 2e6
+
+    def compute_fft():
+        if span_processing:
+            freqs, power = span_spectrum.compute(Rx_0, sampling_rate, 0.0, span, None)
+            freqs = freqs / 1e6
+        else:
+            freqs, power = full_freqs, spectrum.power_spectrum(Rx_0, precision)
+        power = traces.update(power).copy()
+        measurer.measure(freqs, power, low, high, 0.0, 0.1, True)
+        x, y = decimator.decimate(power, freqs, low, high, 1000)
+        return x, spectrum.to_dbm(y)
+
+    return compute_fft
+
+
+def case_compute_fft(Rx_0, Rx_1, precision):
+    # Span de 10 MHz à 10 MS/s : FFT moyennées (Welch) de la bande affichée
+    return _compute_fft(Rx_0, precision)
+
+
+def case_compute_fft_narrow_span(Rx_0, Rx_1, precision):
+    # Span de 1 MHz : transposition, filtre polyphase et décimation avant les FFT
+    return _compute_fft(Rx_0, precision, span=1e6)
+
+
+def case_compute_fft_full_buffer(Rx_0, Rx_1, precision):
+    # Spectre de tout le buffer (span_processing désactivé)
+    return _compute_fft(Rx_0, precision, span_processing=False)
+
+
+CASES = {
+    'MonopulseAngleEstimator.fft': case_fft,
+    'MonopulseAngleEstimator.dbfs': case_dbfs,
+    'MonopulseAngleEstimator.monopulse_angle': case_monopulse_angle,
+    'MonopulseAngleEstimator.tracking': case_tracking,
+    'MonopulseAngleEstimator.scan_for_DOA': case_scan_for_DOA,
+    'MonopulseAngleEstimator.scan_for_DOA_hierarchical': case_scan_for_DOA_hierarchical,
+    'MonopulseAngleEstimator.process_batch': case_process_batch,
+    'SpectrumAnalyzer.compute_fft': case_compute_fft,
+    'SpectrumAnalyzer.compute_fft_narrow_span': case_compute_fft_narrow_span,
+    'SpectrumAnalyzer.compute_fft_full_buffer': case_compute_fft_full_buffer,
+}
+
+# Cas limités à --scan-max-size échantillons
+SCAN_CASES = ('MonopulseAngleEstimator.scan_for_DOA', 'MonopulseAngleEstimator.scan_for_DOA_hierarchical')
+
+
+########################################################################################################################
+################################################# Mesures ##############################################################
+########################################################################################################################
+
+def measure(func, min_time=0.2, min_repeats=3):
+    """
+    Mesure une fonction sans argument.
+
+    Un premier appel (non mesuré) crée les plans FFT et compile les noyaux. Les appels sont ensuite répétés
+    pendant au moins min_time secondes (et au moins min_repeats fois).
+
+    Retourne:
+    - Un dictionnaire : appels par seconde, meilleure et moyenne durée d'un appel (s), pic de mémoire allouée
+      pendant un appel et mémoire conservée après l'appel (octets).
+    """
+    func()
+
+    durations = []
+    start = time.perf_counter()
+    while len(durations) < min_repeats or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - t0)
+
+    # Mémoire allouée par un appel (mesurée à part : tracemalloc ralentit les appels)
+    tracemalloc.start()
+    func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations = np.array(durations)
+    return {'ops_per_s': float(1 / durations.mean()),
+            'best_s': float(durations.min()),
+            'mean_s': float(durations.mean()),
+            'calls': len(durations),
+            'alloc_peak_bytes': int(peak),
+            'alloc_retained_bytes': int(retained)}
+
+
+def result_key(result):
+    return f"{result['benchmark']}|{result['size']}|{result['backend']}|{result['precision']}"
+
+
+def run_suite(sizes=None, backends=None, precisions=None, cases=None, scan_max_size=DEFAULT_SCAN_MAX_SIZE,
+              min_time=0.2, verbose=True):
+    """ Exécute tous les cas demandés et retourne la liste des résultats. """
+    sizes = sizes or DEFAULT_SIZES
+    backends = backends or fft_cache.available_backends()
+    precisions = precisions or list(prec.PRECISIONS)
+    cases = cases or list(CASES)
+
+    default_backend = fft_cache.shared_cache.backend
+    results = []
+    try:
+        for backend in backends:
+            # Les fonctions mesurées utilisent les plans FFT du cache partagé
+            fft_cache.shared_cache.backend = backend
+            fft_cache.shared_cache.clear()
+
+            for precision in precisions:
+                for size in sizes:
+                    Rx_0, Rx_1 = make_signals(size, precision)
+                    for name in cases:
+                        if name in SCAN_CASES and size > scan_max_size:
+                            continue
+
+                        result = {'benchmark': name, 'size': size, 'backend': backend, 'precision': precision}
+                        result.update(measure(CASES[name](Rx_0, Rx_1, precision), min_time))
+                        results.append(result)
+
+                        if verbose:
+                            print(f"{name:<52}{size:>9}{backend:>8}{precision:>8}"
+                                  f"{result['ops_per_s']:>12.1f} op/s{result['alloc_peak_bytes'] / 1e6:>10.2f} Mo")
+    finally:
+        fft_cache.shared_cache.backend = default_backend
+        fft_cache.shared_cache.clear()
+
+    return results
+
+
+def environment():
+    """ Description de la machine et des bibliothèques (les mesures ne sont comparables qu'à environnement égal). """
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'kernels_backend': kernels.BACKEND,
+            'fft_backends': fft_cache.available_backends(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compare des résultats à une référence.
+
+    Retourne:
+    - La liste des ralentissements : (clé, débit de référence, débit mesuré, variation relative), pour les cas
+      dont le débit a baissé de plus de tolerance (0.2 : -20 %).
+    """
+    reference = {result_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = reference.get(result_key(result))
+        if old is None:
+            continue
+        change = result['ops_per_s'] / old['ops_per_s'] - 1
+        if change < -tolerance:
+            regressions.append((result_key(result), old['ops_per_s'], result['ops_per_s'], change))
+    return regressions
+
+
+########################################################################################################################
+################################################# Ligne de commande ####################################################
+########################################################################################################################
+
+def parse_sizes(text):
+    """ '12-20' (plage d'exposants de 2) ou liste séparée par des virgules (exposants si <= 30, sinon tailles). """
+    if '-' in text:
+        low, high = (int(value) for value in text.split('-'))
+        return [2 ** n for n in range(low, high + 1)]
+    return [2 ** value if value <= 30 else value for value in (int(value) for value in text.split(','))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks des fonctions DSP")
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help="exposants de 2 (ex: 12-20 ou 12,16) ou tailles séparées par des virgules")
+    parser.add_argument('--backends', nargs='+', default=None, help="bibliothèques FFT (défaut : toutes)")
+    parser.add_argument('--precisions', nargs='+', default=None, choices=list(prec.PRECISIONS))
+    parser.add_argument('--cases', nargs='+', default=None, choices=list(CASES))
+    parser.add_argument('--scan-max-size', type=int, default=DEFAULT_SCAN_MAX_SIZE,
+                        help="taille maximale pour les balayages de calibration")
+    parser.add_argument('--min-time', type=float, default=0.2, help="durée minimale de mesure par cas (s)")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--baseline', help="fichier JSON de référence à comparer")
+    parser.add_argument('--save-baseline', help="enregistre les résultats comme nouvelle référence")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="baisse de débit tolérée (0.2 : -20 %%)")
+    args = parser.parse_args(argv)
+
+    report = {'environment': environment(),
+              'results': run_suite(args.sizes, args.backends, args.precisions, args.cases, args.scan_max_size,
+                                   args.min_time)}
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        if baseline['environment'].get('platform') != report['environment']['platform']:
+            print("Attention : la référence a été mesurée sur une autre machine")
+
+        regressions = compare(report['results'], baseline, args.tolerance)
+        for key, old, new, change in regressions:
+            print(f"RALENTISSEMENT {key} : {old:.1f} -> {new:.1f} op/s ({change:+.0%})")
+        if regressions:
+            return 1
+        print("Aucun ralentissement par rapport à la référence")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+
+# Paramètres RF dont dépend la calibration de phase
+RF_KEYS = ('rx_lo', 'rx_gain0', 'rx_gain1', 'sample_rate')
+
+
+def wrap_phase(phase_deg):
+    """ Ramène un déphasage dans [-180, 180[. """
+    return (phase_deg + 180) % 360 - 180
+
+
+class CalibrationCache:
+    """
+    Cache sur disque des calibrations de phase, indexées par configuration RF.
+
+    Chaque entrée contient la configuration (rx_lo en Hz, gains des deux voies Rx en dB,
+    fréquence d'échantillonnage en Hz), le déphasage phase_cal en degrés et la date de mesure.
+    Une entrée est réutilisée si les gains et la fréquence d'échantillonnage sont identiques,
+    si elle a moins de max_age secondes et si son LO est à moins de lo_tolerance Hz du LO
+    courant. À défaut, le déphasage est interpolé entre les deux entrées qui encadrent le LO
+    courant si elles sont distantes de moins de max_interpolation_span Hz.
+    """
+
+    def __init__(self, path=None, max_age=24 * 3600, lo_tolerance=10e3, max_interpolation_span=20e6):
+        if path is None:
+            path = os.path.join(os.getcwd(), "calibration", "phase_calibration.json")
+        self.path = path
+        self.max_age = max_age
+        self.lo_tolerance = lo_tolerance
+        self.max_interpolation_span = max_interpolation_span
+
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    ####################################################################################################################
+    ############################################### Fichier ############################################################
+    ####################################################################################################################
+
+    def load(self):
+        """ Lit les entrées du fichier (liste vide si le fichier est absent ou illisible). """
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def save(self):
+        """ Écrit les entrées dans un fichier temporaire puis le renomme (pas de fichier tronqué en cas d'arrêt). """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.entries, file, indent=2)
+        os.replace(temp_path, self.path)
+
+    ####################################################################################################################
+    ########################################### Recherche / Ajout ######################################################
+    ####################################################################################################################
+
+    def _same_setup(self, entry, rf_config):
+        """ Mêmes gains et même fréquence d'échantillonnage (le LO est traité à part). """
+        return (entry['rx_gain0'] == rf_config['rx_gain0'] and entry['rx_gain1'] == rf_config['rx_gain1']
+                and abs(entry['sample_rate'] - rf_config['sample_rate']) <= 1e-6 * rf_config['sample_rate'])
+
+    def candidates(self, rf_config, now=None):
+        """ Entrées récentes compatibles avec rf_config, triées par LO. """
+        now = time.time() if now is None else now
+        with self.lock:
+            entries = [entry for entry in self.entries
+                       if now - entry['timestamp'] <= self.max_age and self._same_setup(entry, rf_config)]
+        return sorted(entries, key=lambda entry: entry['rx_lo'])
+
+    def lookup(self, rf_config, now=None):
+        """
+        Cherche une calibration utilisable pour rf_config.
+
+        Retourne:
+        - (phase_cal, source) avec source 'cache' ou 'interpolation', ou None si aucune entrée ne convient.
+        """
+        entries = self.candidates(rf_config, now)
+        lo = rf_config['rx_lo']
+
+        # Correspondance directe : l'entrée la plus récente dont le LO est dans la tolérance
+        matches = [entry for entry in entries if abs(entry['rx_lo'] - lo) <= self.lo_tolerance]
+        if matches:
+            return max(matches, key=lambda entry: entry['timestamp'])['phase_cal'], 'cache'
+
+        # Interpolation linéaire (sur la phase déroulée) entre les deux entrées qui encadrent le LO
+        below = [entry for entry in entries if entry['rx_lo'] < lo]
+        above = [entry for entry in entries if entry['rx_lo'] > lo]
+        if below and above:
+            low, high = below[-1], above[0]
+            if high['rx_lo'] - low['rx_lo'] <= self.max_interpolation_span:
+                ratio = (lo - low['rx_lo']) / (high['rx_lo'] - low['rx_lo'])
+                delta = wrap_phase(high['phase_cal'] - low['phase_cal'])
+                return wrap_phase(low['phase_cal'] + ratio * delta), 'interpolation'
+
+        return None
+
+    def store(self, rf_config, phase_cal, timestamp=None):
+        """ Ajoute (ou remplace) la calibration mesurée pour rf_config et enregistre le fichier. """
+        entry = {key: float(rf_config[key]) for key in RF_KEYS}
+        entry['phase_cal'] = float(phase_cal)
+        entry['timestamp'] = time.time() if timestamp is None else timestamp
+
+        with self.lock:
+            self.entries = [old for old in self.entries
+                            if not (self._same_setup(old, rf_config)
+                                    and abs(old['rx_lo'] - rf_config['rx_lo']) <= self.lo_tolerance)]
+            self.entries.append(entry)
+            self.save()
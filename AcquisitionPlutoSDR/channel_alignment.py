@@ -0,0 +1,183 @@
+"""
+Alignement des voies Rx_0 et Rx_1 : retard fractionnaire, gain, phase et déséquilibre IQ.
+
+Les deux chaînes de réception du PlutoSDR n'ont exactement ni le même retard, ni le même gain, ni le même
+équilibre I/Q. Ces écarts sont estimés une fois (à la calibration) puis corrigés sur chaque trame :
+- déséquilibre IQ de chaque voie, par la méthode aveugle du premier ordre : pour un signal circulaire
+  E[x^2] = 0, un déséquilibre x = mu.s + nu.conj(s) donne E[x^2] != 0 et se corrige par
+  y = x - w.conj(x) avec w = E[x^2] / (2 E[|x|^2]) ;
+- retard de Rx_1 par rapport à Rx_0, estimé par GCC-PHAT (cf. gcc_phat.py) ;
+- gain (et, si correct_phase, phase) de Rx_1 ramené à celui de Rx_0.
+
+Retard, gain et phase sont réunis dans un seul filtre (sinus cardinal fenêtré, réel, suivi d'un facteur complexe),
+calculé une fois et conservé en cache. Une trame est corrigée par kernels.align_channels en une passe par voie,
+dans des tampons préalloués (environ 3 ms par trame de 2^18 échantillons en single avec numba, contre 10 ms
+pour np.convolve et les corrections IQ allouées à chaque trame).
+
+La phase n'est pas corrigée par défaut : elle dépend de la direction de la source et reste mesurée par la
+calibration de phase (phase_cal) de MonopulseAngleEstimator.
+"""
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import kernels
+import precision as prec
+from gcc_phat import GCCPhatEstimator
+
+
+def calibration_cache_path(align_channels=False):
+    """
+    Fichier du cache des calibrations de phase (cf. calibration_cache.py). Les déphasages mesurés sur des
+    voies alignées (gain, phase éventuelle) sont conservés à part de ceux mesurés sur les voies brutes.
+    """
+    name = "phase_calibration_aligned.json" if align_channels else "phase_calibration.json"
+    return os.path.join(os.getcwd(), "calibration", name)
+
+
+class ChannelAlignment:
+    """ Estimation et correction des écarts entre les voies Rx_0 et Rx_1. """
+
+    def __init__(self, precision=None, half_width=16, max_delay=4, correct_iq=True, correct_phase=False,
+                 max_filters=8):
+
+        # Précision de calcul ('double' ou 'single', cf. precision.py)
+        self.precision = prec.check_precision(precision)
+        self.complex_dtype = prec.complex_dtype(self.precision)
+        self.real_dtype = prec.real_dtype(self.precision)
+
+        self.half_width = half_width  # Demi-longueur du filtre de retard fractionnaire (2 * half_width + 1 coefficients)
+        self.max_delay = max_delay  # Retard maximal recherché et corrigé, en échantillons
+        self.correct_iq = correct_iq  # Corriger le déséquilibre IQ de chaque voie
+        self.correct_phase = correct_phase  # Corriger aussi la phase (sinon laissée à phase_cal)
+
+        # Écarts estimés
+        self.delay = 0.0  # Retard de Rx_1 par rapport à Rx_0, en échantillons
+        self.gain = 1.0  # Gain appliqué à Rx_1
+        self.phase_deg = 0.0  # Phase appliquée à Rx_1 (si correct_phase)
+        self.iq_weights = (0.0, 0.0)  # Coefficients w de correction IQ de Rx_0 et Rx_1
+        self.ready = False  # Les écarts ont été estimés
+
+        # Filtres de correction déjà calculés, indexés par (retard, gain, phase, type)
+        self.max_filters = max_filters
+        self._filters = OrderedDict()
+        self.taps = None
+        self.fir = None  # Partie réelle du filtre (retard seul), appliquée par kernels.align_channels
+        self.fir_scale = 1.0  # Gain et phase appliqués après le filtre
+
+        # Deux paires de tampons de sortie, utilisées alternativement (cf. apply)
+        self.workspace = kernels.Workspace()
+        self.frames = 0
+
+    def reset(self):
+        """ Les écarts sont à ré-estimer (nouvelle configuration RF, nouvelle calibration). """
+        self.ready = False
+
+    ########################################################################################################################
+    ############################################### Filtres ################################################################
+    ########################################################################################################################
+
+    def filter(self, delay, gain=1.0, phase_deg=0.0):
+        """
+        Coefficients du filtre qui avance un signal de delay échantillons, le multiplie par gain et le déphase
+        de phase_deg (sinus cardinal fenêtré par une fenêtre de Hann). Les filtres sont conservés en cache.
+        """
+        key = (round(float(delay), 4), round(float(gain), 6), round(float(phase_deg), 4), self.complex_dtype)
+        taps = self._filters.get(key)
+        if taps is None:
+            K = self.half_width
+            k = np.arange(-K, K + 1)
+            taper = 0.5 + 0.5 * np.cos(np.pi * (k + delay) / (K + 1))
+            taps = np.sinc(k + delay) * taper * gain * np.exp(1j * np.deg2rad(phase_deg))
+            taps = taps.astype(self.complex_dtype)
+            taps.setflags(write=False)
+            self._filters[key] = taps
+            while len(self._filters) > self.max_filters:
+                self._filters.popitem(last=False)
+        self._filters.move_to_end(key)
+        return taps
+
+    ########################################################################################################################
+    ############################################### Estimation #############################################################
+    ########################################################################################################################
+
+    @staticmethod
+    def iq_weight(x):
+        """ Coefficient w de la correction IQ aveugle y = x - w.conj(x). """
+        return complex(np.mean(x * x) / (2 * np.mean(np.abs(x) ** 2)))
+
+    def estimate(self, Rx_0, Rx_1):
+        """
+        Estime les écarts entre les voies sur une trame contenant un signal commun aux deux antennes.
+
+        Retourne:
+        - Un dictionnaire des écarts estimés (retard en échantillons, gain, phase, coefficients IQ).
+        """
+        Rx_0 = prec.as_complex(Rx_0, self.precision)
+        Rx_1 = prec.as_complex(Rx_1, self.precision)
+
+        # Déséquilibre IQ de chaque voie, corrigé avant les autres estimations
+        if self.correct_iq:
+            self.iq_weights = (self.iq_weight(Rx_0), self.iq_weight(Rx_1))
+            Rx_0 = self.correct_iq_balance(Rx_0, self.iq_weights[0])
+            Rx_1 = self.correct_iq_balance(Rx_1, self.iq_weights[1])
+
+        # Retard de Rx_1 par rapport à Rx_0 (une seule trame : pas de moyennage)
+        gcc = GCCPhatEstimator(precision=self.precision, max_lag=self.max_delay, alpha=1)
+        self.delay = float(np.clip(gcc.process(Rx_0, Rx_1)['delay_samples'], -self.max_delay, self.max_delay))
+
+        # Gain et phase de Rx_1 une fois le retard corrigé
+        aligned = np.convolve(Rx_1, self.filter(self.delay), 'same')
+        K = self.half_width
+        reference, aligned = Rx_0[K:-K], aligned[K:-K]
+        self.gain = float(np.sqrt(np.vdot(reference, reference).real / np.vdot(aligned, aligned).real))
+        self.phase_deg = float(np.rad2deg(np.angle(np.vdot(aligned, reference)))) if self.correct_phase else 0.0
+
+        self.taps = self.filter(self.delay, self.gain, self.phase_deg)
+        self.fir = np.ascontiguousarray(self.filter(self.delay).real, dtype=self.real_dtype)
+        self.fir_scale = self.gain * np.exp(1j * np.deg2rad(self.phase_deg))
+        self.ready = True
+        return {'delay_samples': self.delay, 'gain': self.gain, 'gain_db': 20 * np.log10(self.gain),
+                'phase_deg': self.phase_deg, 'iq_weights': self.iq_weights}
+
+    ########################################################################################################################
+    ############################################### Correction #############################################################
+    ########################################################################################################################
+
+    @staticmethod
+    def correct_iq_balance(x, weight, out=None):
+        """ y = x - w.conj(x) ; out peut être x lui-même (correction en place). """
+        if out is None:
+            out = np.empty_like(x)
+        correction = np.conjugate(x)
+        correction *= x.dtype.type(weight)
+        return np.subtract(x, correction, out=out)
+
+    def apply(self, Rx_0, Rx_1):
+        """
+        Corrige une trame. Les tableaux d'entrée (partagés avec l'affichage) ne sont pas modifiés : les voies
+        corrigées sont écrites dans deux paires de tampons préalloués, utilisées alternativement. Une trame
+        corrigée reste donc intacte pendant la trame suivante (le temps pour un autre thread, cf.
+        DriftRecalibrationThread, d'en copier un extrait), puis son tampon est réutilisé.
+
+        Retourne:
+        - (Rx_0, Rx_1) alignés, ou les entrées inchangées si les écarts n'ont pas été estimés.
+        """
+        if not self.ready:
+            return Rx_0, Rx_1
+
+        Rx_0 = prec.as_complex(Rx_0, self.precision)
+        Rx_1 = prec.as_complex(Rx_1, self.precision)
+
+        parity = self.frames % 2
+        self.frames += 1
+        aligned_0 = self.workspace.get('aligned_0_%d' % parity, len(Rx_0), self.complex_dtype)
+        aligned_1 = self.workspace.get('aligned_1_%d' % parity, len(Rx_1), self.complex_dtype)
+
+        # Le filtre h = gain.exp(j.phase).sinc étant réel à la phase près, h * conj(x) = exp(2j.phase).conj(h * x) :
+        # la correction IQ de Rx_1 peut donc être faite après le filtre
+        weight0, weight1 = self.iq_weights if self.correct_iq else (0.0, 0.0)
+        weight1 = weight1 * np.exp(2j * np.deg2rad(self.phase_deg))
+        return kernels.align_channels(Rx_0, Rx_1, self.fir, self.fir_scale, weight0, weight1, aligned_0, aligned_1,
+                                      self.workspace)
@@ -0,0 +1,243 @@
+"""
+Historique long terme des estimations d'angle, sur disque.
+
+Chaque estimation (date, déphasage, angle, qualité, génération de configuration) est ajoutée à un journal
+en colonnes : un fichier binaire par colonne (float64 pour la date, float32 / uint32 pour le reste, environ
+24 octets par estimation), complété par ajout seulement. Un outil hors ligne lit une colonne sans lire les
+autres, et une plage de dates sans lire tout le fichier (np.memmap puis recherche dichotomique sur les dates).
+
+Des résumés (nombre, min, max et moyenne du déphasage, de l'angle et de la qualité) sont tenus à jour au fil
+des estimations à trois niveaux : 1 s, 1 min et 1 h. Chaque niveau est alimenté par les intervalles terminés
+du niveau inférieur, et stocké en colonnes comme le journal. Des heures de suivi se tracent donc à partir de
+quelques milliers de lignes, sans relire les estimations.
+
+Un intervalle est terminé par la première estimation qui le dépasse, par un changement de génération
+(nouvelle calibration, nouvelle configuration : les estimations de deux générations ne sont jamais résumées
+ensemble) ou par close(). Après un redémarrage, un même intervalle peut donc apparaître deux fois.
+
+Organisation du répertoire :
+    raw/   timestamp, phase, angle, quality, generation
+    1s/, 1min/, 1h/   timestamp (début de l'intervalle), count, generation,
+                      phase_min, phase_max, phase_mean, angle_min, ..., quality_mean
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Colonnes du journal des estimations
+RAW_COLUMNS = (('timestamp', np.float64), ('phase', np.float32), ('angle', np.float32), ('quality', np.float32),
+               ('generation', np.uint32))
+
+# Grandeurs résumées et niveaux des résumés (nom, durée d'un intervalle en secondes), du plus fin au plus grossier
+FIELDS = ('phase', 'angle', 'quality')
+TIERS = (('1s', 1.0), ('1min', 60.0), ('1h', 3600.0))
+
+TIER_COLUMNS = (('timestamp', np.float64), ('count', np.uint32), ('generation', np.uint32)) + tuple(
+    (field + suffix, np.float32) for field in FIELDS for suffix in ('_min', '_max', '_mean'))
+
+
+def default_log_path():
+    """ Répertoire par défaut du journal des angles. """
+    return os.path.join(os.getcwd(), "doa_log")
+
+
+class ColumnStore:
+    """
+    Table en colonnes sur disque, complétée par ajout seulement : un fichier <colonne>.bin par colonne.
+
+    Les lignes sont d'abord écrites dans des tableaux préalloués de capacity lignes, puis ajoutées aux
+    fichiers par flush() (un tofile par colonne). La lecture retient le nombre de lignes de la colonne la
+    plus courte : un arrêt pendant un flush ne laisse pas de ligne incomplète lisible.
+    """
+
+    def __init__(self, directory, columns, capacity=4096):
+        self.directory = directory
+        self.columns = tuple((name, np.dtype(dtype)) for name, dtype in columns)
+        os.makedirs(directory, exist_ok=True)
+
+        # Description des colonnes, pour les outils hors ligne
+        with open(os.path.join(directory, "columns.json"), 'w') as file:
+            json.dump([[name, dtype.str] for name, dtype in self.columns], file)
+
+        self.buffers = {name: np.empty(capacity, dtype) for name, dtype in self.columns}
+        self.capacity = capacity
+        self.size = 0  # Lignes en attente d'écriture
+
+    def path(self, name):
+        return os.path.join(self.directory, name + ".bin")
+
+    def append(self, row):
+        """ Ajoute une ligne (valeurs dans l'ordre des colonnes). """
+        index = self.size
+        for (name, _), value in zip(self.columns, row):
+            self.buffers[name][index] = value
+        self.size = index + 1
+        if self.size == self.capacity:
+            self.flush()
+
+    def flush(self):
+        """ Ajoute les lignes en attente aux fichiers. """
+        if self.size == 0:
+            return
+        for name, _ in self.columns:
+            with open(self.path(name), 'ab') as file:
+                self.buffers[name][:self.size].tofile(file)
+        self.size = 0
+
+    @staticmethod
+    def read(directory, start=None, stop=None, columns=None):
+        """
+        Lignes d'une table dont la date (colonne timestamp) est dans [start, stop[ (None : sans borne).
+
+        Retourne:
+        - Un dictionnaire de tableaux (vues np.memmap en lecture seule, tableaux vides si la table est vide).
+        """
+        with open(os.path.join(directory, "columns.json")) as file:
+            description = [(name, np.dtype(dtype)) for name, dtype in json.load(file)]
+
+        # Nombre de lignes complètes (colonne la plus courte)
+        rows = min(os.path.getsize(os.path.join(directory, name + ".bin")) // dtype.itemsize
+                   if os.path.exists(os.path.join(directory, name + ".bin")) else 0
+                   for name, dtype in description)
+
+        def column(name, dtype):
+            if rows == 0:
+                return np.zeros(0, dtype)
+            return np.memmap(os.path.join(directory, name + ".bin"), dtype=dtype, mode='r', shape=(rows,))
+
+        timestamps = column('timestamp', np.dtype(np.float64))
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, 'left'))
+        last = rows if stop is None else int(np.searchsorted(timestamps, stop, 'left'))
+        return {name: column(name, dtype)[first:last] for name, dtype in description
+                if columns is None or name in columns}
+
+
+class _Summary:
+    """ Intervalle en cours d'un niveau : nombre, min, max et somme de chaque grandeur. """
+
+    __slots__ = ('start', 'generation', 'count', 'minimum', 'maximum', 'total')
+
+    def __init__(self, start, generation):
+        self.start = start
+        self.generation = generation
+        self.count = 0
+        self.minimum = [np.inf] * len(FIELDS)
+        self.maximum = [-np.inf] * len(FIELDS)
+        self.total = [0.0] * len(FIELDS)
+
+    def add(self, count, minimum, maximum, total):
+        """ Ajoute une estimation (count = 1, min = max = somme = valeur) ou un intervalle du niveau inférieur. """
+        self.count += count
+        for i in range(len(FIELDS)):
+            if minimum[i] < self.minimum[i]:
+                self.minimum[i] = minimum[i]
+            if maximum[i] > self.maximum[i]:
+                self.maximum[i] = maximum[i]
+            self.total[i] += total[i]
+
+    def row(self):
+        """ Ligne de la table du niveau (ordre de TIER_COLUMNS). """
+        values = []
+        for i in range(len(FIELDS)):
+            # Grandeur jamais mesurée dans l'intervalle (qualité NaN) : min, max et moyenne NaN
+            if self.minimum[i] > self.maximum[i]:
+                values += [np.nan, np.nan, np.nan]
+            else:
+                values += [self.minimum[i], self.maximum[i], self.total[i] / self.count]
+        return [self.start, self.count, self.generation] + values
+
+
+class DOATimeSeriesLog:
+    """ Journal des estimations d'angle et résumés à 1 s, 1 min et 1 h (cf. docstring du module). """
+
+    def __init__(self, path=None, capacity=4096, flush_interval=1.0):
+        self.path = path or default_log_path()
+        self.flush_interval = flush_interval  # Délai maximal (secondes) avant l'écriture des lignes en attente
+        self.lock = threading.Lock()  # append dans le thread de calcul, flush/close depuis l'interface
+
+        self.raw = ColumnStore(os.path.join(self.path, "raw"), RAW_COLUMNS, capacity)
+        self.tiers = [ColumnStore(os.path.join(self.path, name), TIER_COLUMNS, capacity) for name, _ in TIERS]
+        self.current = [None] * len(TIERS)  # Intervalle en cours de chaque niveau
+        self.last_flush = time.monotonic()
+
+    def append(self, phase, angle, quality=float('nan'), generation=0, timestamp=None):
+        """ Ajoute une estimation (qualité NaN si elle n'est pas mesurée). """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.raw.append((timestamp, phase, angle, quality, generation))
+            values = (phase, angle, quality)
+            self._add(0, timestamp, generation, 1, values, values, values)
+
+            now = time.monotonic()
+            if now - self.last_flush >= self.flush_interval:
+                self._flush()
+                self.last_flush = now
+
+    def _add(self, level, timestamp, generation, count, minimum, maximum, total):
+        """ Ajoute une estimation ou un intervalle terminé au niveau level, en terminant l'intervalle en cours si besoin. """
+        _, duration = TIERS[level]
+        start = timestamp - timestamp % duration
+        current = self.current[level]
+        if current is not None and (current.start != start or current.generation != generation):
+            self._close(level)
+            current = None
+        if current is None:
+            current = self.current[level] = _Summary(start, generation)
+        current.add(count, minimum, maximum, total)
+
+    def _close(self, level):
+        """ Écrit l'intervalle en cours du niveau level et le transmet au niveau supérieur. """
+        current = self.current[level]
+        if current is None:
+            return
+        self.tiers[level].append(current.row())
+        self.current[level] = None
+        if level + 1 < len(TIERS):
+            self._add(level + 1, current.start, current.generation, current.count,
+                      current.minimum, current.maximum, current.total)
+
+    def _flush(self):
+        self.raw.flush()
+        for tier in self.tiers:
+            tier.flush()
+
+    def flush(self):
+        """ Écrit les lignes en attente (les intervalles en cours restent ouverts). """
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        """ Termine les intervalles en cours (résumés partiels) et écrit tout. """
+        with self.lock:
+            for level in range(len(TIERS)):
+                self._close(level)
+            self._flush()
+
+    ####################################################################################################################
+    ################################################# Lecture ##########################################################
+    ####################################################################################################################
+
+    @staticmethod
+    def read(path=None, tier='raw', start=None, stop=None, columns=None):
+        """
+        Lit le journal (tier='raw') ou un niveau de résumé ('1s', '1min', '1h') entre les dates start et stop.
+        Seules les lignes déjà écrites sur disque sont lues.
+        """
+        return ColumnStore.read(os.path.join(path or default_log_path(), tier), start, stop, columns)
+
+    @staticmethod
+    def tier_for(start, stop, max_points=2000, raw_rate=None):
+        """
+        Niveau le plus fin donnant au plus max_points lignes sur [start, stop] : 'raw' si raw_rate (estimations
+        par seconde) est donné et suffisamment faible, sinon '1s', '1min' ou '1h'.
+        """
+        span = stop - start
+        if raw_rate is not None and span * raw_rate <= max_points:
+            return 'raw'
+        for name, duration in TIERS:
+            if span / duration <= max_points:
+                return name
+        return TIERS[-1][0]
@@ -1,17 +1,50 @@
+import cmath
+import math
+import threading
+
 import numpy as np
 
+import fft_cache
+import kernels
+import precision as prec
+from calibration_cache import CalibrationCache
+from channel_alignment import ChannelAlignment, calibration_cache_path
+from profiling import StageProfiler
+from streaming_stats import StreamingStats
+
 class MonopulseAngleEstimator:
     """Classe pour estimer l'angle de direction d'un signal reçu par un réseau d'antennes."""
 
-    def __init__(self, step_deg=0.1, window_size=1, f0=2227e6, d_wavelength=0.5):
+    def __init__(self, step_deg=0.1, window_size=1, f0=2227e6, d_wavelength=0.5, precision=None,
+                 align_channels=False, sub_blocks=1, sub_block_overlap=0.0, measure_quality=False):
 
         # Valeurs actuelles des signaux reçus
         self.Rx_0 = None
         self.Rx_1 = None
+        self.latest_frame = None  # Couple (Rx_0, Rx_1) publié en une seule affectation pour les autres threads
+        self.frame_seq = 0  # Numéro de la dernière trame reçue (une estimation par trame, cf. MonopulseAngleEstimatorThread)
+
+        # Précision de calcul ('double' ou 'single', cf. precision.py)
+        self.precision = prec.check_precision(precision)
+        self.complex_dtype = prec.complex_dtype(self.precision)
+        self.real_dtype = prec.real_dtype(self.precision)
+
+        # Tampons préalloués des noyaux fusionnés (somme/delta fenêtrés, cf. kernels.py)
+        self.workspace = kernels.Workspace()
+
+        # Chronomètres par étape et captures cProfile/tracemalloc à la demande (cf. profiling.py)
+        self.profiler = StageProfiler('estimator')
+
+        # Alignement des voies (retard, gain, IQ) estimé à la calibration puis appliqué à chaque trame
+        # (cf. channel_alignment.py). Les trames reçues restent dans raw_frame jusqu'à prepare_frame.
+        self.alignment = ChannelAlignment(self.precision) if align_channels else None
+        self.raw_frame = None
+        self._aligned_source = None  # Trame brute dont Rx_0 et Rx_1 sont la version alignée
+        self.last_alignment = None  # Écarts estimés à la dernière calibration, pas encore signalés à l'interface
 
         """ Moyennage """
         self.window_size = window_size  # Taille de la fenêtre pour le moyennage
-        self.window_values = []  # Liste pour stocker les valeurs de la fenêtre
+        self.stats = StreamingStats(window_size)  # Statistiques glissantes des déphasages de la fenêtre
 
         """ RF """
         self.C = 3E8  # Vitesse de la lumière en mètres par seconde
@@ -27,19 +60,57 @@ class MonopulseAngleEstimator:
         self.phase_cal = 0
         self.last_phase_delay = 0  # Dernier déphasage utilisé pour le suivi
         self.step_deg = step_deg  # Pas de déphasage pour la recherche de l'angle de direction
-        self.step_deg_cal = 1  # Pas de déphasage pour la calibration de phase
+        self.step_deg_cal = 1  # Pas de déphasage pour la calibration de phase (balayage complet)
+        self.coarse_step_deg_cal = 10  # Pas du balayage grossier de la recherche hiérarchique
+        self.refine_factor_cal = 10  # Facteur de réduction du pas à chaque raffinement
+        self.resolution_deg_cal = 0.01  # Résolution visée par la recherche hiérarchique
+
+        self.rf_config = None  # Configuration RF courante (rx_lo, rx_gain0, rx_gain1, sample_rate), cf. calibration_cache.py
+
+        """ Sous-blocs """
+        # Chaque buffer peut être découpé en sous-blocs (qui se recouvrent éventuellement) donnant chacun un pas
+        # de suivi : sub_blocks estimations par buffer au lieu d'une (cf. tracking_sub_blocks)
+        self.sub_blocks = 1  # Nombre de sous-blocs par buffer (1 : buffer entier)
+        self.sub_block_overlap = 0.0  # Recouvrement de deux sous-blocs consécutifs (fraction de leur longueur)
+        self.block_phase_delays = np.zeros(0)  # Déphasages suivis après chaque sous-bloc du dernier buffer
+        self.set_sub_blocks(sub_blocks, sub_block_overlap)
+
+        """ Qualité """
+        # Cohérence des deux voies (cf. process_batch), toujours connue par sous-bloc ; pour un buffer entier,
+        # mesurée seulement si measure_quality (une réduction de plus par buffer, cf. kernels.channel_products)
+        self.measure_quality = measure_quality
+        self.last_quality = float('nan')
+        self.block_qualities = np.zeros(0)
+
+        # Génération de configuration : incrémentée à chaque calibration ou changement de porteuse, elle
+        # distingue les estimations qui ne sont pas comparables (cf. doa_log.py)
+        self.config_generation = 0
 
         """ Variables d'état """
         self.calibrated = False  # Indique si la calibration de phase a été effectuée
+        self.force_scan = False  # La prochaine calibration ignore le cache (demandée par l'opérateur)
 
-    def update_parameters(self, step_deg=None, window_size=None, f0=None):
+    def update_parameters(self, step_deg=None, window_size=None, f0=None, sub_blocks=None, sub_block_overlap=None):
         """ Met à jour les paramètres de la classe. """
         if step_deg is not None:
             self.step_deg = step_deg
         if window_size is not None:
             self.window_size = window_size
+            self.stats.resize(window_size)
         if f0 is not None:
             self.F0 = f0
+            self.config_generation += 1
+        if sub_blocks is not None or sub_block_overlap is not None:
+            self.set_sub_blocks(sub_blocks, sub_block_overlap)
+
+    def set_sub_blocks(self, sub_blocks=None, overlap=None):
+        """ Nombre de sous-blocs par buffer et recouvrement (0 <= overlap < 1) pour le suivi. """
+        sub_blocks = self.sub_blocks if sub_blocks is None else int(sub_blocks)
+        overlap = self.sub_block_overlap if overlap is None else float(overlap)
+        if sub_blocks < 1 or not 0 <= overlap < 1:
+            raise ValueError(f"Sous-blocs invalides: {sub_blocks} (>= 1), recouvrement {overlap} (dans [0, 1[)")
+        self.sub_blocks = sub_blocks
+        self.sub_block_overlap = overlap
 
     ########################################################################################################################
     ########################################### Spectre de fréquence #######################################################
@@ -58,14 +129,15 @@ class MonopulseAngleEstimator:
         # Nombre d'échantillons dans les données brutes
         NumSamples = len(raw_data)
 
-        # Fenêtrage Hanning pour réduire les fuites spectrales
-        win = np.hanning(NumSamples)
+        # Fenêtrage Hanning (précalculé et partagé) pour réduire les fuites spectrales
+        real_dtype = np.finfo(raw_data.dtype).dtype
+        win = fft_cache.window(NumSamples, real_dtype)
 
         # Application de la fenêtre aux données
         y = raw_data * win
 
         # Calcul de la FFT normalisée par la somme de la fenêtre
-        s_fft = np.fft.fft(y) / np.sum(win)
+        s_fft = fft_cache.fft_plan(NumSamples, y.dtype)(y) / fft_cache.window_sum(NumSamples, real_dtype)
 
         # Décalage zéro-fréquence au centre du spectre
         s_shift = np.fft.fftshift(s_fft)
@@ -121,13 +193,18 @@ class MonopulseAngleEstimator:
         arcsin_arg = np.deg2rad(deltaphase) * self.C / (2 * np.pi * self.F0 * self.d)
 
         # Assurez-vous que l'argument pour arcsin reste entre -1 et 1 pour éviter les erreurs
-        arcsin_arg = max(min(1, arcsin_arg), -1)
+        # (np.clip : deltaphase peut aussi être un tableau, cf. process_batch)
+        arcsin_arg = np.clip(arcsin_arg, -1, 1)
 
         # Calcul de l'angle theta en degrés à partir de l'argument arcsin
         calc_theta = np.rad2deg(np.arcsin(arcsin_arg))
 
         return calc_theta
 
+    def calcDeltaPhase(self, theta):
+        """ Déphasage (degrés) entre les antennes pour un signal arrivant sous l'angle theta (inverse de calcTheta). """
+        return float(np.rad2deg(2 * np.pi * self.F0 * self.d * np.sin(np.deg2rad(theta)) / self.C))
+
     def monopulse_angle(self, array1, array2):
         ''' Correlate the sum and delta signals  '''
         # Since our signals are closely aligned in time, we can just return the 'valid' case where the signals completley overlap
@@ -141,6 +218,10 @@ class MonopulseAngleEstimator:
 
         return angle_diff
 
+    def phasor(self, phase_deg):
+        """ Facteur de rotation exp(j*phase) dans la précision de calcul (évite la promotion en complex128). """
+        return self.complex_dtype.type(np.exp(1j * np.deg2rad(phase_deg)))
+
     def scan_for_DOA(self):
 
         # Initialisation des listes pour stocker les résultats des pics et des phases
@@ -156,27 +237,16 @@ class MonopulseAngleEstimator:
         Rx_0_temp = self.Rx_0
 
         for phase_delay in delay_phases:
-            # Application du déphasage avec calibration au signal Rx_1
-            delayed_Rx_1 = Rx_1_temp * np.exp(1j * np.deg2rad(phase_delay))
-
-            # Calcul de la somme et de la différence des signaux
-            delayed_sum = Rx_0_temp + delayed_Rx_1
-            delayed_delta = Rx_0_temp - delayed_Rx_1
+            # Rotation, somme/delta et fenêtrage fusionnés, avec corrélation des voies non fenêtrées
+            sum_delta_correlation = self.windowed_sum_delta(Rx_0_temp, Rx_1_temp, phase_delay)
 
-            # FFT des signaux sommés et différenciés
-            delayed_sum_fft = self.fft(delayed_sum)
-            delayed_delta_fft = self.fft(delayed_delta)
+            # Pics des spectres somme et delta en dBFS
+            peak_sum.append(self.peak_dbfs(self.workspace.buffers['windowed_sum']))
+            peak_delta.append(self.peak_dbfs(self.workspace.buffers['windowed_delta']))
 
-            # Conversion des spectres FFT en dBFS
-            delayed_sum_dbfs = self.dbfs(delayed_sum_fft)
-            delayed_delta_dbfs = self.dbfs(delayed_delta_fft)
-
-            # Estimation de l'angle à partir de la corrélation des signaux sommés et différenciés
-            mono_angle = self.monopulse_angle(delayed_sum, delayed_delta)
-
-            peak_sum.append(np.max(delayed_sum_dbfs))
-            peak_delta.append(np.max(delayed_delta_dbfs))
-            monopulse_phase.append(np.sign(mono_angle))
+            t0 = self.profiler.tic()
+            monopulse_phase.append(np.sign(np.angle(sum_delta_correlation)))
+            self.profiler.toc('decision', t0)
 
         peak_dbfs = np.max(peak_sum)
         peak_delay_index = np.where(peak_sum == peak_dbfs)
@@ -192,77 +262,365 @@ class MonopulseAngleEstimator:
                 'monopulse_phase': monopulse_phase
                 }
 
+    def windowed_sum_delta(self, Rx_0, Rx_1, phase_delay):
+        """
+        Forme les voies somme et delta fenêtrées dans les tampons préalloués du workspace
+        ('windowed_sum' et 'windowed_delta') en une seule passe.
+
+        Retourne:
+        - La corrélation des voies somme et delta non fenêtrées.
+        """
+        t0 = self.profiler.tic()
+        NumSamples = len(Rx_0)
+        sum_out = self.workspace.get('windowed_sum', NumSamples, Rx_0.dtype)
+        delta_out = self.workspace.get('windowed_delta', NumSamples, Rx_0.dtype)
+        win = fft_cache.window(NumSamples, self.real_dtype)
+        rotation = self.phasor(phase_delay)
+        t0 = self.profiler.toc('rotate', t0)
+
+        sum_delta_correlation = kernels.windowed_sum_delta(Rx_0, Rx_1, rotation, win, sum_out, delta_out,
+                                                           self.workspace)
+        self.profiler.toc('sum_delta', t0)
+        return sum_delta_correlation
+
+    def peak_dbfs(self, windowed):
+        """ Pic du spectre d'un signal déjà fenêtré, en dBFS (seul le maximum est converti en dB). """
+        t0 = self.profiler.tic()
+        NumSamples = len(windowed)
+        spectrum = fft_cache.fft_plan(NumSamples, windowed.dtype)(windowed)
+        t0 = self.profiler.toc('fft', t0)
+
+        peak = np.max(np.abs(spectrum)) / fft_cache.window_sum(NumSamples, self.real_dtype)
+        peak_dbfs = 20 * np.log10(peak / self.full_scale)
+        self.profiler.toc('dbfs', t0)
+        return peak_dbfs
+
+    def scan_for_DOA_hierarchical(self, Rx_0=None, Rx_1=None):
+        """
+        Recherche multi-résolution du déphasage qui maximise le pic de la voie somme.
+
+        Un balayage grossier de -180 à 180° (pas coarse_step_deg_cal) est suivi de raffinements
+        successifs autour du meilleur déphasage, le pas étant divisé par refine_factor_cal à chaque
+        étape jusqu'à atteindre 10 * resolution_deg_cal. Le pic est ensuite interpolé par une parabole
+        sur les trois derniers points. Avec les valeurs par défaut, 0.01° est atteint en environ 80
+        évaluations, contre 36000 pour un balayage complet au pas de 0.01°.
+
+        Paramètres:
+        - Rx_0, Rx_1 (array): Signaux à utiliser (par défaut, les signaux courants de l'estimateur).
+
+        Retourne:
+        - Un dictionnaire avec les clés de scan_for_DOA (delay_phases, peak_dbfs, peak_delay, steer_angle,
+          peak_sum, peak_delta, monopulse_phase), pour les seuls déphasages évalués, triés, et evaluations
+          (nombre de déphasages évalués).
+        """
+        Rx_0 = self.Rx_0 if Rx_0 is None else Rx_0
+        Rx_1 = self.Rx_1 if Rx_1 is None else Rx_1
+
+        # Pics des voies somme et delta et signe monopulse déjà évalués, indexés par déphasage (les fenêtres de
+        # raffinement se recouvrent)
+        peaks = {}
+        deltas = {}
+        signs = {}
+
+        def evaluate(phase_delays):
+            for phase_delay in phase_delays:
+                phase_delay = round(float(phase_delay), 6)
+                if phase_delay not in peaks:
+                    sum_delta_correlation = self.windowed_sum_delta(Rx_0, Rx_1, phase_delay)
+                    peaks[phase_delay] = self.peak_dbfs(self.workspace.buffers['windowed_sum'])
+                    deltas[phase_delay] = self.peak_dbfs(self.workspace.buffers['windowed_delta'])
+                    signs[phase_delay] = np.sign(np.angle(sum_delta_correlation))
+            return max(phase_delays, key=lambda phase_delay: peaks[round(float(phase_delay), 6)])
+
+        # Balayage grossier
+        step = self.coarse_step_deg_cal
+        best = evaluate(np.arange(-180, 180, step))
+
+        # Raffinements successifs autour du meilleur déphasage
+        while step > 10 * self.resolution_deg_cal:
+            span = step
+            step = step / self.refine_factor_cal
+            best = evaluate(best + np.arange(-span, span + step / 2, step))
+
+        # Interpolation parabolique du pic à partir des deux voisins au dernier pas
+        left, center, right = (peaks.get(round(float(best + offset), 6)) for offset in (-step, 0, step))
+        peak_delay = float(best)
+        if left is not None and right is not None:
+            curvature = left - 2 * center + right
+            if curvature < 0:
+                peak_delay += 0.5 * step * (left - right) / curvature
+        peak_delay = (peak_delay + 180) % 360 - 180
+        peak_delay = round(round(peak_delay / self.resolution_deg_cal) * self.resolution_deg_cal, 6)
+
+        delay_phases = np.array(sorted(peaks))
+        peak_sum = [peaks[phase_delay] for phase_delay in delay_phases]
+
+        return {'delay_phases': delay_phases,
+                'peak_dbfs': center,
+                'peak_delay': peak_delay,
+                'steer_angle': int(self.calcTheta(peak_delay)),
+                'peak_sum': peak_sum,
+                'peak_delta': [deltas[phase_delay] for phase_delay in delay_phases],
+                'monopulse_phase': [signs[phase_delay] for phase_delay in delay_phases],
+                'evaluations': len(peaks)
+                }
+
     def tracking(self):
 
-        # Application du déphasage avec calibration au signal Rx_1
-        delayed_Rx_1 = self.Rx_1 * np.exp(1j * np.deg2rad(self.last_phase_delay + self.phase_cal))
+        if self.sub_blocks > 1:
+            return self.tracking_sub_blocks()
 
-        # Calcul de la somme et de la différence des signaux
-        delayed_sum = self.Rx_0 + delayed_Rx_1
-        delayed_delta = self.Rx_0 - delayed_Rx_1
+        # Rotation, somme/delta, fenêtrage et intercorrelation des cannaux somme et delta en une passe.
+        # Par Parseval, la phase est celle de la corrélation des spectres somme et delta (cf. kernels.py)
+        # (rotation, somme/delta, fenêtrage et FFT sont fusionnés dans l'étape 'correlate')
+        t0 = self.profiler.tic()
+        win2 = fft_cache.window_squared(len(self.Rx_0), self.real_dtype)
+        rotation = self.phasor(self.last_phase_delay + self.phase_cal)
+        t0 = self.profiler.toc('rotate', t0)
 
-        # FFT des signaux sommés et différenciés
-        delayed_sum_fft = self.fft(delayed_sum)
-        delayed_delta_fft = self.fft(delayed_delta)
+        sum_delta_correlation = kernels.monopulse_correlation(self.Rx_0, self.Rx_1, rotation, win2, self.workspace)
+        t0 = self.profiler.toc('correlate', t0)
 
-        # Intercorrelation des cannaux somme et delta
-        mono_angle = self.monopulse_angle(delayed_sum_fft, delayed_delta_fft)
+        mono_angle = np.angle(sum_delta_correlation)
 
         # Le signe de l'intercorrelation indique le sens du changement de phase
         if np.sign(mono_angle) > 0:
             self.last_phase_delay = self.last_phase_delay - self.step_deg
         else:
             self.last_phase_delay = self.last_phase_delay + self.step_deg
+        t0 = self.profiler.toc('decision', t0)
+
+        if self.measure_quality:
+            power0, power1, cross = kernels.channel_products(self.Rx_0[None], self.Rx_1[None], win2)
+            self.last_quality = float(abs(cross[0]) / math.sqrt(max(power0[0] * power1[0], np.finfo(float).tiny)))
+            self.profiler.toc('quality', t0)
+        return self.last_phase_delay
+
+    ########################################################################################################################
+    ########################################### Traitement par lots ########################################################
+    ########################################################################################################################
+
+    def process_batch(self, Rx_0, Rx_1, track=True, peaks=False):
+        """
+        Estimation sur une pile de trames (trames x échantillons) de chaque voie, pour l'analyse hors ligne ou
+        le rattrapage après un retard de traitement. Les réductions sont faites pour toutes les trames en un
+        appel (cf. kernels.channel_products), ce qui répartit le coût fixe d'un appel Python sur la pile.
+
+        Paramètres:
+        - Rx_0, Rx_1 (array): Piles de trames des deux voies (une trame seule est acceptée en 1-D).
+        - track (bool): Enchaîne aussi les pas de tracking() sur les trames, dans l'ordre, à partir de
+          last_phase_delay (mis à jour), comme des appels successifs de tracking().
+        - peaks (bool): Calcule aussi le pic du spectre de la voie somme de chaque trame (FFT par lots).
+
+        Retourne:
+        - Un dictionnaire de tableaux (une valeur par trame) :
+          'phase_delay' : déphasage (degrés, calibration retirée) qui maximise la puissance de la voie somme,
+          point d'équilibre de tracking() ;
+          'steer_angle' : angle de direction correspondant (degrés) ;
+          'quality' : cohérence des deux voies (0 : bruit décorrélé, 1 : signal commun seul) ;
+          'tracked_phase_delay' : last_phase_delay après chaque trame (si track) ;
+          'peak_sum_dbfs' : pic de la voie somme pointée sur phase_delay, en dBFS (si peaks).
+        """
+        t0 = self.profiler.tic()
+        Rx_0 = np.atleast_2d(prec.as_complex(Rx_0, self.precision))
+        Rx_1 = np.atleast_2d(prec.as_complex(Rx_1, self.precision))
+        win2 = fft_cache.window_squared(Rx_0.shape[1], self.real_dtype)
+        power0, power1, cross = kernels.channel_products(Rx_0, Rx_1, win2)
+        t0 = self.profiler.toc('batch_correlate', t0)
+
+        # Puissance de la voie somme maximale pour exp(j.phi) = conj(cross) / |cross|
+        optimum = -np.rad2deg(np.angle(cross))
+        phase_cal = self.phase_cal  # Lu une seule fois (modifiable par DriftRecalibrationThread)
+        phase_delay = (optimum - phase_cal + 180) % 360 - 180
+        results = {'phase_delay': phase_delay,
+                   'steer_angle': self.calcTheta(phase_delay),
+                   'quality': np.abs(cross) / np.sqrt(np.maximum(power0 * power1, np.finfo(float).tiny))}
+
+        if track:
+            # Pas successifs de tracking() : la corrélation somme/delta de chaque trame se déduit des réductions
+            # (boucle sur des scalaires Python, chaque pas dépendant du précédent)
+            tracked = []
+            calibrated_cross = (cross * np.exp(1j * np.deg2rad(phase_cal))).tolist()
+            for difference, correlation in zip((power0 - power1).tolist(), calibrated_cross):
+                rotation = cmath.exp(1j * math.radians(self.last_phase_delay))
+                sum_delta_correlation = complex(difference, 2 * (correlation * rotation).imag)
+                if cmath.phase(sum_delta_correlation) > 0:
+                    self.last_phase_delay = self.last_phase_delay - self.step_deg
+                else:
+                    self.last_phase_delay = self.last_phase_delay + self.step_deg
+                tracked.append(self.last_phase_delay)
+            results['tracked_phase_delay'] = np.array(tracked)
+        t0 = self.profiler.toc('batch_decision', t0)
+
+        if peaks:
+            results['peak_sum_dbfs'] = self.batch_peak_dbfs(Rx_0, Rx_1, optimum)
+            self.profiler.toc('batch_fft', t0)
+        return results
+
+    def batch_peak_dbfs(self, Rx_0, Rx_1, phase_delays, max_chunk=2 ** 20):
+        """ Pic du spectre de la voie somme Rx_0 + Rx_1.exp(j.phi) de chaque trame, en dBFS (FFT par lots). """
+        n_frames, NumSamples = Rx_0.shape
+        win = fft_cache.window(NumSamples, self.real_dtype)
+        rotations = np.exp(1j * np.deg2rad(phase_delays)).astype(self.complex_dtype)[:, None]
+        peaks = np.empty(n_frames)
+
+        # Paquets de trames pour borner la mémoire des voies somme et de leurs spectres
+        rows = max(1, max_chunk // NumSamples)
+        for start in range(0, n_frames, rows):
+            stop = min(start + rows, n_frames)
+            windowed = Rx_1[start:stop] * rotations[start:stop]
+            windowed += Rx_0[start:stop]
+            windowed *= win
+            spectra = fft_cache.fft_plan(windowed.shape, self.complex_dtype)(windowed)
+            peaks[start:stop] = np.max(np.abs(spectra), axis=1)
+
+        peaks /= fft_cache.window_sum(NumSamples, self.real_dtype)
+        return 20 * np.log10(peaks / self.full_scale)
+
+    def sub_block_view(self, samples):
+        """
+        Vue (sous-blocs x échantillons) d'un buffer, sans copie : sub_blocks sous-blocs de même longueur qui se
+        recouvrent de sub_block_overlap et couvrent tout le buffer (le dernier finit sur le dernier échantillon).
+        """
+        NumSamples = len(samples)
+        K = self.sub_blocks
+        length = int(NumSamples / (1 + (K - 1) * (1 - self.sub_block_overlap)))
+        hop = (NumSamples - length) // (K - 1)
+        stride = samples.strides[0]
+        return np.lib.stride_tricks.as_strided(samples, shape=(K, length), strides=(hop * stride, stride),
+                                               writeable=False)
+
+    def tracking_sub_blocks(self):
+        """
+        Suivi sur les sous-blocs du buffer courant : un pas de tracking() par sous-bloc, dans l'ordre, avec les
+        réductions de tous les sous-blocs calculées en un appel (cf. process_batch).
+
+        Retourne:
+        - Le dernier déphasage suivi ; ceux de chaque sous-bloc sont dans block_phase_delays.
+        """
+        Rx_0 = np.ascontiguousarray(self.Rx_0)
+        Rx_1 = np.ascontiguousarray(self.Rx_1)
+        results = self.process_batch(self.sub_block_view(Rx_0), self.sub_block_view(Rx_1))
+        self.block_phase_delays = results['tracked_phase_delay']
+        self.block_qualities = results['quality']
+        self.last_quality = float(self.block_qualities[-1])
         return self.last_phase_delay
 
+    def last_estimates(self):
+        """ Déphasages suivis et qualités du dernier buffer (un par sous-bloc, du plus ancien au plus récent). """
+        if self.sub_blocks > 1:
+            return self.block_phase_delays.tolist(), self.block_qualities.tolist()
+        return [self.last_phase_delay], [self.last_quality]
+
     def Autocal(self):
 
-        self.phase_cal = self.scan_for_DOA()['peak_delay']
+        self.phase_cal = self.scan_for_DOA_hierarchical()['peak_delay']
         self.calibrated = True
 
+    def calibrate(self, calibration_cache=None, use_cache=None):
+        """
+        Calibration de phase : réutilise une calibration enregistrée pour la configuration RF courante
+        si le cache en contient une récente, sinon lance Autocal et enregistre le résultat.
+        Avec use_cache=False (par défaut après reset_calibration(force=True)), le balayage est refait même si
+        le cache contient une calibration, et son résultat remplace celle-ci.
+        Si l'alignement des voies est activé, retard, gain et IQ sont estimés d'abord : ils ne dépendent pas
+        de la direction de la source, la phase restant mesurée par phase_cal.
+
+        Retourne:
+        - La provenance de phase_cal : 'cache', 'interpolation' ou 'scan'.
+        """
+        self.config_generation += 1
+        if use_cache is None:
+            use_cache = not self.force_scan
+        self.force_scan = False
+
+        if self.alignment is not None and not self.alignment.ready and self.raw_frame is not None:
+            self.last_alignment = self.alignment.estimate(*self.raw_frame)
+            self._aligned_source = None
+            self.prepare_frame()
+
+        if use_cache and calibration_cache is not None and self.rf_config is not None:
+            cached = calibration_cache.lookup(self.rf_config)
+            if cached is not None:
+                self.phase_cal, source = cached
+                self.calibrated = True
+                return source
+
+        self.phase_cal = 0
+        self.Autocal()
+
+        if calibration_cache is not None and self.rf_config is not None:
+            calibration_cache.store(self.rf_config, self.phase_cal)
+        return 'scan'
+
     ########################################################################################################################
     ################################################# Moyennage ############################################################
     ########################################################################################################################
 
-    def add_sample(self, sample_value):
-        """Ajoute un échantillon à la fenêtre et gère la taille de la fenêtre."""
-        self.window_values.append(sample_value)
+    @property
+    def window_values(self):
+        """Valeurs de la fenêtre, de la plus ancienne à la plus récente."""
+        return self.stats.window_values()
 
-        # Si la nouvelle taille de la fenêtre est plus petite, supprimer les échantillons les plus anciens
-        if len(self.window_values) > self.window_size:
-            self.window_values = self.window_values[-self.window_size:]
+    def add_sample(self, sample_value):
+        """Ajoute un échantillon à la fenêtre (la plus ancienne valeur sort si la fenêtre est pleine)."""
+        self.stats.push(sample_value)
 
     def is_window_full(self):
         """Vérifie si la fenêtre contient assez d'échantillons pour le calcul."""
-        return len(self.window_values) == self.window_size
+        return self.stats.is_full()
 
     def get_average(self):
-        """Calcule la moyenne des valeurs de la fenêtre si elle est pleine."""
+        """Calcule la moyenne circulaire des déphasages de la fenêtre si elle est pleine."""
         if self.is_window_full():
-            print(self.window_size)
-            return sum(self.window_values) / len(self.window_values)
+            return self.stats.circular_mean()
         return None  # Fenêtre pas encore pleine, pas de moyenne disponible
 
     def count_distinct_values(self):
         """Retourne le nombre de valeurs distinctes et leurs occurrences sous forme de tableau 2D."""
-        value_counts = {}
-        for value in self.window_values:
-            if value in value_counts:
-                value_counts[value] += 1
-            else:
-                value_counts[value] = 1
-        # Convertir le dictionnaire en tableau 2D
-        distinct_table = [[key, value] for key, value in value_counts.items()]
-        return distinct_table
-
-    def reset_calibration(self):
-        """Méthode pour réinitialiser la calibration."""
+        values, counts = self.stats.distinct_values()
+        return np.column_stack((values, counts)).tolist()
+
+    def reset_calibration(self, force=True):
+        """
+        Méthode pour réinitialiser la calibration. Avec force (demande de l'opérateur, après un recâblage par
+        exemple), la prochaine calibration refait le balayage au lieu de relire le cache.
+        """
         self.calibrated = False
+        self.force_scan = force
+        if self.alignment is not None:
+            self.alignment.reset()
+
+    def set_rf_config(self, rf_config):
+        """Mettre à jour la configuration RF ; la calibration est à refaire (ou à relire dans le cache) si elle a changé."""
+        if rf_config != self.rf_config:
+            self.rf_config = rf_config
+            self.calibrated = False
+            if self.alignment is not None:
+                self.alignment.reset()
 
     def set_new_data(self, Rx_0, Rx_1):
         """Mettre à jour les signaux reçus par le réseau d'antennes."""
-        self.Rx_0 = Rx_0
-        self.Rx_1 = Rx_1
+        Rx_0 = prec.as_complex(Rx_0, self.precision)
+        Rx_1 = prec.as_complex(Rx_1, self.precision)
+        if self.alignment is None:
+            self.Rx_0, self.Rx_1 = Rx_0, Rx_1
+            self.latest_frame = (Rx_0, Rx_1)
+        else:
+            # Alignée par prepare_frame, dans le thread de calcul
+            self.raw_frame = (Rx_0, Rx_1)
+        self.frame_seq += 1
+
+    def prepare_frame(self):
+        """Aligne la dernière trame reçue si l'alignement des voies est activé (une seule fois par trame)."""
+        frame = self.raw_frame
+        if self.alignment is None or frame is None or frame is self._aligned_source:
+            return
+        # Nouveaux tableaux : la trame brute (partagée avec l'affichage) n'est pas modifiée
+        Rx_0, Rx_1 = self.alignment.apply(*frame)
+        self.Rx_0, self.Rx_1 = Rx_0, Rx_1
+        self.latest_frame = (Rx_0, Rx_1)
+        self._aligned_source = frame
 
 
 ########################################################################################################################
@@ -272,46 +630,201 @@ from PyQt5.QtCore import QThread, pyqtSignal
 
 
 class MonopulseAngleEstimatorThread(QThread):
-    """Classe pour exécuter l'estimation de l'angle de direction dans un thread séparé."""
+    """
+    Classe pour exécuter l'estimation de l'angle de direction dans un thread séparé.
+
+    Chaque trame reçue (estimator.frame_seq) est estimée, émise et journalisée une seule fois ; sans nouvelle
+    trame, le thread attend un threading.Event signalé par set_new_data et stop (au plus 100 ms, pour les
+    captures de profilage demandées).
+    """
 
     AoA_ready = pyqtSignal(object)  # Signal pour envoyer les résultats
     reset_calibration_signal = pyqtSignal()
+    profile_report = pyqtSignal(str)  # Rapports de profilage (latences par étape, cProfile, tracemalloc)
+    status = pyqtSignal(str, str)  # Messages pour le journal de l'interface (texte, couleur)
 
-    def __init__(self, step_deg=0.1, window_size=1, f0=2227e6, d_wavelength=0.5):
+    def __init__(self, step_deg=0.1, window_size=1, f0=2227e6, d_wavelength=0.5, precision=None,
+                 calibration_cache=None, align_channels=False, sub_blocks=1, sub_block_overlap=0.0, doa_log=None):
 
         super().__init__()
 
-        self.estimator = MonopulseAngleEstimator(step_deg, window_size, f0, d_wavelength)
+        # Journal des estimations sur disque (cf. doa_log.py) ; la qualité n'est mesurée que s'il est tenu
+        self.doa_log = doa_log
+        self.estimator = MonopulseAngleEstimator(step_deg, window_size, f0, d_wavelength, precision, align_channels,
+                                                 sub_blocks, sub_block_overlap, measure_quality=doa_log is not None)
         self.reset_calibration_signal.connect(self.estimator.reset_calibration)
 
+        # Cache des calibrations de phase sur disque (cf. calibration_cache.py), distinct si les voies sont alignées
+        self.calibration_cache = calibration_cache or CalibrationCache(calibration_cache_path(align_channels))
+
+        self.new_data = threading.Event()
+        self._running = False
+
     def run(self):
         """Fonction principale du thread pour l'estimation de l'angle de direction."""
 
         print("tata")
 
-        while True:
+        self._running = True
+        last_seq = None
+        while self._running:
+            # Captures cProfile/tracemalloc demandées depuis l'interface ou la ligne de commande
+            report = self.estimator.profiler.poll()
+            if report is not None:
+                self.profile_report.emit(report)
+
+            # Effacé avant la lecture : une trame reçue pendant le calcul signale à nouveau l'événement
+            self.new_data.clear()
+            seq = self.estimator.frame_seq
+            if seq == last_seq:
+                self.new_data.wait(0.1)
+                continue
+            last_seq = seq
+
+            # Aligner la dernière trame reçue (si l'alignement des voies est activé)
+            self.estimator.prepare_frame()
+
             # Si les deux signaux reçus sont disponibles
             if self.estimator.Rx_0 is not None and self.estimator.Rx_1 is not None:
 
-                # Si la calibration de phase n'a pas encore été effectuée
+                # Si la calibration de phase n'a pas encore été effectuée (ou n'est pas dans le cache)
                 if not self.estimator.calibrated:
-                    self.estimator.phase_cal = 0
-                    self.estimator.Autocal()
+                    source = self.estimator.calibrate(self.calibration_cache)
+                    alignment, self.estimator.last_alignment = self.estimator.last_alignment, None
+                    if alignment is not None:
+                        self.status.emit(f"Alignement des voies : retard {alignment['delay_samples']:.3f} éch., "
+                                         f"gain {alignment['gain_db']:.2f} dB", 'green')
+                    self.status.emit(f"Calibration de phase ({source}) : {self.estimator.phase_cal} °", 'green')
 
                 # Suivre l'angle de direction
                 self.estimator.tracking()
 
-                # Envoyer le déphasage via le signal
-                self.AoA_ready.emit(self.estimator.last_phase_delay)
+                # Un déphasage par sous-bloc si le buffer est découpé, sinon le dernier
+                phase_delays, qualities = self.estimator.last_estimates()
+
+                for phase_delay, quality in zip(phase_delays, qualities):
+                    # Envoyer le déphasage via le signal
+                    self.AoA_ready.emit(phase_delay)
+
+                    # Conserver le déphasage dans la fenêtre mobile
+                    self.estimator.add_sample(phase_delay)
+
+                    # Et dans le journal sur disque
+                    if self.doa_log is not None:
+                        self.doa_log.append(phase_delay, self.estimator.calcTheta(phase_delay), quality,
+                                            self.estimator.config_generation)
 
-                # Conserver le dernier déphasage dans la fenêtre mobile
-                self.estimator.add_sample(self.estimator.last_phase_delay)
+    def update_parameters(self, step_deg=None, window_size=None, f0=None, sub_blocks=None, sub_block_overlap=None):
+        self.estimator.update_parameters(step_deg, window_size, f0, sub_blocks, sub_block_overlap)
 
-    def update_parameters(self, step_deg=None, window_size=None, f0=None):
-        self.estimator.update_parameters(step_deg, window_size, f0)
+    def stop(self):
+        self._running = False
+        self.new_data.set()
 
     def set_new_data(self, Rx_0, Rx_1):
         self.estimator.set_new_data(Rx_0, Rx_1)
+        self.new_data.set()
+
+    def set_rf_config(self, rf_config):
+        self.estimator.set_rf_config(rf_config)
+
+    def request_profiling(self, kind, enabled=None):
+        """ Active (True), arrête (False) ou bascule (None) une capture 'cprofile' ou 'tracemalloc' du thread. """
+        if kind == 'cprofile':
+            self.estimator.profiler.request_cprofile(enabled)
+        elif kind == 'tracemalloc':
+            self.estimator.profiler.request_tracemalloc(enabled)
+
+    def report_latencies(self):
+        self.profile_report.emit(self.estimator.profiler.report())
+
+
+class DriftRecalibrationThread(QThread):
+    """
+    Mesure (et correction, si une référence est connue) de la dérive de phase en tâche de fond, pendant que
+    le suivi continue.
+
+    Toutes les interval secondes, le thread copie un sous-échantillonnage (1 échantillon sur decimation,
+    au plus max_samples) de la dernière trame et y applique la recherche hiérarchique avec son propre
+    estimateur (et donc ses propres tampons). Le pic du balayage est le pointage absolu de l'émetteur.
+
+    La dérive ne se mesure que par rapport à un émetteur de direction connue : comme Autocal, qui suppose
+    l'émetteur de calibration dans l'axe, le thread suppose l'émetteur à reference_angle (degrés) et attend
+    donc le pic en phase_cal + calcDeltaPhase(reference_angle). L'écart est la dérive : elle est ajoutée à
+    phase_cal (une seule affectation ; tracking() et process_batch ne lisent phase_cal qu'une fois par appel),
+    incrémente la génération de configuration (cf. doa_log.py) et est enregistrée dans le cache. Un écart
+    supérieur à max_drift_deg (émetteur de référence absent ou déplacé) n'est pas appliqué.
+
+    Sans référence (reference_angle None), le pic coïncide avec le pointage du suivi accroché : l'écart n'est
+    que le résidu du suivi et le bruit du balayage. Il est seulement signalé, ni appliqué ni enregistré.
+    """
+
+    drift_measured = pyqtSignal(float, float, bool)  # Dérive mesurée, phase_cal après la mesure, appliquée ou non
+
+    def __init__(self, estimator, calibration_cache=None, interval=60, decimation=8, max_samples=2 ** 15,
+                 max_drift_deg=10, reference_angle=None):
+
+        super().__init__()
+
+        self.estimator = estimator
+        self.calibration_cache = calibration_cache
+        self.interval = interval
+        self.decimation = decimation
+        self.max_samples = max_samples
+        self.max_drift_deg = max_drift_deg
+        self.reference_angle = reference_angle  # Direction connue de l'émetteur de référence (None : mesure seule)
+
+        self.scan_estimator = MonopulseAngleEstimator(precision=estimator.precision)
+        self._running = False
+
+    def start(self, priority=QThread.LowestPriority):
+        super().start(priority)
+
+    def run(self):
+        self._running = True
+
+        while self._running:
+            # Attente par tranches de 100 ms pour pouvoir arrêter le thread rapidement
+            for _ in range(int(self.interval * 10)):
+                if not self._running:
+                    return
+                self.msleep(100)
+
+            # Pas de recalibration tant que la calibration initiale n'est pas faite
+            if not self.estimator.calibrated or self.estimator.latest_frame is None:
+                continue
+            self.recalibrate()
+
+    def recalibrate(self):
+        """ Mesure la dérive sur une copie sous-échantillonnée de la dernière trame ; retourne True si elle est appliquée. """
+        Rx_0, Rx_1 = self.estimator.latest_frame
+        Rx_0 = np.ascontiguousarray(Rx_0[::self.decimation][:self.max_samples])
+        Rx_1 = np.ascontiguousarray(Rx_1[::self.decimation][:self.max_samples])
+        phase_cal = float(self.estimator.phase_cal)
+
+        # Pointage attendu : émetteur de référence, à défaut pointage courant du suivi (mesure seule)
+        if self.reference_angle is not None:
+            expected = phase_cal + self.estimator.calcDeltaPhase(self.reference_angle)
+        else:
+            expected = phase_cal + float(self.estimator.last_phase_delay)
+
+        # Le balayage (estimateur sans calibration) donne le pointage absolu du pic
+        peak = self.scan_estimator.scan_for_DOA_hierarchical(Rx_0, Rx_1)['peak_delay']
+        drift = (peak - expected + 180) % 360 - 180
+
+        applied = self.reference_angle is not None and abs(drift) <= self.max_drift_deg
+        if applied:
+            phase_cal = (phase_cal + drift + 180) % 360 - 180
+            self.estimator.phase_cal = phase_cal
+            self.estimator.config_generation += 1
+            if self.calibration_cache is not None and self.estimator.rf_config is not None:
+                self.calibration_cache.store(self.estimator.rf_config, phase_cal)
+
+        self.drift_measured.emit(drift, phase_cal, applied)
+        return applied
+
+    def stop(self):
+        self._running = False
 
 
 
@@ -1,6 +1,8 @@
 import numpy as np
 import pyfftw
-import cProfile
+
+import fft_cache
+from profiling import StageProfiler
 
 pyfftw.interfaces.cache.enable()
 pyfftw.config.PLANNER_EFFORT = 'FFTW_MEASURE'
@@ -33,6 +35,7 @@ class MonopulseAngleEstimator:
         """ Echantillonnage """
         self.full_scale = 2 ** 11  # Pleine échelle pour l'ADC du PlutoSDR
         self.win = None  # Fenêtre Hanning pour réduire les fuites spectrales
+        self.win_sum = None  # Somme de la fenêtre pour normaliser la FFT
         self.fft_object = None  # Objet FFTW pour la transformation de Fourier rapide
 
         """ Calibration de phase """
@@ -57,11 +60,12 @@ class MonopulseAngleEstimator:
     ########################################### Spectre de fréquence #######################################################
     ########################################################################################################################
     def hanning(self, buffer_size):
-        """ Crée une fenêtre Hanning pour réduire les fuites spectrales. """
-        self.win = np.hanning(buffer_size)
+        """ Récupère la fenêtre Hanning partagée pour réduire les fuites spectrales. """
+        self.win = fft_cache.window(buffer_size)
+        self.win_sum = fft_cache.window_sum(buffer_size)
 
-        # Préparer l'objet FFTW pour éviter la répétition de la planification
-        self.fft_object = pyfftw.builders.fft(np.empty(len(self.win), dtype='complex64'))
+        # Plan FFTW partagé pour éviter la répétition de la planification
+        self.fft_object = fft_cache.fft_plan(buffer_size, np.complex128, backend='pyfftw')
 
     def fft(self, raw_data):
         """
@@ -78,7 +82,7 @@ class MonopulseAngleEstimator:
         y = raw_data * self.win
 
         # Calcul de la FFT normalisée par la somme de la fenêtre en utilisant FFTW
-        s_fft = self.fft_object(y) / np.sum(self.win)
+        s_fft = self.fft_object(y) / self.win_sum
 
         # Décalage zéro-fréquence au centre du spectre
         s_shift = np.fft.fftshift(s_fft)
@@ -299,19 +303,26 @@ class MonopulseAngleEstimatorThread(QThread):
         self.estimator = MonopulseAngleEstimator(step_deg, window_size, f0, d_wavelength)
         self.reset_calibration_signal.connect(self.estimator.reset_calibration)
 
+        # Chronomètres et captures à la demande (cf. profiling.py)
+        self.profiler = StageProfiler('estimator2')
+
     def run(self):
         """Fonction principale du thread pour l'estimation de l'angle de direction."""
 
         print("tata")
 
         while True:
+            # Captures cProfile/tracemalloc demandées à la volée (remplace le cProfile systématique de l'Autocal)
+            report = self.profiler.poll()
+            if report is not None:
+                print(report)
+
             # Si les deux signaux reçus sont disponibles
             if self.estimator.Rx_0 is not None and self.estimator.Rx_1 is not None:
 
                 # Si la calibration de phase n'a pas encore été effectuée
                 if not self.estimator.calibrated:
                     self.estimator.phase_cal = 0
-                    # self.estimator.Autocal()
 
                     print(self.estimator.Rx_0)
                     print(self.estimator.Rx_1)
@@ -322,7 +333,7 @@ class MonopulseAngleEstimatorThread(QThread):
                     print(
                         f"Rx_1 type: {type(self.estimator.Rx_1)}, dtype: {self.estimator.Rx_1.dtype}, shape: {self.estimator.Rx_1.shape}")
 
-                    cProfile.runctx('self.estimator.Autocal()', globals(), locals(), 'profiling_results.prof')
+                    self.estimator.Autocal()
 
                 # Suivre l'angle de direction
                 self.estimator.tracking()
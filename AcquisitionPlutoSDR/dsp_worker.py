@@ -0,0 +1,460 @@
+"""
+Exécution du DSP (estimation d'angle et spectres) dans des processus séparés.
+
+Les buffers Rx_0/Rx_1 ne sont jamais sérialisés : ils sont copiés dans des emplacements d'un anneau
+en mémoire partagée (multiprocessing.shared_memory) et seuls de petits messages (numéro d'emplacement,
+numéro de trame, résultats scalaires) transitent par les files de messages. Les calculs profitent ainsi
+de cœurs supplémentaires sans entrer en concurrence avec l'acquisition et Qt pour le GIL.
+
+Messages vers les processus de calcul:
+- ('frame', slot, seq, length): nouvelle trame disponible dans l'emplacement slot.
+- ('params', kwargs): mise à jour des paramètres de l'estimateur.
+- ('reset_calibration',): relance la calibration de phase.
+- ('rf_config', rf_config): nouvelle configuration RF (calibration relue dans le cache ou refaite).
+- ('profile', kind, enabled): capture 'cprofile' ou 'tracemalloc' du processus DOA (cf. profiling.py).
+- ('latency_report',): demande le résumé des latences par étape de l'estimateur.
+- None: arrêt du processus.
+
+Messages vers le processus principal:
+- ('release', slot): l'emplacement slot n'est plus utilisé par le processus émetteur.
+- ('doa', seq, estimates, phase_cal, generation): nouveaux déphasages suivis (un par sous-bloc, cf. dsp.py), du plus
+  ancien au plus récent, sous forme de triplets (date, déphasage, qualité) ; generation est la génération de
+  configuration de l'estimateur (cf. doa_log.py).
+- ('spectrum', slot, seq, length): spectres en dBm écrits dans l'anneau des spectres.
+- ('report', text): rapport de profilage du processus DOA.
+"""
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import precision as prec
+
+
+class SharedRing:
+    """ Anneau de n_slots tableaux de forme shape, alloué dans un bloc de mémoire partagée. """
+
+    def __init__(self, n_slots, shape, dtype, name=None):
+        self.n_slots = n_slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None  # Seul le créateur du bloc le libère (unlink)
+
+        size = n_slots * int(np.prod(self.shape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.array = np.ndarray((n_slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def description(self):
+        """ Paramètres (sérialisables) permettant à un autre processus de s'attacher à l'anneau. """
+        return {'n_slots': self.n_slots, 'shape': self.shape, 'dtype': self.dtype.str, 'name': self.name}
+
+    @classmethod
+    def attach(cls, description):
+        return cls(**description)
+
+    def slot(self, index):
+        """ Vue (sans copie) sur l'emplacement index. """
+        return self.array[index]
+
+    def close(self):
+        # Les vues numpy doivent être libérées avant de fermer le bloc
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+########################################################################################################################
+############################################ Processus de calcul #######################################################
+########################################################################################################################
+
+def _doa_worker(frames_description, tasks, results, estimator_kwargs, report_interval=0.01):
+    """
+    Boucle du processus d'estimation d'angle (même logique que MonopulseAngleEstimatorThread.run).
+
+    Chaque trame reçue est suivie une seule fois (sans nouvelle trame, le processus attend le message
+    suivant). Les déphasages sont envoyés au plus une fois toutes les report_interval secondes pour ne pas
+    inonder le processus principal de messages : tous ceux suivis depuis le dernier envoi (un par trame, ou
+    un par sous-bloc) sont envoyés ensemble, le journal des angles recevant ainsi chaque estimation.
+    """
+    from dsp import MonopulseAngleEstimator
+    from calibration_cache import CalibrationCache
+    from channel_alignment import calibration_cache_path
+
+    frames = SharedRing.attach(frames_description)
+    estimator = MonopulseAngleEstimator(**estimator_kwargs)
+    calibration_cache = CalibrationCache(calibration_cache_path(estimator_kwargs.get('align_channels', False)))
+    current_slot = None
+    seq = -1
+    tracked_seq = -1  # Dernière trame suivie
+    running = True
+    last_report = 0
+    pending = []  # Déphasages suivis (date, déphasage, qualité) depuis le dernier envoi
+
+    while running:
+        # Sans nouvelle trame, on attend le message suivant (au plus 100 ms, pour les captures de profilage
+        # et l'envoi des déphasages en attente) ; ensuite on vide la file sans bloquer
+        messages = []
+        if seq == tracked_seq:
+            try:
+                messages.append(tasks.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        while True:
+            try:
+                messages.append(tasks.get_nowait())
+            except queue.Empty:
+                break
+
+        for message in messages:
+            if message is None:
+                running = False
+                break
+
+            if message[0] == 'frame':
+                # Seule la trame la plus récente est suivie : l'emplacement précédent est rendu
+                _, slot, seq, length = message
+                if current_slot is not None:
+                    results.put(('release', current_slot))
+                current_slot = slot
+                estimator.set_new_data(frames.slot(slot)[0, :length], frames.slot(slot)[1, :length])
+
+            elif message[0] == 'params':
+                estimator.update_parameters(**message[1])
+
+            elif message[0] == 'reset_calibration':
+                estimator.reset_calibration()
+
+            elif message[0] == 'rf_config':
+                estimator.set_rf_config(message[1])
+
+            elif message[0] == 'profile':
+                _, kind, enabled = message
+                if kind == 'cprofile':
+                    estimator.profiler.request_cprofile(enabled)
+                elif kind == 'tracemalloc':
+                    estimator.profiler.request_tracemalloc(enabled)
+
+            elif message[0] == 'latency_report':
+                results.put(('report', estimator.profiler.report()))
+
+        # Captures demandées, appliquées dans ce processus
+        report = estimator.profiler.poll()
+        if report is not None:
+            results.put(('report', report))
+
+        if running and current_slot is not None and seq != tracked_seq:
+            tracked_seq = seq
+            _track_frame(estimator, calibration_cache, pending)
+
+        now = time.monotonic()
+        if pending and now - last_report >= report_interval:
+            results.put(('doa', seq, pending, estimator.phase_cal, estimator.config_generation))
+            pending = []
+            last_report = now
+
+    # Déphasages suivis depuis le dernier envoi
+    if pending:
+        results.put(('doa', seq, pending, estimator.phase_cal, estimator.config_generation))
+
+    # Libérer les vues sur la mémoire partagée avant de la fermer
+    estimator.Rx_0 = estimator.Rx_1 = None
+    frames.close()
+
+
+def _track_frame(estimator, calibration_cache, pending):
+    """ Suit la trame courante et ajoute ses déphasages (date, déphasage, qualité) à pending. """
+    # Aligner la dernière trame reçue (si l'alignement des voies est activé)
+    estimator.prepare_frame()
+
+    # Si la calibration de phase n'a pas encore été effectuée
+    if not estimator.calibrated:
+        estimator.calibrate(calibration_cache)
+
+    # Suivre l'angle de direction
+    estimator.tracking()
+    timestamp = time.time()
+    phase_delays, qualities = estimator.last_estimates()
+    pending.extend((timestamp, phase_delay, quality) for phase_delay, quality in zip(phase_delays, qualities))
+
+
+def _spectrum_worker(frames_description, spectra_description, tasks, results, precision):
+    """ Boucle du processus de calcul des spectres des deux cannaux. """
+    import spectrum
+
+    frames = SharedRing.attach(frames_description)
+    spectra = SharedRing.attach(spectra_description)
+
+    while True:
+        message = tasks.get()
+        if message is None:
+            break
+        if message[0] != 'frame':
+            continue
+
+        _, slot, seq, length = message
+        for channel in range(2):
+            spectra.slot(slot)[channel, :length] = spectrum.power_spectrum_dbm(
+                frames.slot(slot)[channel, :length], precision)
+
+        # Le spectre est écrit dans l'emplacement de même numéro : la trame peut être rendue
+        results.put(('spectrum', slot, seq, length))
+        results.put(('release', slot))
+
+    frames.close()
+    spectra.close()
+
+
+########################################################################################################################
+############################################ Pool de processus #########################################################
+########################################################################################################################
+
+class DSPProcessPool:
+    """
+    Distribue les trames aux processus de calcul (DOA et spectres) via l'anneau en mémoire partagée.
+
+    Un emplacement est réutilisé seulement lorsque tous les processus l'ont rendu ; si aucun
+    emplacement n'est libre, la trame est ignorée (comptée dans dropped_frames) plutôt que de
+    bloquer l'acquisition.
+    """
+
+    def __init__(self, buffer_size=2 ** 18, n_slots=4, precision=None, doa=True, spectrum=True,
+                 estimator_kwargs=None):
+        self.precision = prec.check_precision(precision)
+        self.buffer_size = buffer_size
+        self.n_slots = n_slots
+
+        self.frames = SharedRing(n_slots, (2, buffer_size), prec.complex_dtype(self.precision))
+        self.spectra = SharedRing(n_slots, (2, buffer_size), prec.real_dtype(self.precision))
+
+        # Le mode 'spawn' est le seul disponible sous Windows, on l'utilise partout pour un comportement identique
+        context = mp.get_context('spawn')
+        self.results = context.Queue()
+        self.doa_tasks = context.Queue() if doa else None
+        self.spectrum_tasks = context.Queue() if spectrum else None
+
+        self.processes = []
+        if doa:
+            estimator_kwargs = dict(estimator_kwargs or {}, precision=self.precision)
+            self.processes.append(context.Process(
+                target=_doa_worker, daemon=True,
+                args=(self.frames.description(), self.doa_tasks, self.results, estimator_kwargs)))
+        if spectrum:
+            self.processes.append(context.Process(
+                target=_spectrum_worker, daemon=True,
+                args=(self.frames.description(), self.spectra.description(), self.spectrum_tasks, self.results,
+                      self.precision)))
+
+        # Le processus DOA ne reçoit les trames qu'une fois l'estimation d'angle demandée
+        self.doa_enabled = False
+
+        # Nombre de processus utilisant encore chaque emplacement
+        self.slot_users = [0] * n_slots
+        self.lock = threading.Lock()
+        self.next_slot = 0
+        self.seq = 0
+        self.dropped_frames = 0
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def task_queues(self):
+        return [tasks for tasks in (self.doa_tasks, self.spectrum_tasks) if tasks is not None]
+
+    def frame_queues(self):
+        """ Files des processus auxquels les nouvelles trames sont envoyées. """
+        doa_tasks = self.doa_tasks if self.doa_enabled else None
+        return [tasks for tasks in (doa_tasks, self.spectrum_tasks) if tasks is not None]
+
+    def submit(self, Rx_0, Rx_1):
+        """
+        Copie une trame dans un emplacement libre et la signale aux processus de calcul.
+
+        Retourne:
+        - Le numéro de trame, ou None si la trame a été ignorée faute d'emplacement libre.
+        """
+        length = min(len(Rx_0), len(Rx_1), self.buffer_size)
+
+        with self.lock:
+            for offset in range(self.n_slots):
+                slot = (self.next_slot + offset) % self.n_slots
+                if self.slot_users[slot] == 0:
+                    break
+            else:
+                self.dropped_frames += 1
+                return None
+
+            queues = self.frame_queues()
+            if not queues:
+                return None
+            self.slot_users[slot] = len(queues)
+            self.next_slot = (slot + 1) % self.n_slots
+            self.seq += 1
+            seq = self.seq
+
+        frame = self.frames.slot(slot)
+        frame[0, :length] = Rx_0[:length]
+        frame[1, :length] = Rx_1[:length]
+
+        for tasks in queues:
+            tasks.put(('frame', slot, seq, length))
+        return seq
+
+    def send_control(self, *message):
+        """ Envoie un message de contrôle ('params', 'reset_calibration', 'rf_config', ...) au processus DOA. """
+        if self.doa_tasks is not None:
+            self.doa_tasks.put(message)
+
+    def release(self, slot):
+        with self.lock:
+            self.slot_users[slot] = max(0, self.slot_users[slot] - 1)
+
+    def get_result(self, timeout=None):
+        """
+        Attend le prochain résultat. Les messages 'release' sont traités ici et ne sont pas retournés.
+
+        Retourne:
+        - Le message de résultat, ou None si le délai timeout a expiré.
+        """
+        while True:
+            try:
+                message = self.results.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            if message[0] == 'release':
+                self.release(message[1])
+                continue
+            return message
+
+    def read_spectra(self, slot, length):
+        """ Copie les spectres (Rx0, Rx1) de l'emplacement slot, avant qu'il ne soit réutilisé. """
+        output = self.spectra.slot(slot)
+        return output[0, :length].copy(), output[1, :length].copy()
+
+    def stop(self):
+        for tasks in self.task_queues():
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.frames.close()
+        self.spectra.close()
+
+
+########################################################################################################################
+################################################# Class Thread #########################################################
+########################################################################################################################
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from dsp import MonopulseAngleEstimator
+
+
+class DSPProcessPoolThread(QThread):
+    """
+    Relais Qt du pool de processus : reçoit les résultats et les émet sous forme de signaux.
+
+    Expose la même interface que MonopulseAngleEstimatorThread (AoA_ready, reset_calibration_signal,
+    update_parameters, set_new_data, estimator) afin d'être utilisé indifféremment par l'interface.
+    L'attribut estimator est un miroir local qui ne fait aucun calcul : il conserve le déphasage,
+    la calibration et la fenêtre de moyennage.
+    """
+
+    AoA_ready = pyqtSignal(object)  # Signal pour envoyer les résultats
+    spectrum_ready = pyqtSignal(object, object)  # Spectres Rx0 et Rx1 en dBm
+    reset_calibration_signal = pyqtSignal()
+    profile_report = pyqtSignal(str)
+
+    def __init__(self, buffer_size=2 ** 18, n_slots=4, step_deg=0.1, window_size=1, f0=2227e6, d_wavelength=0.5,
+                 precision=None, doa=True, spectrum=True, align_channels=False, sub_blocks=1, sub_block_overlap=0.0,
+                 doa_log=None):
+
+        super().__init__()
+
+        # Journal des estimations sur disque (cf. doa_log.py) ; la qualité n'est mesurée que s'il est tenu
+        self.doa_log = doa_log
+        estimator_kwargs = {'step_deg': step_deg, 'window_size': window_size, 'f0': f0,
+                            'd_wavelength': d_wavelength, 'align_channels': align_channels,
+                            'sub_blocks': sub_blocks, 'sub_block_overlap': sub_block_overlap,
+                            'measure_quality': doa_log is not None}
+        self.pool = DSPProcessPool(buffer_size, n_slots, precision, doa, spectrum, estimator_kwargs)
+        self.estimator = MonopulseAngleEstimator(**estimator_kwargs, precision=precision)
+        self.reset_calibration_signal.connect(self.reset_calibration)
+        self._running = False
+
+    def run(self):
+        self._running = True
+        self.pool.start()
+
+        while self._running:
+            message = self.pool.get_result(timeout=0.1)
+            if message is None:
+                continue
+
+            if message[0] == 'doa':
+                _, seq, estimates, phase_cal, generation = message
+                self.estimator.last_phase_delay = estimates[-1][1]
+                self.estimator.phase_cal = phase_cal
+                self.estimator.config_generation = generation
+                self.estimator.calibrated = True
+
+                # Envoyer les déphasages via le signal, les conserver dans la fenêtre mobile et dans le journal
+                for timestamp, phase_delay, quality in estimates:
+                    self.AoA_ready.emit(phase_delay)
+                    self.estimator.add_sample(phase_delay)
+                    if self.doa_log is not None:
+                        self.doa_log.append(phase_delay, self.estimator.calcTheta(phase_delay), quality, generation,
+                                            timestamp)
+
+            elif message[0] == 'spectrum':
+                _, slot, seq, length = message
+                self.spectrum_ready.emit(*self.pool.read_spectra(slot, length))
+
+            elif message[0] == 'report':
+                self.profile_report.emit(message[1])
+
+        self.pool.stop()
+
+    def stop(self):
+        self._running = False
+
+    def enable_doa(self):
+        """ Démarre l'estimation d'angle dans le processus DOA (la calibration est faite à la première trame). """
+        self.pool.doa_enabled = True
+
+    def reset_calibration(self):
+        self.estimator.reset_calibration()
+        self.pool.send_control('reset_calibration')
+
+    def update_parameters(self, step_deg=None, window_size=None, f0=None, sub_blocks=None, sub_block_overlap=None):
+        self.estimator.update_parameters(step_deg, window_size, f0, sub_blocks, sub_block_overlap)
+        self.pool.send_control('params', {'step_deg': step_deg, 'window_size': window_size, 'f0': f0,
+                                          'sub_blocks': sub_blocks, 'sub_block_overlap': sub_block_overlap})
+
+    def set_rf_config(self, rf_config):
+        self.estimator.set_rf_config(rf_config)
+        self.pool.send_control('rf_config', rf_config)
+
+    def request_profiling(self, kind, enabled=None):
+        """ Capture 'cprofile' ou 'tracemalloc' dans le processus DOA (None : bascule). """
+        if kind == 'cprofile':
+            self.estimator.profiler.request_cprofile(enabled)
+            enabled = self.estimator.profiler.cprofile_requested
+        elif kind == 'tracemalloc':
+            self.estimator.profiler.request_tracemalloc(enabled)
+            enabled = self.estimator.profiler.tracemalloc_requested
+        self.pool.send_control('profile', kind, enabled)
+
+    def report_latencies(self):
+        self.pool.send_control('latency_report')
+
+    def set_new_data(self, Rx_0, Rx_1):
+        self.pool.submit(Rx_0, Rx_1)
@@ -0,0 +1,200 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import pyfftw
+    import pyfftw.builders
+except ImportError:
+    pyfftw = None
+
+
+class SpectralCache:
+    """
+    Cache partagé des fenêtres, constantes de normalisation, axes de fréquence et plans FFT.
+
+    Toutes les entrées sont indexées par (type, longueur, dtype, ...) et l'éviction se fait
+    selon l'ordre LRU dès que le nombre d'entrées dépasse max_entries. Les tableaux retournés
+    sont en lecture seule car ils sont partagés entre tous les consommateurs (threads compris).
+    """
+
+    def __init__(self, max_entries=32, backend=None):
+        self.max_entries = max_entries  # Nombre maximal d'entrées conservées
+        self.backend = backend or ('pyfftw' if pyfftw is not None else 'numpy')  # Bibliothèque FFT utilisée
+        self.fftw_threads = 4  # Nombre de threads alloués à chaque plan FFTW
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, factory):
+        """ Retourne l'entrée associée à key, en la créant avec factory() si nécessaire. """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        # La création (planification FFTW notamment) se fait hors du verrou
+        value = factory()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """ Vide le cache. """
+        with self._lock:
+            self._entries.clear()
+
+    ####################################################################################################################
+    ################################################ Fenêtres ##########################################################
+    ####################################################################################################################
+
+    def window(self, length, dtype=np.float64, kind='hanning'):
+        """
+        Fenêtre d'apodisation précalculée.
+
+        Paramètres:
+        - length (int): Nombre d'échantillons.
+        - dtype: Type réel de la fenêtre (float32 ou float64).
+        - kind (str): Nom de la fenêtre numpy ('hanning', 'hamming', 'blackman', ...).
+
+        Retourne:
+        - win (array): Fenêtre en lecture seule.
+        """
+        dtype = np.dtype(dtype)
+
+        def factory():
+            win = getattr(np, kind)(length).astype(dtype)
+            win.setflags(write=False)
+            return win
+
+        return self._get(('window', length, dtype, kind), factory)
+
+    def window_squared(self, length, dtype=np.float64, kind='hanning'):
+        """ Carré de la fenêtre, utilisé par les corrélations pondérées calculées dans le domaine temporel. """
+        dtype = np.dtype(dtype)
+
+        def factory():
+            win2 = np.square(self.window(length, dtype, kind))
+            win2.setflags(write=False)
+            return win2
+
+        return self._get(('window_squared', length, dtype, kind), factory)
+
+    def window_sum(self, length, dtype=np.float64, kind='hanning'):
+        """ Somme de la fenêtre (gain cohérent), utilisée pour normaliser les FFT. """
+        dtype = np.dtype(dtype)
+        return self._get(('window_sum', length, dtype, kind),
+                         lambda: float(np.sum(self.window(length, dtype, kind), dtype=np.float64)))
+
+    ####################################################################################################################
+    ############################################ Axes de fréquence #####################################################
+    ####################################################################################################################
+
+    def fftfreq(self, length, sampling_rate, dtype=np.float64, shift=True, scale=1.0):
+        """
+        Axe des fréquences d'une FFT de taille length.
+
+        Paramètres:
+        - length (int): Taille de la FFT.
+        - sampling_rate (float): Fréquence d'échantillonnage en Hz.
+        - shift (bool): Centre la fréquence nulle (équivalent à np.fft.fftshift).
+        - scale (float): Facteur de division appliqué à l'axe (1e6 pour des MHz).
+
+        Retourne:
+        - freqs (array): Axe des fréquences en lecture seule.
+        """
+        dtype = np.dtype(dtype)
+
+        def factory():
+            freqs = np.fft.fftfreq(length, 1 / sampling_rate)
+            if shift:
+                freqs = np.fft.fftshift(freqs)
+            freqs = (freqs / scale).astype(dtype)
+            freqs.setflags(write=False)
+            return freqs
+
+        return self._get(('fftfreq', length, dtype, float(sampling_rate), shift, float(scale)), factory)
+
+    ####################################################################################################################
+    ################################################ Plans FFT #########################################################
+    ####################################################################################################################
+
+    def fft_plan(self, length, dtype=np.complex128, backend=None):
+        """
+        Plan FFT directe pour des tableaux complexes de taille length.
+
+        Les plans FFTW possèdent leurs propres tampons d'entrée/sortie : ils sont donc créés
+        pour chaque thread, et le tableau retourné par un plan est réutilisé par l'appel suivant
+        du même thread. Le consommateur doit le copier s'il veut le conserver.
+
+        Paramètres:
+        - length (int ou tuple): Taille de la FFT, ou forme (trames, échantillons) d'une pile de trames
+          transformées ensemble le long du dernier axe.
+        - dtype: Type complexe des données (complex64 ou complex128).
+        - backend (str): 'numpy' ou 'pyfftw'. Par défaut, celui du cache.
+
+        Retourne:
+        - plan (callable): Fonction plan(x) retournant la FFT de x.
+        """
+        dtype = np.dtype(dtype)
+        backend = backend or self.backend
+
+        if backend == 'numpy':
+            if dtype == np.complex128:
+                return np.fft.fft
+
+            # Les anciennes versions de numpy calculent toujours en complex128 : on conserve le type demandé
+            def numpy_fft(x):
+                return np.fft.fft(x).astype(dtype, copy=False)
+
+            return numpy_fft
+
+        if backend == 'pyfftw':
+            if pyfftw is None:
+                raise ImportError("pyfftw n'est pas installé")
+
+            def factory():
+                return pyfftw.builders.fft(pyfftw.empty_aligned(length, dtype=dtype),
+                                           planner_effort='FFTW_ESTIMATE', threads=self.fftw_threads)
+
+            return self._get(('fft_plan', length, dtype, backend, threading.get_ident()), factory)
+
+        raise ValueError(f"Backend FFT inconnu: {backend}")
+
+
+########################################################################################################################
+############################################### Cache du processus #####################################################
+########################################################################################################################
+
+# Instance unique partagée par tous les consommateurs spectraux de l'application
+shared_cache = SpectralCache()
+
+
+def window(length, dtype=np.float64, kind='hanning'):
+    return shared_cache.window(length, dtype, kind)
+
+
+def window_squared(length, dtype=np.float64, kind='hanning'):
+    return shared_cache.window_squared(length, dtype, kind)
+
+
+def window_sum(length, dtype=np.float64, kind='hanning'):
+    return shared_cache.window_sum(length, dtype, kind)
+
+
+def fftfreq(length, sampling_rate, dtype=np.float64, shift=True, scale=1.0):
+    return shared_cache.fftfreq(length, sampling_rate, dtype, shift, scale)
+
+
+def fft_plan(length, dtype=np.complex128, backend=None):
+    return shared_cache.fft_plan(length, dtype, backend)
+
+
+def available_backends():
+    """ Liste des bibliothèques FFT disponibles dans l'environnement. """
+    return ['numpy'] + (['pyfftw'] if pyfftw is not None else [])
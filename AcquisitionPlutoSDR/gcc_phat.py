@@ -0,0 +1,233 @@
+"""
+Estimation du retard entre les voies Rx_0 et Rx_1 par intercorrélation généralisée (GCC-PHAT).
+
+L'interspectre conj(X0) * X1 est normalisé bin par bin (pondération PHAT : seule la phase est conservée),
+ce qui rend le pic de corrélation étroit quel que soit le spectre du signal. L'interspectre normalisé est
+moyenné d'une trame à l'autre (lissage exponentiel), puis la corrélation est obtenue par FFT inverse.
+
+Le pic de corrélation donne le retard entier. Le pic PHAT ayant la forme d'un sinus cardinal, une parabole
+passant par le pic et ses deux voisins sous-estime la partie fractionnaire (jusqu'à 0.2 échantillon). Par
+défaut (interpolation='sinc'), la corrélation complexe est donc d'abord interpolée à bande limitée (sinus
+cardinal fenêtré sur 2 * sinc_half_width + 1 retards) sur une grille fine autour du pic, puis la parabole
+est ajustée sur cette grille. La parabole directe reste disponible (interpolation='parabolic').
+
+Chaque trame coûte trois FFT de la taille du buffer (deux directes, une inverse calculée avec le plan
+direct : ifft(x) = conj(fft(conj(x))) / N) ; la recherche du pic et l'interpolation ne portent que sur
+quelques dizaines de retards. Pour un buffer de 2^18 échantillons, cela fait environ 30 ms, soit plus que
+la durée du buffer à 10 MS/s (26 ms) : GCCPhatThread ne traite donc que les max_samples premiers
+échantillons (2^16 par défaut, environ 6 ms) de la dernière trame reçue, et saute les trames arrivées
+pendant un calcul. Les retards recherchés étant petits, un segment de 2^16 échantillons suffit.
+La corrélation est circulaire : les retards recherchés (max_lag) doivent rester petits devant le buffer.
+"""
+import numpy as np
+
+import fft_cache
+import kernels
+import precision as prec
+
+
+class GCCPhatEstimator:
+    """ Retard sub-échantillon de Rx_1 par rapport à Rx_0, mis à jour à chaque trame. """
+
+    def __init__(self, sampling_rate=10e6, precision=None, max_lag=64, alpha=0.2, baseline=None, epsilon=1e-12,
+                 interpolation='sinc', sinc_half_width=8, grid_step=0.02):
+
+        # Précision de calcul ('double' ou 'single', cf. precision.py)
+        self.precision = prec.check_precision(precision)
+        self.complex_dtype = prec.complex_dtype(self.precision)
+        self.real_dtype = prec.real_dtype(self.precision)
+        self.workspace = kernels.Workspace()
+
+        self.sampling_rate = sampling_rate
+        self.max_lag = max_lag  # Retard maximal recherché, en échantillons
+        self.alpha = alpha  # Poids de la nouvelle trame dans la moyenne de l'interspectre (1 : pas de moyennage)
+        self.baseline = baseline  # Distance entre les antennes en mètres (pour convertir le retard en angle)
+        self.epsilon = epsilon  # Évite la division par zéro pour les bins sans énergie
+        # Estimation de la partie fractionnaire : 'sinc' ou 'parabolic' (plus rapide, mais biaisée jusqu'à
+        # environ 0.23 échantillon, le pic PHAT n'étant pas parabolique)
+        self.interpolation = interpolation
+        self.sinc_half_width = sinc_half_width  # Retards de part et d'autre du pic utilisés par l'interpolation
+        self.grid_step = grid_step  # Pas de la grille d'interpolation autour du pic (échantillons)
+        self._interpolator = None  # Matrice d'interpolation (grille x retards), calculée une seule fois
+        self.C = 3E8  # Vitesse de la lumière en mètres par seconde
+
+        # Interspectre normalisé moyenné et dernier résultat
+        self.average = None
+        self.frames = 0
+        self.delay_samples = None
+        self.quality = None
+
+    def reset(self):
+        """ Efface la moyenne (changement de configuration RF, de fréquence d'échantillonnage...). """
+        self.average = None
+        self.frames = 0
+
+    def update_parameters(self, sampling_rate=None, max_lag=None, alpha=None, baseline=None):
+        if sampling_rate is not None and sampling_rate != self.sampling_rate:
+            self.sampling_rate = sampling_rate
+            self.reset()
+        if max_lag is not None:
+            self.max_lag = max_lag
+        if alpha is not None:
+            self.alpha = alpha
+        if baseline is not None:
+            self.baseline = baseline
+
+    ########################################################################################################################
+    ################################################### Calcul #############################################################
+    ########################################################################################################################
+
+    def _accumulate(self, Rx_0, Rx_1):
+        """ Ajoute l'interspectre normalisé PHAT de la trame à la moyenne. """
+        NumSamples = len(Rx_0)
+        plan = fft_cache.fft_plan(NumSamples, self.complex_dtype)
+
+        # Le plan FFT peut réutiliser son tableau de sortie : X0 est copié avant la FFT de Rx_1
+        X0 = self.workspace.get('X0', NumSamples, self.complex_dtype)
+        np.copyto(X0, plan(Rx_0))
+        X1 = plan(Rx_1)
+
+        # Interspectre conj(X0) * X1, normalisé par son module
+        cross = self.workspace.get('cross', NumSamples, self.complex_dtype)
+        magnitude = self.workspace.get('magnitude', NumSamples, self.real_dtype)
+        np.multiply(np.conjugate(X0, out=X0), X1, out=cross)
+        np.abs(cross, out=magnitude)
+        magnitude += self.epsilon
+        np.divide(cross, magnitude, out=cross)
+
+        if self.average is None or len(self.average) != NumSamples:
+            self.average = cross.copy()
+            self.frames = 0
+        else:
+            self.average *= 1 - self.alpha
+            cross *= self.alpha
+            self.average += cross
+        self.frames += 1
+
+    def correlation(self, lags):
+        """
+        Corrélation GCC-PHAT complexe aux retards lags (entiers, retards négatifs acceptés).
+
+        Seuls les retards demandés sont extraits et normalisés : le module n'est jamais calculé sur tout le buffer.
+        """
+        NumSamples = len(self.average)
+        plan = fft_cache.fft_plan(NumSamples, self.complex_dtype)
+        conjugate = self.workspace.get('cross', NumSamples, self.complex_dtype)
+        np.conjugate(self.average, out=conjugate)
+        return np.conjugate(plan(conjugate)[np.asarray(lags) % NumSamples]) / NumSamples
+
+    def interpolator(self):
+        """ Matrice d'interpolation à bande limitée : grille de décalages [-1, 1] x retards -K..K autour du pic. """
+        if self._interpolator is None:
+            K = self.sinc_half_width
+            grid = np.arange(-1, 1 + self.grid_step / 2, self.grid_step)
+            distance = grid[:, None] - np.arange(-K, K + 1)[None, :]
+            taper = np.where(np.abs(distance) < K + 1, 0.5 + 0.5 * np.cos(np.pi * distance / (K + 1)), 0)
+            self._interpolator = (grid, np.sinc(distance) * taper)
+        return self._interpolator
+
+    def process(self, Rx_0, Rx_1):
+        """
+        Met à jour l'estimation avec une trame.
+
+        Retourne:
+        - Un dictionnaire : retard de Rx_1 par rapport à Rx_0 (échantillons et secondes), qualité (hauteur
+          du pic, 1 pour des voies parfaitement cohérentes) et angle si la distance entre antennes est connue.
+        """
+        Rx_0 = prec.as_complex(Rx_0, self.precision)
+        Rx_1 = prec.as_complex(Rx_1, self.precision)
+        self._accumulate(Rx_0, Rx_1)
+
+        # Recherche du pic parmi les retards -max_lag..max_lag, élargis pour l'interpolation
+        K = self.sinc_half_width
+        max_lag = min(self.max_lag, len(self.average) // 2 - K - 2)
+        lags = np.arange(-max_lag - K - 1, max_lag + K + 2)
+        correlation = self.correlation(lags)
+        magnitude = np.abs(correlation)
+        index = int(np.argmax(magnitude[K + 1:-K - 1])) + K + 1
+        peak = magnitude[index]
+
+        if self.interpolation == 'sinc':
+            # Corrélation interpolée sur la grille autour du pic, puis parabole sur le maximum de la grille
+            grid, matrix = self.interpolator()
+            values = np.abs(matrix @ correlation[index - K:index + K + 1])
+            position = int(np.clip(np.argmax(values), 1, len(values) - 2))
+            left, center, right = values[position - 1:position + 2]
+            step = self.grid_step
+            peak = center
+        else:
+            # Parabole directe sur le pic et ses deux voisins
+            left, center, right = magnitude[index - 1:index + 2]
+            grid, position, step = np.zeros(1), 0, 1.0
+
+        curvature = left - 2 * center + right
+        offset = grid[position] + (0.5 * step * (left - right) / curvature if curvature < 0 else 0.0)
+
+        self.delay_samples = float(lags[index] + offset)
+        self.quality = float(peak)
+        return {'delay_samples': self.delay_samples,
+                'delay_s': self.delay_samples / self.sampling_rate,
+                'quality': self.quality,
+                'angle_deg': self.angle(),
+                'frames': self.frames}
+
+    def angle(self):
+        """ Angle d'arrivée (degrés) correspondant au retard, si la distance entre antennes est connue. """
+        if self.baseline is None or self.delay_samples is None:
+            return None
+        arcsin_arg = self.C * self.delay_samples / self.sampling_rate / self.baseline
+        return float(np.rad2deg(np.arcsin(np.clip(arcsin_arg, -1, 1))))
+
+
+########################################################################################################################
+################################################# Class Thread #########################################################
+########################################################################################################################
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class GCCPhatThread(QThread):
+    """
+    Classe pour estimer le retard entre les voies dans un thread séparé, en parallèle de l'estimateur monopulse.
+    Seuls les max_samples premiers échantillons de la dernière trame sont traités (cf. docstring du module).
+    """
+
+    delay_ready = pyqtSignal(object)  # Signal pour envoyer le résultat de GCCPhatEstimator.process
+
+    def __init__(self, sampling_rate=10e6, precision=None, max_samples=2 ** 16, **kwargs):
+        super().__init__()
+        self.estimator = GCCPhatEstimator(sampling_rate, precision, **kwargs)
+        self.max_samples = max_samples  # Longueur du segment traité (None : toute la trame)
+        self.frames = 0  # Trames traitées
+        self.skipped_frames = 0  # Trames arrivées pendant un calcul et non traitées
+        self.frame = None  # Dernière trame reçue (Rx_0, Rx_1)
+        self._last_taken = None  # Dernière trame prise par le calcul
+        self._running = False
+
+    def run(self):
+        self._running = True
+        while self._running:
+            frame = self.frame
+            if frame is None or frame is self._last_taken:
+                self.msleep(1)
+                continue
+            self._last_taken = frame
+            self.frames += 1
+            Rx_0, Rx_1 = frame
+            result = self.estimator.process(Rx_0[:self.max_samples], Rx_1[:self.max_samples])
+            result['skipped_frames'] = self.skipped_frames
+            self.delay_ready.emit(result)
+
+    def stop(self):
+        self._running = False
+
+    def reset(self):
+        self.estimator.reset()
+
+    def update_parameters(self, **kwargs):
+        self.estimator.update_parameters(**kwargs)
+
+    def set_new_data(self, Rx_0, Rx_1):
+        # Trame précédente remplacée avant d'avoir été traitée
+        if self.frame is not None and self._last_taken is not self.frame:
+            self.skipped_frames += 1
+        self.frame = (Rx_0, Rx_1)
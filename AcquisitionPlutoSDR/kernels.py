@@ -0,0 +1,305 @@
+"""
+Noyaux fusionnés pour le traitement monopulse (rotation de phase, somme/delta, fenêtrage, corrélation).
+
+Avec numba, les noyaux sont compilés dès l'import pour les signatures complex64 et complex128
+(cache=True : la compilation est conservée sur disque entre deux lancements) et relâchent le GIL.
+Sans numba, une implémentation numpy équivalente travaille dans des tampons préalloués.
+
+Remarque sur la corrélation des spectres:
+    tracking() corrèle les spectres S = FFT(w.s) et D = FFT(w.d) des voies somme et delta. D'après
+    le théorème de Parseval, sum(S * conj(D)) = N * sum(w^2 * s * conj(d)) : la phase de la
+    corrélation (seule information utilisée) s'obtient donc directement dans le domaine temporel,
+    en une seule passe et sans FFT.
+"""
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKEND = 'numba' if numba is not None else 'numpy'
+
+
+class Workspace:
+    """ Tampons préalloués réutilisés d'un appel à l'autre par l'implémentation numpy. """
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, length, dtype):
+        """ Retourne le tampon name de taille length (réalloué uniquement si la taille ou le type change). """
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape[0] != length or buffer.dtype != dtype:
+            buffer = np.empty(length, dtype=dtype)
+            self.buffers[name] = buffer
+        return buffer
+
+
+########################################################################################################################
+################################################# Noyaux numba #########################################################
+########################################################################################################################
+
+def _monopulse_correlation_kernel(rx0, rx1, rotation, win2):
+    # Accumulation en double précision quelle que soit la précision des échantillons
+    acc = 0j
+    for i in range(rx0.shape[0]):
+        r1 = rx1[i] * rotation
+        s = rx0[i] + r1
+        d = rx0[i] - r1
+        acc += s * np.conj(d) * win2[i]
+    return acc
+
+
+def _windowed_sum_delta_kernel(rx0, rx1, rotation, win, sum_out, delta_out):
+    acc = 0j
+    for i in range(rx0.shape[0]):
+        r1 = rx1[i] * rotation
+        s = rx0[i] + r1
+        d = rx0[i] - r1
+        acc += s * np.conj(d)
+        sum_out[i] = s * win[i]
+        delta_out[i] = d * win[i]
+    return acc
+
+
+def _channel_products_kernel(rx0, rx1, win2, power0, power1, cross):
+    # Une ligne par trame ; accumulation en double précision
+    for f in range(rx0.shape[0]):
+        p0 = 0.0
+        p1 = 0.0
+        acc = 0j
+        for i in range(rx0.shape[1]):
+            a = rx0[f, i]
+            b = rx1[f, i]
+            p0 += win2[i] * (a.real * a.real + a.imag * a.imag)
+            p1 += win2[i] * (b.real * b.real + b.imag * b.imag)
+            acc += b * np.conj(a) * win2[i]
+        power0[f] = p0
+        power1[f] = p1
+        cross[f] = acc
+
+
+_ALIGN_BLOCK = 2048  # Échantillons par bloc du filtre d'alignement (tampons de sortie gardés dans le cache L1/L2)
+
+
+def _align_channels_kernel(rx0, rx1_flat, fir, scale, weight0, weight1, out0, out1, out1_flat):
+    # Correction IQ de rx0 : out0 = rx0 - w0.conj(rx0)
+    n = rx0.shape[0]
+    for i in range(n):
+        x = rx0[i]
+        out0[i] = x - weight0 * np.conj(x)
+
+    # Filtre RIF réel (convolution 'same', zéros hors du buffer) sur les parties réelle et imaginaire entrelacées
+    # (vues réelles rx1_flat, out1_flat), par blocs de _ALIGN_BLOCK échantillons gardés en cache : un coefficient
+    # à la fois, les boucles internes sur des tranches contiguës sont vectorisées
+    taps = fir.shape[0]
+    half = taps // 2
+    for start in range(0, n, _ALIGN_BLOCK):
+        stop = min(start + _ALIGN_BLOCK, n)
+        block = out1_flat[2 * start:2 * stop]
+        block[:] = 0
+        for k in range(taps):
+            shift = half - k
+            low = max(start, -shift)
+            high = min(stop, n - shift)
+            if high <= low:
+                continue
+            source = rx1_flat[2 * (low + shift):2 * (high + shift)]
+            target = out1_flat[2 * low:2 * high]
+            c = fir[k]
+            for i in range(target.shape[0]):
+                target[i] += c * source[i]
+
+        # Gain et phase, puis correction IQ de rx1 : out1 = y - w1.conj(y)
+        for i in range(start, stop):
+            y = out1[i] * scale
+            out1[i] = y - weight1 * np.conj(y)
+
+
+if numba is not None:
+    def _signatures(with_outputs):
+        """
+        Signatures compilées à l'import : complex64/float32 et complex128/float64. Échantillons et fenêtre sont
+        déclarés en lecture seule (les tableaux modifiables s'y convertissent) : les trames en lecture seule
+        (np.memmap, mémoire partagée, tableaux verrouillés) sont acceptées sans copie.
+        """
+        signatures = []
+        for complex_type, real_type in ((numba.complex64, numba.float32), (numba.complex128, numba.float64)):
+            samples = numba.types.Array(complex_type, 1, 'C', readonly=True)
+            window = numba.types.Array(real_type, 1, 'C', readonly=True)
+            output = numba.types.Array(complex_type, 1, 'C')
+            outputs = (output, output) if with_outputs else ()
+            signatures.append(numba.complex128(samples, samples, complex_type, window, *outputs))
+        return signatures
+
+    _monopulse_correlation_kernel = numba.njit(_signatures(False), cache=True, nogil=True)(
+        _monopulse_correlation_kernel)
+    _windowed_sum_delta_kernel = numba.njit(_signatures(True), cache=True, nogil=True)(
+        _windowed_sum_delta_kernel)
+
+    def _batch_signatures():
+        """ Piles de trames (vues à pas quelconque acceptées : sous-blocs qui se recouvrent, cf. dsp.py). """
+        signatures = []
+        for complex_type, real_type in ((numba.complex64, numba.float32), (numba.complex128, numba.float64)):
+            frames = numba.types.Array(complex_type, 2, 'A', readonly=True)
+            window = numba.types.Array(real_type, 1, 'C', readonly=True)
+            powers = numba.types.Array(numba.float64, 1, 'C')
+            cross = numba.types.Array(numba.complex128, 1, 'C')
+            signatures.append(numba.void(frames, frames, window, powers, powers, cross))
+        return signatures
+
+    _channel_products_kernel = numba.njit(_batch_signatures(), cache=True, nogil=True)(_channel_products_kernel)
+
+    def _align_signatures():
+        """ Trame, vue réelle de la voie filtrée, filtre réel, facteurs complexes et tampons de sortie. """
+        signatures = []
+        for complex_type, real_type in ((numba.complex64, numba.float32), (numba.complex128, numba.float64)):
+            samples = numba.types.Array(complex_type, 1, 'C', readonly=True)
+            flat = numba.types.Array(real_type, 1, 'C', readonly=True)
+            fir = numba.types.Array(real_type, 1, 'C', readonly=True)
+            output = numba.types.Array(complex_type, 1, 'C')
+            output_flat = numba.types.Array(real_type, 1, 'C')
+            signatures.append(numba.void(samples, flat, fir, complex_type, complex_type, complex_type,
+                                         output, output, output_flat))
+        return signatures
+
+    _align_channels_kernel = numba.njit(_align_signatures(), cache=True, nogil=True)(_align_channels_kernel)
+
+
+########################################################################################################################
+################################################ Interface publique ####################################################
+########################################################################################################################
+
+def monopulse_correlation(rx0, rx1, rotation, win2, workspace=None):
+    """
+    Corrélation pondérée des voies somme et delta, en une passe.
+
+    Paramètres:
+    - rx0, rx1 (array): Échantillons IQ des deux voies (même taille et même type complexe).
+    - rotation (complexe): Facteur exp(j*phase) appliqué à rx1, dans le type des échantillons.
+    - win2 (array): Carré de la fenêtre d'apodisation, dans le type réel associé.
+    - workspace (Workspace): Tampons utilisés par l'implémentation numpy.
+
+    Retourne:
+    - acc (complex): sum(win2 * (rx0 + rx1*rotation) * conj(rx0 - rx1*rotation)).
+    """
+    if numba is not None:
+        return _monopulse_correlation_kernel(np.ascontiguousarray(rx0), np.ascontiguousarray(rx1),
+                                             rx0.dtype.type(rotation), win2)
+
+    workspace = workspace or Workspace()
+    r1 = workspace.get('r1', len(rx0), rx0.dtype)
+    s = workspace.get('sum', len(rx0), rx0.dtype)
+
+    np.multiply(rx1, rotation, out=r1)
+    np.add(rx0, r1, out=s)
+    np.subtract(rx0, r1, out=r1)
+    np.multiply(s, win2, out=s)
+
+    # vdot conjugue son premier argument : sum(conj(d) * s * win2)
+    return complex(np.vdot(r1, s))
+
+
+def windowed_sum_delta(rx0, rx1, rotation, win, sum_out, delta_out, workspace=None):
+    """
+    Forme les voies somme et delta fenêtrées dans des tampons préalloués.
+
+    Paramètres:
+    - rx0, rx1 (array): Échantillons IQ des deux voies.
+    - rotation (complexe): Facteur exp(j*phase) appliqué à rx1.
+    - win (array): Fenêtre d'apodisation.
+    - sum_out, delta_out (array): Tampons de sortie (même taille et type que rx0).
+    - workspace (Workspace): Tampons utilisés par l'implémentation numpy.
+
+    Retourne:
+    - acc (complex): Corrélation des voies somme et delta non fenêtrées, sum(s * conj(d)).
+    """
+    if numba is not None:
+        return _windowed_sum_delta_kernel(np.ascontiguousarray(rx0), np.ascontiguousarray(rx1),
+                                          rx0.dtype.type(rotation), win, sum_out, delta_out)
+
+    workspace = workspace or Workspace()
+    r1 = workspace.get('r1', len(rx0), rx0.dtype)
+
+    np.multiply(rx1, rotation, out=r1)
+    np.add(rx0, r1, out=sum_out)
+    np.subtract(rx0, r1, out=delta_out)
+    acc = complex(np.vdot(delta_out, sum_out))
+    np.multiply(sum_out, win, out=sum_out)
+    np.multiply(delta_out, win, out=delta_out)
+    return acc
+
+
+def channel_products(rx0, rx1, win2, max_chunk=2 ** 20):
+    """
+    Puissances et intercorrélation pondérées de chaque trame d'une pile, en une passe.
+
+    Paramètres:
+    - rx0, rx1 (array): Piles de trames (trames x échantillons) des deux voies, même type complexe.
+    - win2 (array): Carré de la fenêtre d'apodisation (une trame), dans le type réel associé.
+    - max_chunk (int): Nombre d'échantillons traités à la fois par l'implémentation numpy (tampons bornés).
+
+    Retourne:
+    - power0, power1 (array float64): sum(win2 * |rx0|^2) et sum(win2 * |rx1|^2) par trame.
+    - cross (array complex128): sum(win2 * rx1 * conj(rx0)) par trame.
+
+    La corrélation des voies somme et delta de tracking() s'en déduit pour tout déphasage phi :
+    sum(win2 * (rx0 + rx1.e^(j.phi)) * conj(rx0 - rx1.e^(j.phi))) = power0 - power1 + 2j.Im(cross.e^(j.phi)).
+    """
+    n_frames = rx0.shape[0]
+    power0 = np.empty(n_frames)
+    power1 = np.empty(n_frames)
+    cross = np.empty(n_frames, dtype=np.complex128)
+
+    if numba is not None:
+        _channel_products_kernel(rx0, rx1, win2, power0, power1, cross)
+        return power0, power1, cross
+
+    # Paquets de trames pour borner la taille des produits intermédiaires
+    rows = max(1, max_chunk // max(1, rx0.shape[1]))
+    for start in range(0, n_frames, rows):
+        a = rx0[start:start + rows]
+        b = rx1[start:start + rows]
+        power0[start:start + rows] = (a.real ** 2 + a.imag ** 2) @ win2
+        power1[start:start + rows] = (b.real ** 2 + b.imag ** 2) @ win2
+        cross[start:start + rows] = (b * np.conjugate(a)) @ win2
+    return power0, power1, cross
+
+
+def align_channels(rx0, rx1, fir, scale, weight0, weight1, out0, out1, workspace=None):
+    """
+    Correction d'une trame dans des tampons préalloués (cf. channel_alignment.py), en une passe par voie.
+
+    Paramètres:
+    - rx0, rx1 (array): Échantillons IQ des deux voies (même taille et même type complexe), non modifiés.
+    - fir (array): Filtre RIF réel de longueur impaire (retard fractionnaire), dans le type réel associé.
+    - scale (complexe): Gain et phase appliqués à rx1 après le filtre.
+    - weight0, weight1 (complexe): Coefficients w des corrections IQ y = x - w.conj(x) (0 : pas de correction).
+    - out0, out1 (array): Tampons de sortie (même taille et type que rx0).
+    - workspace (Workspace): Tampons utilisés par l'implémentation numpy.
+
+    Retourne:
+    - (out0, out1) : out0 = rx0 - w0.conj(rx0) et, avec y = scale * convolve(rx1, fir, 'same'), out1 = y - w1.conj(y).
+    """
+    dtype = rx0.dtype.type
+    if numba is not None:
+        rx1 = np.ascontiguousarray(rx1)
+        real = fir.dtype
+        _align_channels_kernel(np.ascontiguousarray(rx0), rx1.view(real), fir, dtype(scale), dtype(weight0),
+                               dtype(weight1), out0, out1, out1.view(real))
+        return out0, out1
+
+    workspace = workspace or Workspace()
+    conjugate = workspace.get('conjugate', len(rx0), rx0.dtype)
+
+    np.conjugate(rx0, out=conjugate)
+    conjugate *= dtype(weight0)
+    np.subtract(rx0, conjugate, out=out0)
+
+    # np.convolve alloue sa sortie : seule l'implémentation numba est sans allocation
+    np.multiply(np.convolve(rx1, fir, 'same'), dtype(scale), out=out1)
+    np.conjugate(out1, out=conjugate)
+    conjugate *= dtype(weight1)
+    out1 -= conjugate
+    return out0, out1
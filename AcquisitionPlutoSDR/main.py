@@ -1,23 +1,32 @@
 import os
+import time
 
 import PyQt5.QtWidgets
+import signal
 from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QKeySequence
 from PyQt5 import QtWidgets
 from GUI.GUI import Ui_MainWindow
 from GUI.Chronometer import ChronometerThread
-from dsp.dsp import MonopulseAngleEstimatorThread
+from dsp import MonopulseAngleEstimatorThread, DriftRecalibrationThread
+from dsp_worker import DSPProcessPoolThread
+from doa_log import DOATimeSeriesLog
+from multi_emitter import MultiEmitterEstimatorThread
+from gcc_phat import GCCPhatThread
 from GraphicalDOA import GraphicalDOA
 from PlutoSetup import CustomSDR
 from acquisition import AcquisitionThread
 from unzip import convert_parquet_to_csv_and_delete
-from SpectrumAnalyzer import SpectrumAnalyzer
+from SpectrumAnalyzer import SpectrumAnalyzer, SpectrumWorkerThread
+from Waterfall import Waterfall
 from AD9363 import AD9363
 import adi
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QHBoxLayout,
-    QLabel, QLineEdit, QMessageBox, QPushButton, QTabWidget, QGridLayout
+    QLabel, QLineEdit, QMessageBox, QPushButton, QTabWidget, QGridLayout, QShortcut
 )
 import numpy as np
+import precision as prec
 
 import sys
 
@@ -27,6 +36,47 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
         super(MyGUI, self).__init__()
         self.setupUi(self)
 
+        # Précision de toute la chaîne de traitement (cf. precision.py, variable d'environnement PLUTO_PRECISION)
+        self.precision = prec.check_precision()
+
+        # Exécuter le DSP (angle et spectres) dans des processus séparés (variable d'environnement PLUTO_DSP_PROCESSES=1)
+        self.use_dsp_processes = os.environ.get('PLUTO_DSP_PROCESSES', '0') == '1'
+
+        # Aligner les voies Rx (retard, gain, IQ) avant l'estimation d'angle (variable d'environnement
+        # PLUTO_CHANNEL_ALIGNMENT=1, cf. channel_alignment.py)
+        self.align_channels = os.environ.get('PLUTO_CHANNEL_ALIGNMENT', '0') == '1'
+
+        # Suivi par sous-blocs : PLUTO_SUB_BLOCKS estimations d'angle par buffer, recouvrement
+        # PLUTO_SUB_BLOCK_OVERLAP (fraction de la longueur d'un sous-bloc)
+        self.sub_blocks = int(os.environ.get('PLUTO_SUB_BLOCKS', '1'))
+        self.sub_block_overlap = float(os.environ.get('PLUTO_SUB_BLOCK_OVERLAP', '0'))
+
+        # Journal des estimations d'angle et résumés 1 s / 1 min / 1 h sur disque (répertoire PLUTO_DOA_LOG,
+        # '1' pour le répertoire par défaut ; cf. doa_log.py)
+        doa_log_path = os.environ.get('PLUTO_DOA_LOG', '')
+        self.doa_log = DOATimeSeriesLog(None if doa_log_path == '1' else doa_log_path) if doa_log_path else None
+
+        # Estimation multi-émetteurs par bande de fréquence, en parallèle du monopulse (PLUTO_MULTI_EMITTER=1,
+        # cf. multi_emitter.py) ; les pistes sont journalisées au plus toutes les log_interval secondes
+        self.multi_emitter = os.environ.get('PLUTO_MULTI_EMITTER', '0') == '1'
+
+        # Retard entre les voies par GCC-PHAT, en parallèle du monopulse (PLUTO_GCC_PHAT=1, cf. gcc_phat.py)
+        self.gcc_phat = os.environ.get('PLUTO_GCC_PHAT', '0') == '1'
+
+        # Direction connue (degrés) de l'émetteur de référence pour corriger la dérive de phase en tâche de fond
+        # (PLUTO_DRIFT_REFERENCE_DEG, 0 pour un émetteur dans l'axe) ; sans référence, la dérive est seulement mesurée
+        drift_reference = os.environ.get('PLUTO_DRIFT_REFERENCE_DEG', '')
+        self.drift_reference = float(drift_reference) if drift_reference else None
+        self.log_interval = 1.0
+        self.last_logged = {}
+
+        # Profilage de l'estimateur (cf. profiling.py) : captures demandées en ligne de commande (--profile,
+        # --tracemalloc), puis basculées à la volée par raccourcis clavier ou signaux SIGUSR1/SIGUSR2
+        self.profiling_requests = {'cprofile': '--profile' in sys.argv, 'tracemalloc': '--tracemalloc' in sys.argv}
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self).activated.connect(lambda: self.toggle_profiling('cprofile'))
+        QShortcut(QKeySequence("Ctrl+Shift+M"), self).activated.connect(lambda: self.toggle_profiling('tracemalloc'))
+        QShortcut(QKeySequence("Ctrl+Shift+L"), self).activated.connect(self.on_latency_report)
+
         # Calibration des puissances Rx0, Rx1, Tx0 et Tx1
         self.Rx1_cal = float(63.3)
         self.Rx0_cal = float(63.3)
@@ -54,14 +104,41 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
         self.downChronometer = self.downChronometerThread.chronometer
 
         # Ajout d'un SpectrumAnalyzer pour chaque cannal
-        self.Rx0analyzer = SpectrumAnalyzer("Rx0", "#FFC9B3")
+        self.Rx0analyzer = SpectrumAnalyzer("Rx0", "#FFC9B3", precision=self.precision)
         self.SpectrumLayoutRx0.addWidget(self.Rx0analyzer, 0, 0)
 
-        self.Rx1analyzer = SpectrumAnalyzer("Rx1", "#B3F6FF")
+        self.Rx1analyzer = SpectrumAnalyzer("Rx1", "#B3F6FF", precision=self.precision)
         self.SpectrumLayoutRx1.addWidget(self.Rx1analyzer, 0, 0)
 
+        # Mode de trace des spectres (variable d'environnement PLUTO_TRACE_MODE : live, average, welch,
+        # max_hold ou min_hold, cf. spectrum.TraceAccumulator)
+        for analyzer in (self.Rx0analyzer, self.Rx1analyzer):
+            analyzer.set_trace_mode(os.environ.get('PLUTO_TRACE_MODE', 'live'))
+
+            # Affichage de persistance (PLUTO_PERSISTENCE=1)
+            if os.environ.get('PLUTO_PERSISTENCE', '0') == '1':
+                analyzer.set_persistence(True)
+
+        # Waterfall à côté de chaque SpectrumAnalyzer, alimenté par chaque spectre calculé (profondeur en lignes :
+        # PLUTO_WATERFALL_DEPTH, lignes par seconde : PLUTO_WATERFALL_RATE, 0 pour une ligne par buffer)
+        waterfall_depth = int(os.environ.get('PLUTO_WATERFALL_DEPTH', '256'))
+        waterfall_rate = float(os.environ.get('PLUTO_WATERFALL_RATE', '0')) or None
+        self.Rx0waterfall = Waterfall("Rx0", depth=waterfall_depth, row_rate=waterfall_rate,
+                                      levels=(self.Rx0analyzer.y1_axis, self.Rx0analyzer.y2_axis))
+        self.SpectrumLayoutRx0.addWidget(self.Rx0waterfall, 0, 1)
+        self.Rx0analyzer.waterfall = self.Rx0waterfall
+
+        self.Rx1waterfall = Waterfall("Rx1", depth=waterfall_depth, row_rate=waterfall_rate,
+                                      levels=(self.Rx1analyzer.y1_axis, self.Rx1analyzer.y2_axis))
+        self.SpectrumLayoutRx1.addWidget(self.Rx1waterfall, 0, 1)
+        self.Rx1analyzer.waterfall = self.Rx1waterfall
+
+        # Calcul des spectres hors du thread de l'interface (démarré avec l'acquisition)
+        self.spectrum_thread = SpectrumWorkerThread([self.Rx0analyzer, self.Rx1analyzer])
+
         # Ajout de l'UI pour visualiser les déphasages
-        self.GraphicalDOA = GraphicalDOA()
+        # (nombre d'angles de l'historique : PLUTO_DOA_HISTORY)
+        self.GraphicalDOA = GraphicalDOA(tracking_length=int(os.environ.get('PLUTO_DOA_HISTORY', '1000')))
         self.DOALayout.addWidget(self.GraphicalDOA, 0, 0)
 
         # Ajouter les fonctions événementielles pour les INPUT widgets de AoA estimation TAB
@@ -118,7 +195,7 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
             uri = 'ip:' + self.ip_input.text()
 
             # Afficher que la connexion au Pluto à fonctionnée
-            self.my_sdr = CustomSDR(uri=uri)
+            self.my_sdr = CustomSDR(uri=uri, precision=self.precision)
             self.my_sdr.configure_rx_properties()
             self.my_sdr.configure_tx_properties()
             self.my_sdr.configure_sampling_properties()
@@ -152,12 +229,48 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
         self.acquisition_thread = AcquisitionThread(self.my_sdr)
         self.log("Acquisition en cours ...", color='green')
 
+        # Démarrer le calcul des spectres
+        self.spectrum_thread.start()
+
+        # Démarrer l'estimation multi-émetteurs
+        if self.multi_emitter:
+            self.MultiEmitterThread = MultiEmitterEstimatorThread(sampling_rate=self.Rx0analyzer.sampling_rate,
+                                                                  precision=self.precision)
+            self.MultiEmitterThread.emitters_ready.connect(self.on_emitters_ready)
+            self.MultiEmitterThread.start()
+
+        # Démarrer l'estimation du retard entre les voies
+        if self.gcc_phat:
+            self.GCCPhatThread = GCCPhatThread(sampling_rate=self.Rx0analyzer.sampling_rate, precision=self.precision)
+            self.GCCPhatThread.delay_ready.connect(self.on_delay_ready)
+            self.GCCPhatThread.start()
+
+        # Démarrer les processus de calcul (spectres, puis angle à la demande)
+        if self.use_dsp_processes:
+            self.dsp_pool_thread = DSPProcessPoolThread(buffer_size=int(self.my_sdr.rx_buffer_size),
+                                                        precision=self.precision,
+                                                        align_channels=self.align_channels,
+                                                        sub_blocks=self.sub_blocks,
+                                                        sub_block_overlap=self.sub_block_overlap,
+                                                        doa_log=self.doa_log)
+            self.dsp_pool_thread.spectrum_ready.connect(self.on_spectrum_ready)
+            self.dsp_pool_thread.start()
+
+            # La copie en mémoire partagée (O(N) par trame) est faite dans le thread d'acquisition
+            self.acquisition_thread.frame_sink = self.dsp_pool_thread.set_new_data
+
         # Définir un slot pour stocker les données reçues
         def on_data_received(rx0, rx1):
             self.data['Rx0'] = rx0
             self.data['Rx1'] = rx1
-            self.Rx0analyzer.compute_fft(rx0)
-            self.Rx1analyzer.compute_fft(rx1)
+            if hasattr(self, 'MultiEmitterThread'):
+                self.MultiEmitterThread.set_new_data(rx0, rx1)
+            if hasattr(self, 'GCCPhatThread'):
+                self.GCCPhatThread.set_new_data(rx0, rx1)
+            if hasattr(self, 'dsp_pool_thread'):
+                # Trame déjà copiée en mémoire partagée par le thread d'acquisition (frame_sink)
+                return
+            self.spectrum_thread.set_new_data(rx0, rx1)
             if hasattr(self, 'MonopulseAngleEstimatorThread'):
                 self.MonopulseAngleEstimatorThread.set_new_data(rx0, rx1)
 
@@ -179,6 +292,40 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
             self.acquisition_thread.stop()
             self.acquisition_thread.wait()
             del self.acquisition_thread
+
+            # Arrêter le calcul des spectres
+            self.spectrum_thread.stop()
+            self.spectrum_thread.wait()
+
+            # Arrêter la recalibration de fond (elle modifierait un estimateur qui n'est plus alimenté)
+            self.stop_drift_recalibration()
+
+            # Arrêter l'estimation de l'angle avant de fermer le journal qu'elle alimente
+            self.stop_angle_estimation()
+
+            # Arrêter l'estimation multi-émetteurs
+            if hasattr(self, 'MultiEmitterThread'):
+                self.MultiEmitterThread.stop()
+                self.MultiEmitterThread.wait()
+                del self.MultiEmitterThread
+
+            # Arrêter l'estimation du retard
+            if hasattr(self, 'GCCPhatThread'):
+                self.GCCPhatThread.stop()
+                self.GCCPhatThread.wait()
+                del self.GCCPhatThread
+
+            # Arrêter les processus de calcul
+            if hasattr(self, 'dsp_pool_thread'):
+                self.dsp_pool_thread.stop()
+                self.dsp_pool_thread.wait()
+                del self.dsp_pool_thread
+                if self.use_dsp_processes and hasattr(self, 'MonopulseAngleEstimatorThread'):
+                    del self.MonopulseAngleEstimatorThread
+
+            # Écrire le journal des angles (intervalles en cours compris)
+            if self.doa_log is not None:
+                self.doa_log.close()
             self.log("Acquisition arrêtée", color='green')
 
         else:
@@ -247,10 +394,39 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
         if hasattr(self, 'acquisition_thread'):
             self.log("Calibration déphasage en cours ...", color='green')
 
-            self.MonopulseAngleEstimatorThread = MonopulseAngleEstimatorThread()
+            # Le pool de processus offre la même interface que MonopulseAngleEstimatorThread
+            if hasattr(self, 'dsp_pool_thread'):
+                self.MonopulseAngleEstimatorThread = self.dsp_pool_thread
+                self.MonopulseAngleEstimatorThread.AoA_ready.connect(self.on_AoA_ready)
+                self.MonopulseAngleEstimatorThread.profile_report.connect(self.on_profile_report)
+                self.apply_profiling_requests()
+                self.update_rf_config()
+                self.dsp_pool_thread.enable_doa()
+                return
+
+            # Une seule estimation (et une seule recalibration de fond) à la fois
+            self.stop_drift_recalibration()
+            self.stop_angle_estimation()
+
+            self.MonopulseAngleEstimatorThread = MonopulseAngleEstimatorThread(precision=self.precision,
+                                                                         align_channels=self.align_channels,
+                                                                         sub_blocks=self.sub_blocks,
+                                                                         sub_block_overlap=self.sub_block_overlap,
+                                                                         doa_log=self.doa_log)
             self.MonopulseAngleEstimatorThread.AoA_ready.connect(self.on_AoA_ready)
+            self.MonopulseAngleEstimatorThread.profile_report.connect(self.on_profile_report)
+            self.MonopulseAngleEstimatorThread.status.connect(self.log)
+            self.apply_profiling_requests()
+            self.update_rf_config()
             self.MonopulseAngleEstimatorThread.start()
 
+            # Recalibration de la dérive de phase en tâche de fond (basse priorité)
+            self.DriftRecalibrationThread = DriftRecalibrationThread(
+                self.MonopulseAngleEstimatorThread.estimator, self.MonopulseAngleEstimatorThread.calibration_cache,
+                reference_angle=self.drift_reference)
+            self.DriftRecalibrationThread.drift_measured.connect(self.on_drift_measured)
+            self.DriftRecalibrationThread.start()
+
 ########################################################################################################################
 
     """ Gérer les chronomètres Up/Down"""
@@ -314,6 +490,11 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
         self.Rx0analyzer.set_span(span)
         self.Rx1analyzer.set_span(span)
 
+########################################################################################################################
+    def on_spectrum_ready(self, power_rx0_dbm, power_rx1_dbm):
+        # Spectres calculés par le pool de processus, préparés pour l'affichage par le thread des spectres
+        self.spectrum_thread.set_spectra(power_rx0_dbm, power_rx1_dbm)
+
 ########################################################################################################################
     def on_addMarkerButton_click(self):
         # Vérification de l'éxistence de l'attribut après suppression
@@ -337,6 +518,8 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
 
         # Changer la fréquence centrale du Spectrum Analyzer
         self.ad9363_bis.rx_lo = int(central_freq * 1e6)
+        self.reset_traces()
+        self.update_rf_config()
 
 ########################################################################################################################
 ############################################ TAB AD9363 monitoring #####################################################
@@ -393,6 +576,8 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
     def on_RxLO_input(self):
         if hasattr(self, 'ad9363'):
             self.ad9363._set_rxLoFreq(float(self.RxLO_input.text()))
+            self.reset_traces()
+            self.update_rf_config()
     def on_RxBW_input(self):
         if hasattr(self, 'ad9363'):
             self.ad9363._set_rxBW(rx0_value=float(self.RxBW_input.text()), rx1_value=float(self.RxBW_input.text()))
@@ -405,6 +590,12 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
             self.ad9363_bis.sample_rate = float(self.ADCRate_input.text()) * 1e6
             self.Rx0analyzer.sampling_rate = float(self.ADCRate_input.text()) * 1e6
             self.Rx1analyzer.sampling_rate = float(self.ADCRate_input.text()) * 1e6
+            if hasattr(self, 'MultiEmitterThread'):
+                self.MultiEmitterThread.update_parameters(sampling_rate=self.Rx0analyzer.sampling_rate)
+            if hasattr(self, 'GCCPhatThread'):
+                self.GCCPhatThread.update_parameters(sampling_rate=self.Rx0analyzer.sampling_rate)
+            self.reset_traces()
+            self.update_rf_config()
     def on_ADCBuffer_input(self):
         if hasattr(self, 'ad9363'):
             self.ad9363_bis.rx_buffer_size = int(self.ADCBuffer_input.text())
@@ -414,12 +605,14 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
         if hasattr(self, 'ad9363'):
             self.ad9363_bis.rx_hardwaregain_chan0 = int(value)
             self.Rx0Gain_output.setText(str(self.ad9363._get_rx0_gain()) + " dB")
+            self.update_rf_config()
     def on_Rx1Gain_input(self):
         value = self.Rx1Gain_input.value()
         print(value)
         if hasattr(self, 'ad9363'):
             self.ad9363_bis.rx_hardwaregain_chan1 = int(value)
             self.Rx1Gain_output.setText(str(self.ad9363._get_rx1_gain()) + " dB")
+            self.update_rf_config()
     def on_Tx0Gain_input(self):
         value = self.Tx0Gain_input.value()
         print(value)
@@ -452,10 +645,90 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
             if self.AveragingEnabled and self.MonopulseAngleEstimatorThread.estimator.get_average() is not None:
                 angle = self.MonopulseAngleEstimatorThread.estimator.get_average()
 
+            # Historique et titre redessinés par la minuterie de GraphicalDOA (un rafraîchissement par intervalle)
             self.GraphicalDOA.updateDATA(angle)
-            self.GraphicalDOA.p1.setTitle(str(round(angle, 3)) + " °")
             self.PhaseCalibration_output.setText(str(self.MonopulseAngleEstimatorThread.estimator.phase_cal) + " °")
 
+            # Même calibration de phase pour l'estimation multi-émetteurs
+            if hasattr(self, 'MultiEmitterThread'):
+                self.MultiEmitterThread.set_phase_cal(self.MonopulseAngleEstimatorThread.estimator.phase_cal)
+
+    def log_throttled(self, key, message, color='black'):
+        # Journalise au plus une fois toutes les log_interval secondes par source (résultats émis à chaque trame)
+        now = time.monotonic()
+        if now - self.last_logged.get(key, 0) >= self.log_interval:
+            self.last_logged[key] = now
+            self.log(message, color)
+
+    def on_delay_ready(self, result):
+        self.log_throttled('gcc_phat', f"GCC-PHAT : retard {result['delay_samples']:+.3f} éch. "
+                                       f"({result['delay_s'] * 1e9:+.1f} ns), qualité {result['quality']:.2f}, "
+                                       f"{result['skipped_frames']} trames sautées")
+
+    def on_emitters_ready(self, result):
+        tracks = result['tracks']
+        if not tracks:
+            self.log_throttled('emitters', "Multi-émetteurs : aucun émetteur confirmé")
+            return
+        self.log_throttled('emitters', "Multi-émetteurs : " + ", ".join(
+            f"#{track['id']} {track['frequency'] / 1e6:+.3f} MHz {track['angle_deg']:+.1f} °" for track in tracks))
+
+    def stop_angle_estimation(self):
+        # Le pool de processus (même attribut) est arrêté avec l'acquisition
+        if isinstance(getattr(self, 'MonopulseAngleEstimatorThread', None), MonopulseAngleEstimatorThread):
+            self.MonopulseAngleEstimatorThread.stop()
+            self.MonopulseAngleEstimatorThread.wait()
+            del self.MonopulseAngleEstimatorThread
+
+    def stop_drift_recalibration(self):
+        if hasattr(self, 'DriftRecalibrationThread'):
+            self.DriftRecalibrationThread.stop()
+            self.DriftRecalibrationThread.wait()
+            del self.DriftRecalibrationThread
+
+    def on_drift_measured(self, drift, phase_cal, applied):
+        if applied:
+            self.log(f"Dérive de phase corrigée : {drift:+.2f} ° (calibration {phase_cal:.2f} °)", color='green')
+        elif self.drift_reference is None:
+            self.log(f"Écart pic / pointage : {drift:+.2f} ° (non appliqué : pas d'émetteur de référence, "
+                     f"cf. PLUTO_DRIFT_REFERENCE_DEG)")
+        else:
+            self.log(f"Dérive de phase ignorée : {drift:+.2f} ° (émetteur de référence absent ?)", color='orange')
+
+    def toggle_profiling(self, kind):
+        # Bascule une capture 'cprofile' ou 'tracemalloc' ; le rapport est affiché dans le log à l'arrêt
+        self.profiling_requests[kind] = not self.profiling_requests[kind]
+        state = "démarré" if self.profiling_requests[kind] else "arrêté"
+        self.log(f"Profilage {kind} {state}", color='blue')
+        self.apply_profiling_requests()
+
+    def apply_profiling_requests(self):
+        if hasattr(self, 'MonopulseAngleEstimatorThread'):
+            for kind, enabled in self.profiling_requests.items():
+                self.MonopulseAngleEstimatorThread.request_profiling(kind, enabled)
+
+    def on_latency_report(self):
+        if hasattr(self, 'MonopulseAngleEstimatorThread'):
+            self.MonopulseAngleEstimatorThread.report_latencies()
+
+    def on_profile_report(self, report):
+        self.Log1.appendPlainText(report)
+
+    def reset_traces(self):
+        # Les traces accumulées (moyennes, max/min-hold) ne sont plus valables après un changement de LO
+        for analyzer in (self.Rx0analyzer, self.Rx1analyzer):
+            analyzer.reset_traces()
+
+    def update_rf_config(self):
+        # Transmettre la configuration RF courante à l'estimateur : elle sert de clé au cache de calibration de phase
+        if hasattr(self, 'MonopulseAngleEstimatorThread') and hasattr(self, 'ad9363_bis'):
+            self.MonopulseAngleEstimatorThread.set_rf_config({
+                'rx_lo': float(self.ad9363_bis.rx_lo),
+                'rx_gain0': float(self.ad9363_bis.rx_hardwaregain_chan0),
+                'rx_gain1': float(self.ad9363_bis.rx_hardwaregain_chan1),
+                'sample_rate': float(self.ad9363_bis.sample_rate),
+            })
+
     def on_phase_calibrationButton_click(self):
         if hasattr(self, 'MonopulseAngleEstimatorThread'):
 
@@ -484,7 +757,8 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
                 self.AveragingEnabled = False
 
     def on_WindowSize_changed(self, value):
-        self.MonopulseAngleEstimatorThread.update_parameters(window_size=value)
+        if hasattr(self, 'MonopulseAngleEstimatorThread'):
+            self.MonopulseAngleEstimatorThread.update_parameters(window_size=value)
 
     """Méthode pour afficher un message dans le log"""
     def log(self, message, color='black'):
@@ -494,6 +768,12 @@ class MyGUI(QtWidgets.QMainWindow, Ui_MainWindow):
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
     window = MyGUI()
+
+    # Bascule des captures depuis un terminal : kill -USR1 <pid> (cProfile), kill -USR2 <pid> (tracemalloc)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: window.toggle_profiling('cprofile'))
+        signal.signal(signal.SIGUSR2, lambda signum, frame: window.toggle_profiling('tracemalloc'))
+
     window.show()
     sys.exit(app.exec_())
     sys.exit(app.exec_())
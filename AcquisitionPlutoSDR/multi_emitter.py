@@ -0,0 +1,288 @@
+"""
+Estimation d'angle par bande de fréquence, pour plusieurs émetteurs simultanés.
+
+MonopulseAngleEstimator donne un seul déphasage pour tout le buffer : deux émetteurs à des fréquences
+différentes dans la bande reçue se mélangent en un angle faux. Ici, l'interspectre des deux voies
+X0 * conj(X1) est calculé une seule fois par trame (une paire de FFT sert tous les émetteurs), regroupé
+en bandes de band_bins bins, puis chaque bande au-dessus du seuil de détection donne un déphasage et un
+angle. Les bandes détectées contiguës forment un émetteur, suivi d'une trame à l'autre par sa fréquence.
+"""
+import numpy as np
+
+import fft_cache
+import kernels
+import precision as prec
+from calibration_cache import wrap_phase
+
+
+class EmitterTrack:
+    """ Piste d'un émetteur : fréquence, déphasage et angle lissés au fil des trames. """
+
+    def __init__(self, track_id, detection):
+        self.track_id = track_id
+        self.frequency = detection['frequency']
+        self.power_db = detection['power_db']
+        self.phasor = np.exp(1j * np.deg2rad(detection['phase_deg']))  # Déphasage moyen (vecteur unitaire lissé)
+        self.phase_deg = detection['phase_deg']
+        self.angle_deg = detection['angle_deg']
+        self.coherence = detection['coherence']
+        self.hits = 1  # Trames où l'émetteur a été détecté
+        self.misses = 0  # Trames consécutives sans détection
+
+    def update(self, detection, alpha, theta):
+        """ Intègre une nouvelle détection (lissage exponentiel de coefficient alpha). """
+        self.frequency += alpha * (detection['frequency'] - self.frequency)
+        self.power_db = detection['power_db']
+        self.coherence = detection['coherence']
+        self.phasor = (1 - alpha) * self.phasor + alpha * np.exp(1j * np.deg2rad(detection['phase_deg']))
+        self.phase_deg = float(np.rad2deg(np.angle(self.phasor)))
+        self.angle_deg = float(theta(self.phase_deg, self.frequency))
+        self.hits += 1
+        self.misses = 0
+
+    def as_dict(self):
+        return {'id': self.track_id, 'frequency': self.frequency, 'power_db': self.power_db,
+                'phase_deg': self.phase_deg, 'angle_deg': self.angle_deg, 'coherence': self.coherence,
+                'hits': self.hits}
+
+
+class MultiEmitterEstimator:
+    """ Déphasage et angle par bande de fréquence à partir de l'interspectre des voies Rx0 et Rx1. """
+
+    def __init__(self, sampling_rate=10e6, f0=2227e6, d_wavelength=0.5, precision=None, band_bins=16,
+                 threshold_db=10, merge_gap=1, max_emitters=8, frequency_gate=50e3, alpha=0.3, min_hits=3,
+                 max_misses=5):
+
+        # Précision de calcul ('double' ou 'single', cf. precision.py)
+        self.precision = prec.check_precision(precision)
+        self.complex_dtype = prec.complex_dtype(self.precision)
+        self.real_dtype = prec.real_dtype(self.precision)
+        self.workspace = kernels.Workspace()
+
+        """ RF """
+        self.C = 3E8  # Vitesse de la lumière en mètres par seconde
+        self.F0 = f0  # Fréquence centrale (LO) en Hz
+        self.d_wavelength = d_wavelength  # Distance entre les antennes en longueurs d'onde à F0
+        self.d = self.d_wavelength * self.C / self.F0  # Distance physique entre les antennes
+        self.sampling_rate = sampling_rate
+        self.full_scale = 2 ** 11  # Pleine échelle de l'ADC du PlutoSDR
+        self.phase_cal = 0  # Déphasage de calibration (même convention que MonopulseAngleEstimator)
+
+        """ Détection """
+        self.band_bins = band_bins  # Nombre de bins FFT regroupés par bande
+        self.threshold_db = threshold_db  # Seuil de détection au-dessus du plancher de bruit (médiane des bandes)
+        self.merge_gap = merge_gap  # Bandes non détectées tolérées à l'intérieur d'un même émetteur
+        self.max_emitters = max_emitters  # Nombre maximal d'émetteurs retenus par trame (les plus puissants)
+
+        """ Pistes """
+        self.frequency_gate = frequency_gate  # Écart de fréquence maximal pour associer une détection à une piste
+        self.alpha = alpha  # Coefficient de lissage des pistes
+        self.min_hits = min_hits  # Détections nécessaires pour confirmer une piste
+        self.max_misses = max_misses  # Trames sans détection avant suppression d'une piste
+        self.tracks = []
+        self.next_track_id = 0
+
+    def update_parameters(self, sampling_rate=None, f0=None, threshold_db=None, band_bins=None):
+        """ Met à jour les paramètres ; les pistes sont effacées si l'axe des fréquences change. """
+        if sampling_rate is not None and sampling_rate != self.sampling_rate:
+            self.sampling_rate = sampling_rate
+            self.tracks = []
+        if band_bins is not None and band_bins != self.band_bins:
+            self.band_bins = band_bins
+            self.tracks = []
+        if f0 is not None:
+            self.F0 = f0
+            self.tracks = []
+        if threshold_db is not None:
+            self.threshold_db = threshold_db
+
+    ########################################################################################################################
+    ############################################### Interspectre ###########################################################
+    ########################################################################################################################
+
+    def cross_spectrum(self, Rx_0, Rx_1):
+        """
+        Interspectre X0 * conj(X1) et puissances |X0|^2, |X1|^2 des deux voies fenêtrées, regroupés en bandes.
+
+        Retourne:
+        - cross, power0, power1 (arrays): Sommes par bande, fréquence nulle au centre.
+        """
+        Rx_0 = prec.as_complex(Rx_0, self.precision)
+        Rx_1 = prec.as_complex(Rx_1, self.precision)
+        NumSamples = len(Rx_0) - len(Rx_0) % self.band_bins
+        win = fft_cache.window(NumSamples, self.real_dtype)
+        plan = fft_cache.fft_plan(NumSamples, self.complex_dtype)
+
+        # Le plan FFT peut réutiliser son tableau de sortie : X0 est copié avant la FFT de Rx1
+        windowed = self.workspace.get('windowed', NumSamples, self.complex_dtype)
+        X0 = self.workspace.get('X0', NumSamples, self.complex_dtype)
+        np.multiply(Rx_0[:NumSamples], win, out=windowed)
+        np.copyto(X0, plan(windowed))
+        np.multiply(Rx_1[:NumSamples], win, out=windowed)
+        X1 = plan(windowed)
+
+        # Puissances par bin, puis interspectre (X1 est conjugué en place)
+        power0 = np.square(np.abs(X0))
+        power1 = np.square(np.abs(X1))
+        cross = np.multiply(X0, np.conjugate(X1, out=windowed), out=windowed)
+
+        n_bands = NumSamples // self.band_bins
+        bands = [np.fft.fftshift(array.reshape(n_bands, self.band_bins).sum(axis=1))
+                 for array in (cross, power0, power1)]
+        return tuple(bands)
+
+    def band_frequencies(self, NumSamples):
+        """ Fréquence centrale (bande de base, Hz) de chaque bande, fréquence nulle au centre. """
+        freqs = fft_cache.fftfreq(NumSamples, self.sampling_rate, shift=False)
+        return np.fft.fftshift(freqs.reshape(-1, self.band_bins).mean(axis=1))
+
+    def theta(self, phase_deg, frequency):
+        """ Angle d'arrivée (degrés) pour un déphasage mesuré à la fréquence F0 + frequency (vectorisé). """
+        arcsin_arg = np.deg2rad(phase_deg) * self.C / (2 * np.pi * (self.F0 + frequency) * self.d)
+        return np.rad2deg(np.arcsin(np.clip(arcsin_arg, -1, 1)))
+
+    ########################################################################################################################
+    ################################################# Détection ############################################################
+    ########################################################################################################################
+
+    def detect(self, Rx_0, Rx_1):
+        """
+        Détecte les bandes et les émetteurs présents dans une trame.
+
+        Retourne:
+        - Un dictionnaire : 'bands' (fréquence, puissance en dBFS, déphasage et angle de chaque bande détectée),
+          'emitters' (liste des émetteurs, des plus puissants aux plus faibles) et 'noise_floor_db'.
+        """
+        cross, power0, power1 = self.cross_spectrum(Rx_0, Rx_1)
+        NumSamples = len(cross) * self.band_bins
+        freqs = self.band_frequencies(NumSamples)
+
+        # Normalisation en dBFS (somme de la fenêtre et pleine échelle de l'ADC)
+        scale = (fft_cache.window_sum(NumSamples, self.real_dtype) * self.full_scale) ** 2
+        power = (power0 + power1) / 2
+
+        # Plancher de bruit robuste : médiane des bandes (les émetteurs occupent une faible partie de la bande)
+        noise_floor = np.median(power)
+        detected = power > noise_floor * 10 ** (self.threshold_db / 10)
+
+        band_phase = wrap_phase(np.rad2deg(np.angle(cross[detected])) - self.phase_cal)
+        bands = {'frequency': freqs[detected],
+                 'power_db': 10 * np.log10(power[detected] / scale),
+                 'phase_deg': band_phase,
+                 'angle_deg': self.theta(band_phase, freqs[detected])}
+
+        return {'bands': bands,
+                'emitters': self._group(detected, cross, power0, power1, power, freqs, scale),
+                'noise_floor_db': float(10 * np.log10(noise_floor / scale))}
+
+    def _group(self, detected, cross, power0, power1, power, freqs, scale):
+        """ Regroupe les bandes détectées contiguës (à merge_gap près) en émetteurs. """
+        edges = np.diff(np.concatenate(([0], detected.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            return []
+
+        # Fusion des régions séparées par au plus merge_gap bandes
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] > self.merge_gap))
+        starts = starts[keep]
+        ends = np.concatenate((ends[np.flatnonzero(keep)[1:] - 1], ends[-1:]))
+
+        # Sommes par région par différences de sommes cumulées (bandes non détectées des trous comprises)
+        def region_sums(values):
+            cumulative = np.concatenate(([0], np.cumsum(values)))
+            return cumulative[ends] - cumulative[starts]
+
+        sum_cross = region_sums(cross)
+        sum_power0 = region_sums(power0)
+        sum_power1 = region_sums(power1)
+        sum_power = region_sums(power)
+        frequency = region_sums(power * freqs) / sum_power
+
+        phase = wrap_phase(np.rad2deg(np.angle(sum_cross)) - self.phase_cal)
+        angle = self.theta(phase, frequency)
+        coherence = np.abs(sum_cross) / np.sqrt(sum_power0 * sum_power1)
+        power_db = 10 * np.log10(sum_power / scale)
+
+        bandwidth = (ends - starts) * (freqs[1] - freqs[0])
+
+        order = np.argsort(power_db)[::-1][:self.max_emitters]
+        return [{'frequency': float(frequency[i]), 'bandwidth': float(bandwidth[i]),
+                 'power_db': float(power_db[i]), 'phase_deg': float(phase[i]), 'angle_deg': float(angle[i]),
+                 'coherence': float(coherence[i])} for i in order]
+
+    ########################################################################################################################
+    ################################################### Pistes #############################################################
+    ########################################################################################################################
+
+    def update_tracks(self, emitters):
+        """ Associe les émetteurs détectés aux pistes existantes (la plus proche en fréquence, dans la porte). """
+        unassigned = list(self.tracks)
+        for detection in emitters:
+            candidates = [track for track in unassigned
+                          if abs(track.frequency - detection['frequency']) <= self.frequency_gate]
+            if candidates:
+                track = min(candidates, key=lambda track: abs(track.frequency - detection['frequency']))
+                track.update(detection, self.alpha, self.theta)
+                unassigned.remove(track)
+            else:
+                self.tracks.append(EmitterTrack(self.next_track_id, detection))
+                self.next_track_id += 1
+
+        for track in unassigned:
+            track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+    def confirmed_tracks(self):
+        return [track.as_dict() for track in self.tracks if track.hits >= self.min_hits]
+
+    def process(self, Rx_0, Rx_1):
+        """ Détection et mise à jour des pistes pour une trame ; retourne le résultat de detect et les pistes. """
+        result = self.detect(Rx_0, Rx_1)
+        self.update_tracks(result['emitters'])
+        result['tracks'] = self.confirmed_tracks()
+        return result
+
+    def reset_tracks(self):
+        self.tracks = []
+
+
+########################################################################################################################
+################################################# Class Thread #########################################################
+########################################################################################################################
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class MultiEmitterEstimatorThread(QThread):
+    """Classe pour exécuter l'estimation multi-émetteurs dans un thread séparé (une fois par nouvelle trame)."""
+
+    emitters_ready = pyqtSignal(object)  # Signal pour envoyer le résultat de MultiEmitterEstimator.process
+
+    def __init__(self, sampling_rate=10e6, f0=2227e6, d_wavelength=0.5, precision=None, **kwargs):
+        super().__init__()
+        self.estimator = MultiEmitterEstimator(sampling_rate, f0, d_wavelength, precision, **kwargs)
+        self.frame = None  # Dernière trame reçue (Rx_0, Rx_1)
+        self._running = False
+
+    def run(self):
+        self._running = True
+        last_frame = None
+        while self._running:
+            frame = self.frame
+            if frame is None or frame is last_frame:
+                self.msleep(1)
+                continue
+            last_frame = frame
+            self.emitters_ready.emit(self.estimator.process(*frame))
+
+    def stop(self):
+        self._running = False
+
+    def set_phase_cal(self, phase_cal):
+        self.estimator.phase_cal = phase_cal
+
+    def update_parameters(self, **kwargs):
+        self.estimator.update_parameters(**kwargs)
+
+    def set_new_data(self, Rx_0, Rx_1):
+        self.frame = (Rx_0, Rx_1)
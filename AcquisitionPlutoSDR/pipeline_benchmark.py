@@ -0,0 +1,368 @@
+"""
+Banc d'essai de bout en bout de la chaîne acquisition -> spectres / DOA / enregistrement.
+
+Un PlutoSDR simulé (SimulatedSDR) produit des buffers au rythme réel de la fréquence d'échantillonnage
+demandée, avec un nombre limité de tampons matériels : un buffer qui n'est pas lu à temps est perdu
+(dépassement), comme avec le vrai récepteur. La boucle d'acquisition est celle d'AcquisitionThread.run,
+sans Qt ; chaque buffer est distribué aux consommateurs qui tournent en parallèle :
+- spectrum : spectres en dBm des deux voies (calcul de SpectrumAnalyzer.compute_fft),
+- doa : suivi d'angle (MonopulseAngleEstimator.tracking) sur chaque buffer,
+- recording : écriture brute des échantillons sur disque.
+
+Avec --dsp-processes, les spectres et le DOA passent par le pool de processus (cf. dsp_worker.py) ;
+le processus DOA suit alors la dernière trame reçue et ne compte pas de pertes.
+
+Les fréquences d'échantillonnage sont essayées par ordre croissant ; pour chacune sont relevés les
+dépassements du récepteur, les buffers perdus par chaque consommateur (file pleine), le temps CPU par
+étape et les percentiles de latence (de la disponibilité du buffer à la fin de son traitement). Le débit
+maximal soutenable est la plus haute fréquence sans aucune perte.
+
+Exemple:
+    python pipeline_benchmark.py --rates 1e6,5e6,10e6,20e6 --duration 5 --output pipeline.json
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import precision as prec
+import spectrum
+from dsp import MonopulseAngleEstimator
+
+DEFAULT_RATES = [1e6, 2e6, 5e6, 10e6, 15e6, 20e6, 30e6, 40e6, 61.44e6]
+
+
+########################################################################################################################
+################################################# Source simulée #######################################################
+########################################################################################################################
+
+class SimulatedSDR:
+    """
+    Remplace CustomSDR pour AcquisitionThread (precision, rx_buffer_size, sample_rate, calibrate_rx, receive_data).
+
+    Le buffer k est disponible à l'instant t0 + (k + 1) * période ; le récepteur en conserve au plus
+    hardware_buffers, les plus anciens étant écrasés (comptés dans overruns) si la lecture prend du retard.
+    Les buffers sont tirés d'une banque précalculée pour que leur génération ne coûte rien.
+    """
+
+    def __init__(self, sample_rate, buffer_size=2 ** 18, precision=None, hardware_buffers=4, n_frames=8,
+                 tone_hz=200e3, phase_deg=30, noise=10, seed=0):
+        self.sample_rate = sample_rate
+        self.rx_buffer_size = buffer_size
+        self.precision = prec.check_precision(precision)
+        self.hardware_buffers = hardware_buffers
+        self.period = buffer_size / sample_rate
+
+        rng = np.random.default_rng(seed)
+        self.frames = []
+        for index in range(n_frames):
+            t = (np.arange(buffer_size) + index * buffer_size) / sample_rate
+            tone = 500 * np.exp(2j * np.pi * tone_hz * t)
+            Rx_0 = tone + noise * (rng.normal(size=buffer_size) + 1j * rng.normal(size=buffer_size))
+            Rx_1 = tone * np.exp(1j * np.deg2rad(phase_deg)) + noise * (
+                rng.normal(size=buffer_size) + 1j * rng.normal(size=buffer_size))
+            self.frames.append((prec.as_complex(Rx_0, self.precision), prec.as_complex(Rx_1, self.precision)))
+
+        self.t0 = None
+        self.read_index = 0
+        self.overruns = 0
+        self.last_timestamp = None  # Instant où le dernier buffer lu est devenu disponible
+
+    def calibrate_rx(self):
+        pass
+
+    def receive_data(self):
+        now = time.perf_counter()
+        if self.t0 is None:
+            self.t0 = now
+
+        # Buffers perdus : le récepteur a produit plus de hardware_buffers buffers non lus
+        produced = int((now - self.t0) / self.period)
+        lost = produced - self.read_index - self.hardware_buffers
+        if lost > 0:
+            self.overruns += lost
+            self.read_index += lost
+
+        # Attendre que le buffer suivant soit disponible
+        ready = self.t0 + (self.read_index + 1) * self.period
+        if ready > now:
+            time.sleep(ready - now)
+
+        Rx_0, Rx_1 = self.frames[self.read_index % len(self.frames)]
+        self.read_index += 1
+        self.last_timestamp = ready
+        return {'Rx_0': Rx_0, 'Rx_1': Rx_1}
+
+
+########################################################################################################################
+################################################# Consommateurs ########################################################
+########################################################################################################################
+
+def latency_summary(latencies):
+    """ Percentiles des latences en ms. """
+    if not latencies:
+        return None
+    latencies = np.array(latencies) * 1e3
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {'p50_ms': float(p50), 'p90_ms': float(p90), 'p99_ms': float(p99), 'max_ms': float(latencies.max())}
+
+
+class Consumer(threading.Thread):
+    """ Traite chaque buffer reçu dans son propre thread ; un buffer est perdu si la file est pleine. """
+
+    def __init__(self, name, process, queue_depth=4):
+        super().__init__(name=name, daemon=True)
+        self.process = process
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.latencies = []
+        self.processed = 0
+        self.dropped = 0
+        self.cpu_time = 0
+
+    def offer(self, timestamp, Rx_0, Rx_1):
+        try:
+            self.queue.put_nowait((timestamp, Rx_0, Rx_1))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        self.queue.put(None)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            timestamp, Rx_0, Rx_1 = item
+            self.process(Rx_0, Rx_1)
+            self.latencies.append(time.perf_counter() - timestamp)
+            self.processed += 1
+        self.cpu_time = time.thread_time()
+
+    def summary(self, duration):
+        return {'processed': self.processed, 'dropped': self.dropped, 'cpu_s': self.cpu_time,
+                'cpu_load': self.cpu_time / duration, 'latency': latency_summary(self.latencies)}
+
+
+def spectrum_consumer(precision):
+    def process(Rx_0, Rx_1):
+        spectrum.power_spectrum_dbm(Rx_0, precision)
+        spectrum.power_spectrum_dbm(Rx_1, precision)
+    return process
+
+
+def doa_consumer(precision, calibration_frame):
+    # Calibration faite avant la mesure : seul le suivi est chronométré
+    estimator = MonopulseAngleEstimator(precision=precision)
+    estimator.set_new_data(*calibration_frame)
+    estimator.calibrate()
+
+    def process(Rx_0, Rx_1):
+        estimator.set_new_data(Rx_0, Rx_1)
+        estimator.tracking()
+        estimator.add_sample(estimator.last_phase_delay)
+    return process
+
+
+def recording_consumer(file):
+    def process(Rx_0, Rx_1):
+        Rx_0.tofile(file)
+        Rx_1.tofile(file)
+    return process
+
+
+class PoolCollector(threading.Thread):
+    """ Relève les résultats du pool de processus (équivalent de DSPProcessPoolThread.run, sans Qt). """
+
+    def __init__(self, pool):
+        super().__init__(name='pool', daemon=True)
+        self.pool = pool
+        self.arrivals = {}  # Numéro de trame -> instant de disponibilité du buffer
+        self.latencies = {'spectrum': [], 'doa': []}
+        self._running = True
+
+    def run(self):
+        while self._running:
+            message = self.pool.get_result(timeout=0.1)
+            if message is None:
+                continue
+            if message[0] == 'spectrum':
+                _, slot, seq, length = message
+                self.pool.read_spectra(slot, length)
+            else:
+                seq = message[1]
+            timestamp = self.arrivals.get(seq)
+            if timestamp is not None and message[0] in self.latencies:
+                self.latencies[message[0]].append(time.perf_counter() - timestamp)
+
+    def stop(self):
+        self._running = False
+
+
+########################################################################################################################
+################################################# Essais ###############################################################
+########################################################################################################################
+
+def start_pool(sdr, precision, timeout=120):
+    """ Démarre le pool de processus et attend que la calibration et le premier spectre soient faits. """
+    from dsp_worker import DSPProcessPool
+
+    pool = DSPProcessPool(buffer_size=sdr.rx_buffer_size, precision=precision)
+    pool.doa_enabled = True
+    pool.start()
+
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while seen != {'doa', 'spectrum'} and time.monotonic() < deadline:
+        pool.submit(*sdr.frames[0])
+        message = pool.get_result(timeout=0.5)
+        if message is not None:
+            seen.add(message[0])
+    while pool.get_result(timeout=0.5) is not None:
+        pass
+    pool.dropped_frames = 0
+    return pool
+
+
+def run_rate(sample_rate, duration=5.0, buffer_size=2 ** 18, precision=None, consumers=('spectrum', 'doa', 'recording'),
+             queue_depth=4, hardware_buffers=4, dsp_processes=False):
+    """ Fait tourner la chaîne pendant duration secondes à sample_rate et retourne les mesures. """
+    precision = prec.check_precision(precision)
+    sdr = SimulatedSDR(sample_rate, buffer_size, precision, hardware_buffers)
+
+    with tempfile.TemporaryDirectory() as directory, open(os.path.join(directory, 'iq.bin'), 'wb') as file:
+        threads = {}
+        pool = collector = None
+        if dsp_processes and ('spectrum' in consumers or 'doa' in consumers):
+            pool = start_pool(sdr, precision)
+            collector = PoolCollector(pool)
+            collector.start()
+        else:
+            if 'spectrum' in consumers:
+                threads['spectrum'] = Consumer('spectrum', spectrum_consumer(precision), queue_depth)
+            if 'doa' in consumers:
+                threads['doa'] = Consumer('doa', doa_consumer(precision, sdr.frames[0]), queue_depth)
+        if 'recording' in consumers:
+            threads['recording'] = Consumer('recording', recording_consumer(file), queue_depth)
+
+        for thread in threads.values():
+            thread.start()
+
+        # Boucle d'acquisition (AcquisitionThread.run)
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        frames = 0
+        while time.perf_counter() - start < duration:
+            data = sdr.receive_data()
+            frames += 1
+            for thread in threads.values():
+                thread.offer(sdr.last_timestamp, data['Rx_0'], data['Rx_1'])
+            if pool is not None:
+                seq = pool.submit(data['Rx_0'], data['Rx_1'])
+                if seq is not None:
+                    collector.arrivals[seq] = sdr.last_timestamp
+        elapsed = time.perf_counter() - start
+        acquisition_cpu = time.thread_time() - cpu_start
+
+        # Les consommateurs terminent les buffers en attente
+        for thread in threads.values():
+            thread.stop()
+        for thread in threads.values():
+            thread.join()
+
+        report = {'sample_rate': sample_rate,
+                  'buffer_size': buffer_size,
+                  'precision': precision,
+                  'duration_s': elapsed,
+                  'frames': frames,
+                  'overruns': sdr.overruns,
+                  'acquisition': {'cpu_s': acquisition_cpu, 'cpu_load': acquisition_cpu / elapsed},
+                  'consumers': {name: thread.summary(elapsed) for name, thread in threads.items()}}
+
+        if pool is not None:
+            time.sleep(0.5)
+            collector.stop()
+            collector.join()
+            children_before = os.times()
+            pool.stop()
+            children_after = os.times()
+            dsp_cpu = (children_after.children_user + children_after.children_system
+                       - children_before.children_user - children_before.children_system)
+            report['consumers']['dsp_processes'] = {
+                'dropped': pool.dropped_frames, 'cpu_s': dsp_cpu, 'cpu_load': dsp_cpu / elapsed,
+                'latency': {kind: latency_summary(latencies) for kind, latencies in collector.latencies.items()}}
+
+    report['sustained'] = report['overruns'] == 0 and all(
+        consumer['dropped'] == 0 for consumer in report['consumers'].values())
+    return report
+
+
+def print_report(report):
+    print(f"{report['sample_rate'] / 1e6:8.2f} MS/s : {report['frames']} buffers, {report['overruns']} dépassements, "
+          f"acquisition {report['acquisition']['cpu_load']:.0%} CPU -> "
+          f"{'OK' if report['sustained'] else 'PERTES'}")
+    for name, consumer in report['consumers'].items():
+        latency = consumer['latency']
+        if latency is not None and 'p50_ms' not in latency:
+            latency = latency.get('spectrum')
+        latency_text = (f"latence p50 {latency['p50_ms']:.1f} / p90 {latency['p90_ms']:.1f} / "
+                        f"p99 {latency['p99_ms']:.1f} ms" if latency else "latence -")
+        print(f"    {name:<14} perdus {consumer['dropped']:>5}   CPU {consumer['cpu_load']:>6.0%}   {latency_text}")
+
+
+def sweep(rates=None, stop_on_failure=True, verbose=True, **kwargs):
+    """ Essaie les fréquences par ordre croissant ; retourne les mesures et la fréquence maximale soutenable. """
+    reports = []
+    max_sustainable = None
+    for sample_rate in sorted(rates or DEFAULT_RATES):
+        report = run_rate(sample_rate, **kwargs)
+        reports.append(report)
+        if verbose:
+            print_report(report)
+        if report['sustained']:
+            max_sustainable = sample_rate
+        elif stop_on_failure:
+            break
+    return reports, max_sustainable
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Débit de bout en bout de la chaîne d'acquisition simulée")
+    parser.add_argument('--rates', type=lambda text: [float(value) for value in text.split(',')],
+                        default=DEFAULT_RATES, help="fréquences d'échantillonnage en Hz, séparées par des virgules")
+    parser.add_argument('--duration', type=float, default=5.0, help="durée de chaque essai (s)")
+    parser.add_argument('--buffer-size', type=int, default=2 ** 18)
+    parser.add_argument('--precision', choices=list(prec.PRECISIONS), default=None)
+    parser.add_argument('--consumers', nargs='+', default=['spectrum', 'doa', 'recording'],
+                        choices=['spectrum', 'doa', 'recording'])
+    parser.add_argument('--queue-depth', type=int, default=4, help="buffers en attente par consommateur")
+    parser.add_argument('--hardware-buffers', type=int, default=4, help="tampons du récepteur simulé")
+    parser.add_argument('--dsp-processes', action='store_true', help="spectres et DOA dans le pool de processus")
+    parser.add_argument('--all', action='store_true', help="continuer après le premier essai avec pertes")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    args = parser.parse_args(argv)
+
+    reports, max_sustainable = sweep(args.rates, not args.all, duration=args.duration, buffer_size=args.buffer_size,
+                                     precision=args.precision, consumers=args.consumers,
+                                     queue_depth=args.queue_depth, hardware_buffers=args.hardware_buffers,
+                                     dsp_processes=args.dsp_processes)
+
+    if max_sustainable is None:
+        print("Aucune fréquence d'échantillonnage soutenable sans pertes")
+    else:
+        print(f"Débit maximal soutenable sans pertes : {max_sustainable / 1e6:.2f} MS/s")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'max_sustainable_rate': max_sustainable, 'runs': reports}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Choix de la précision numérique de la chaîne de traitement (réception, DSP, spectre, enregistrement).
+
+- 'double' : complex128 / float64 (comportement historique).
+- 'single' : complex64 / float32. L'ADC du PlutoSDR ne fournit que 12 bits, la mantisse de 24 bits
+  du float32 suffit donc largement et on divise par deux la bande passante mémoire.
+
+La précision par défaut du processus se choisit avec la variable d'environnement PLUTO_PRECISION.
+
+Borne de précision sur la phase estimée (single vs double):
+    La phase de suivi est l'argument de la corrélation temporelle c = sum(w^2 * s * conj(d)) des voies
+    somme et delta (cf. kernels.py). Le noyau numba calcule chaque terme (rotation de rx1, somme, différence,
+    produit, fenêtre) dans la précision des échantillons, avec une erreur relative d'au plus environ 6u
+    (u = 2^-24 en single), mais accumule les termes en complex128 : l'erreur de la somme (N * 2^-53, soit
+    3e-11 pour N = 2^18) est négligeable et ne dépend pas de N. L'erreur sur la phase est donc bornée par
+
+        |phi_single - phi_double| <= 6 * u * sum(w^2 * |s| * |d|) / |c|   [rad]
+
+    Pour un signal cohérent (sum(w^2 |s||d|) / |c| proche de 1), cela donne moins de 4e-7 rad, soit 2e-5 °,
+    quel que soit N. Mesuré sur 30 tirages aléatoires (N = 2^18, quantification 12 bits, déphasage et
+    pointage aléatoires) : écart maximal de 1.1e-5 °, à comparer au pas de suivi step_deg = 0.1 °. La borne
+    se dégrade seulement lorsque |c| tend vers 0, c'est-à-dire lorsque le signe de la corrélation (seule
+    information utilisée par tracking) est de toute façon indéterminé. Sans numba, l'implémentation numpy
+    accumule en single (np.vdot) : s'y ajoute un terme en log2(N) * u, soit moins de 2e-6 rad pour N = 2^18.
+"""
+import os
+
+import numpy as np
+
+PRECISIONS = {
+    'double': (np.complex128, np.float64),
+    'single': (np.complex64, np.float32),
+}
+
+DEFAULT_PRECISION = os.environ.get('PLUTO_PRECISION', 'double')
+
+
+def check_precision(precision=None):
+    """ Retourne le nom de la précision demandée (ou celle par défaut) après vérification. """
+    precision = precision or DEFAULT_PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"Précision inconnue: {precision} (valeurs possibles: {list(PRECISIONS)})")
+    return precision
+
+
+def complex_dtype(precision=None):
+    """ Type complexe associé à la précision. """
+    return np.dtype(PRECISIONS[check_precision(precision)][0])
+
+
+def real_dtype(precision=None):
+    """ Type réel associé à la précision. """
+    return np.dtype(PRECISIONS[check_precision(precision)][1])
+
+
+def as_complex(samples, precision=None):
+    """ Convertit des échantillons IQ dans la précision demandée (sans copie si le type est déjà le bon). """
+    return np.asarray(samples, dtype=complex_dtype(precision))
@@ -0,0 +1,168 @@
+"""
+Instrumentation du DSP : chronomètres par étape, histogrammes glissants des latences et capture
+cProfile/tracemalloc activable à la volée.
+
+Utilisation dans une boucle de calcul:
+
+    t0 = profiler.tic()
+    ...  # étape à mesurer
+    profiler.toc('fft', t0)
+
+Les captures complètes sont demandées depuis n'importe quel thread (request_cprofile, request_tracemalloc)
+et appliquées par poll(), appelée par le thread instrumenté : cProfile ne mesure que le thread qui l'active.
+"""
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+import numpy as np
+
+
+class LatencyHistory:
+    """ Anneau préalloué des history dernières durées (en ns) d'une étape. """
+
+    def __init__(self, history=1024):
+        self.durations = np.zeros(history, dtype=np.int64)
+        self.index = 0
+        self.count = 0
+        self.total_count = 0
+
+    def record(self, duration_ns):
+        self.durations[self.index] = duration_ns
+        self.index = (self.index + 1) % len(self.durations)
+        self.count = min(self.count + 1, len(self.durations))
+        self.total_count += 1
+
+    def values(self):
+        return self.durations[:self.count]
+
+    def histogram(self, bins_per_decade=5):
+        """ Histogramme des durées récentes en µs, bins logarithmiques de 1 µs à 10 s. """
+        edges = np.logspace(0, 7, 7 * bins_per_decade + 1)
+        return np.histogram(self.values() / 1e3, bins=edges)
+
+    def summary(self):
+        """ Statistiques des durées récentes en µs. """
+        if not self.count:
+            return None
+        values = self.values() / 1e3
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {'count': self.total_count, 'mean_us': float(values.mean()), 'p50_us': float(p50),
+                'p90_us': float(p90), 'p99_us': float(p99), 'max_us': float(values.max())}
+
+
+class StageProfiler:
+    """ Chronomètres par étape et captures cProfile/tracemalloc d'un thread de calcul. """
+
+    def __init__(self, name='dsp', history=1024, enabled=True, output_dir=None):
+        self.name = name
+        self.history = history
+        self.enabled = enabled  # Chronomètres par étape actifs
+        self.stages = {}
+        self.output_dir = output_dir or os.path.join(os.getcwd(), "profiling")
+
+        # Captures complètes : état demandé (par n'importe quel thread) et état appliqué (par poll)
+        self.cprofile_requested = False
+        self.tracemalloc_requested = False
+        self.profile = None
+        self.last_report = None
+
+    ####################################################################################################################
+    ########################################### Chronomètres par étape #################################################
+    ####################################################################################################################
+
+    def tic(self):
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def toc(self, stage, t0):
+        """ Enregistre la durée écoulée depuis t0 pour l'étape stage ; retourne un nouveau t0. """
+        if not self.enabled:
+            return 0
+        now = time.perf_counter_ns()
+        history = self.stages.get(stage)
+        if history is None:
+            history = self.stages[stage] = LatencyHistory(self.history)
+        history.record(now - t0)
+        return now
+
+    def summary(self):
+        # Copie des entrées : summary() est appelé depuis l'interface pendant que le thread de calcul peut
+        # ajouter une étape (RuntimeError « dictionary changed size during iteration »)
+        return {stage: history.summary() for stage, history in list(self.stages.items())}
+
+    def report(self):
+        """ Résumé texte des latences par étape. """
+        lines = [f"{'étape':<12}{'appels':>10}{'moy. µs':>12}{'p50 µs':>12}{'p90 µs':>12}{'p99 µs':>12}{'max µs':>12}"]
+        for stage, stats in self.summary().items():
+            if stats is not None:
+                lines.append(f"{stage:<12}{stats['count']:>10}{stats['mean_us']:>12.1f}{stats['p50_us']:>12.1f}"
+                             f"{stats['p90_us']:>12.1f}{stats['p99_us']:>12.1f}{stats['max_us']:>12.1f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        self.stages = {}
+
+    ####################################################################################################################
+    ############################################## Captures complètes ##################################################
+    ####################################################################################################################
+
+    def request_cprofile(self, enabled=None):
+        """ Demande l'activation (True), l'arrêt (False) ou la bascule (None) de la capture cProfile. """
+        self.cprofile_requested = not self.cprofile_requested if enabled is None else enabled
+
+    def request_tracemalloc(self, enabled=None):
+        """ Demande l'activation (True), l'arrêt (False) ou la bascule (None) de la capture tracemalloc. """
+        self.tracemalloc_requested = not self.tracemalloc_requested if enabled is None else enabled
+
+    def poll(self):
+        """
+        Applique les captures demandées ; à appeler régulièrement par le thread instrumenté.
+
+        Retourne:
+        - Le rapport texte des captures qui viennent de s'arrêter, None sinon.
+        """
+        reports = []
+
+        if self.cprofile_requested and self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif not self.cprofile_requested and self.profile is not None:
+            self.profile.disable()
+            reports.append(self._dump_cprofile())
+            self.profile = None
+
+        if self.tracemalloc_requested and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not self.tracemalloc_requested and tracemalloc.is_tracing():
+            reports.append(self._dump_tracemalloc())
+            tracemalloc.stop()
+
+        if not reports:
+            return None
+        self.last_report = "\n".join(reports)
+        return self.last_report
+
+    def _output_path(self, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        return os.path.join(self.output_dir, f"{self.name}_{timestamp}.{extension}")
+
+    def _dump_cprofile(self):
+        path = self._output_path("prof")
+        self.profile.dump_stats(path)
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats('cumulative').print_stats(15)
+        return f"Profil cProfile enregistré dans {path}\n{stream.getvalue()}"
+
+    def _dump_tracemalloc(self, limit=15):
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        path = self._output_path("tracemalloc")
+        snapshot.dump(path)
+        lines = [f"tracemalloc enregistré dans {path} (courant {current / 1e6:.1f} Mo, pic {peak / 1e6:.1f} Mo)"]
+        lines += [str(stat) for stat in snapshot.statistics('lineno')[:limit]]
+        return "\n".join(lines)
@@ -0,0 +1,675 @@
+"""
+Calculs spectraux indépendants de l'interface graphique.
+
+Ces fonctions sont utilisées par le SpectrumAnalyzer, mais aussi par les processus de calcul
+(dsp_worker.py) qui n'ont pas de widget Qt.
+"""
+import threading
+import time
+
+import numpy as np
+
+import fft_cache
+import precision as prec
+
+# Référence de puissances (1mW pour une conversion en dBm)
+P_REF = 1e-3
+
+
+def power_spectrum(Rx, precision=None):
+    """
+    Spectre de puissance (linéaire) centré d'un buffer IQ, fenêtré par une fenêtre Hanning.
+
+    Paramètres:
+    - Rx (array): Échantillons IQ complexes.
+    - precision (str): 'double' ou 'single' (cf. precision.py).
+
+    Retourne:
+    - power (array): Puissance par bin, fréquence nulle au centre.
+    """
+    # Conversion dans la précision de calcul (sans copie si les échantillons y sont déjà)
+    Rx = prec.as_complex(Rx, precision)
+    NumSamples = len(Rx)
+
+    # Fenêtre Hanning et plan FFT partagés (calculés une seule fois par taille de buffer)
+    real_dtype = prec.real_dtype(precision)
+    windowed_Rx = Rx * fft_cache.window(NumSamples, real_dtype)
+
+    # FFT normalisée par la somme de la fenêtre
+    fft_Rx = np.fft.fftshift(np.abs(fft_cache.fft_plan(NumSamples, windowed_Rx.dtype)(windowed_Rx)))
+    fft_Rx /= fft_cache.window_sum(NumSamples, real_dtype)
+
+    # Conversion des amplitudes en puissances
+    return np.square(fft_Rx, out=fft_Rx)
+
+
+def to_dbm(power):
+    """ Conversion de puissances linéaires en dBm. """
+    return 10 * np.log10(np.abs(power / P_REF) + 1e-9)
+
+
+def power_spectrum_dbm(Rx, precision=None):
+    """ Spectre de puissance centré d'un buffer IQ, en dBm. """
+    return to_dbm(power_spectrum(Rx, precision))
+
+
+class MinMaxDecimator:
+    """
+    Réduction d'un spectre pour l'affichage : une paire (min, max) par colonne de pixels de la bande visible.
+
+    Les bornes des colonnes (indices de bins) sont calculées une seule fois par configuration (axe des
+    fréquences, bande visible, nombre de colonnes) ; chaque spectre ne coûte ensuite que deux réductions
+    vectorisées (np.minimum.reduceat, np.maximum.reduceat) sur les bins visibles. Si la bande visible
+    contient moins de deux bins par colonne, les bins sont retournés tels quels.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.plan = None
+
+    def get_plan(self, freqs, low, high, columns):
+        """
+        Plan de réduction pour l'axe freqs (croissant) et la bande visible [low, high] (unités de freqs).
+
+        Retourne:
+        - (first, last, starts, x) : bins visibles first:last, début de chaque colonne (relatif à first, None
+          sans réduction) et abscisses des points affichés.
+        """
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]), float(low), float(high), int(columns))
+        if key != self.key:
+            first = int(np.searchsorted(freqs, low, 'left'))
+            last = max(first + 1, min(len(freqs), int(np.searchsorted(freqs, high, 'right'))))
+            first = min(first, last - 1)
+            n_bins = last - first
+
+            if n_bins < 2 * columns:
+                starts, x = None, freqs[first:last]
+            else:
+                # Bornes des colonnes, puis abscisse du centre de chaque colonne répétée pour le min et le max
+                edges = np.linspace(0, n_bins, columns + 1).astype(np.intp)
+                starts = edges[:-1]
+                centers = freqs[first + (edges[:-1] + edges[1:] - 1) // 2]
+                x = np.repeat(centers, 2)
+
+            self.plan = (first, last, starts, x)
+            self.key = key
+        return self.plan
+
+    def decimate(self, values, freqs, low, high, columns):
+        """
+        Retourne:
+        - (x, y) : abscisses et valeurs à afficher (min puis max de chaque colonne), dans l'unité de values.
+        """
+        first, last, starts, x = self.get_plan(freqs, low, high, columns)
+        visible = values[first:last]
+        if starts is None:
+            # Copie : values peut être modifié en place par le spectre suivant (cf. TraceAccumulator)
+            return x, visible.copy()
+
+        y = np.empty(len(x), dtype=values.dtype)
+        y[0::2] = np.minimum.reduceat(visible, starts)
+        y[1::2] = np.maximum.reduceat(visible, starts)
+        return x, y
+
+
+class SpanSpectrum:
+    """
+    Spectre de puissance de la seule bande affichée (centre, span), à une résolution (RBW) adaptée au span.
+
+    - Span étroit (la fréquence d'échantillonnage dépasse oversampling * span d'un facteur D >= 2) : le signal
+      est transposé autour du centre, filtré passe-bas et décimé d'un facteur D en une passe polyphase
+      (filtre RIF de taps_per_phase * D coefficients, la transposition étant intégrée au filtre), puis les
+      FFT portent sur le signal décimé, D fois plus court.
+    - Span large : FFT plus courtes que le buffer, moyennées (Welch, segments recouvrants de overlap).
+
+    La taille de FFT donne la RBW demandée (rbw, en Hz) ou, par défaut, environ points bins dans le span.
+    Le plan (facteur de décimation, filtre, fenêtre, bins retenus) est calculé une seule fois par
+    configuration (taille du buffer, fréquence d'échantillonnage, centre, span, RBW).
+    Les puissances ont la même échelle que power_spectrum (une porteuse d'amplitude A donne A^2).
+    """
+
+    def __init__(self, precision=None, points=4096, oversampling=1.5, taps_per_phase=16, overlap=0.5):
+        self.precision = prec.check_precision(precision)
+        self.complex_dtype = prec.complex_dtype(self.precision)
+        self.real_dtype = prec.real_dtype(self.precision)
+        self.points = points  # Nombre de bins visés dans le span si la RBW n'est pas imposée
+        self.oversampling = oversampling  # Marge entre la fréquence décimée et le span (bords non repliés)
+        self.taps_per_phase = taps_per_phase  # Longueur du filtre de décimation, en multiples de D
+        self.overlap = overlap  # Recouvrement des segments moyennés
+        self.key = None
+        self.plan = None
+
+    def get_plan(self, NumSamples, sampling_rate, center, span, rbw=None):
+        """ Plan de calcul pour une configuration (centre et span en Hz, relatifs au LO). """
+        key = (NumSamples, float(sampling_rate), float(center), float(span), rbw)
+        if key == self.key:
+            return self.plan
+
+        decimation = max(1, int(sampling_rate // (self.oversampling * span)))
+        taps = self.taps_per_phase
+        if decimation < 2 or NumSamples // decimation <= 2 * taps:
+            decimation = 1
+        rate = sampling_rate / decimation
+
+        plan = {'decimation': decimation, 'rate': rate}
+        if decimation > 1:
+            # Passe-bas (coupure à la moitié de la bande décimée, gain unité) transposé de -center,
+            # rangé par phase : filters[p] s'applique au bloc de D échantillons p
+            length = taps * decimation
+            n = np.arange(length)
+            lowpass = np.sinc((n - (length - 1) / 2) / decimation) * np.hanning(length)
+            lowpass /= lowpass.sum()
+            mixed = lowpass * np.exp(-2j * np.pi * center * n / sampling_rate)
+            plan['filters'] = mixed.reshape(taps, decimation).astype(self.complex_dtype)
+
+            # Rampe de phase exp(-j.2.pi.center.m.D/fs) des sorties décimées (transposition de l'origine des blocs)
+            outputs = NumSamples // decimation - taps + 1
+            plan['ramp'] = np.exp(-2j * np.pi * center * decimation * np.arange(outputs) / sampling_rate
+                                  ).astype(self.complex_dtype)
+            available = outputs
+            offset = 0.0  # Le signal décimé est centré sur center
+        else:
+            available = NumSamples
+            offset = center  # Le signal garde ses fréquences relatives au LO
+
+        # Taille de FFT : RBW demandée ou environ points bins dans le span, bornée par le signal disponible
+        target = rate / rbw if rbw else self.points * rate / span
+        nfft = int(min(available, 2 ** int(np.ceil(np.log2(max(target, 16))))))
+        hop = max(1, int(nfft * (1 - self.overlap)))
+        segments = 1 + (available - nfft) // hop
+
+        freqs = np.fft.fftshift(np.fft.fftfreq(nfft, 1 / rate)) + center - offset
+        visible = np.flatnonzero(np.abs(freqs - center) <= span / 2)
+        first, last = (visible[0], visible[-1] + 1) if len(visible) else (0, nfft)
+
+        win = np.hanning(nfft).astype(self.real_dtype)
+        plan.update({'nfft': nfft, 'hop': hop, 'segments': segments, 'window': win,
+                     'scale': 1 / (segments * win.sum() ** 2), 'first': first, 'last': last,
+                     'freqs': freqs[first:last], 'rbw': rate / nfft})
+
+        self.key = key
+        self.plan = plan
+        return plan
+
+    def compute(self, Rx, sampling_rate, center, span, rbw=None):
+        """
+        Retourne:
+        - (freqs, power) : fréquences (Hz, relatives au LO) et puissances linéaires des bins du span.
+        """
+        Rx = prec.as_complex(Rx, self.precision)
+        plan = self.get_plan(len(Rx), sampling_rate, center, span, rbw)
+
+        if plan['decimation'] > 1:
+            # Décimation polyphase : sortie m = somme des blocs m..m+taps-1 pondérés par les phases du filtre
+            D = plan['decimation']
+            filters = plan['filters']
+            blocks = Rx[:len(Rx) // D * D].reshape(-1, D)
+            outputs = len(plan['ramp'])
+            signal = blocks[:outputs] @ filters[0]
+            for phase in range(1, len(filters)):
+                signal += blocks[phase:phase + outputs] @ filters[phase]
+            signal *= plan['ramp']
+        else:
+            signal = Rx
+
+        # Segments recouvrants (vue sans copie), fenêtrés et transformés ensemble
+        nfft, segments = plan['nfft'], plan['segments']
+        stride = signal.strides[0]
+        frames = np.lib.stride_tricks.as_strided(signal, shape=(segments, nfft), strides=(plan['hop'] * stride, stride),
+                                                 writeable=False)
+        windowed = frames * plan['window']
+        spectra = fft_cache.fft_plan(windowed.shape, self.complex_dtype)(windowed)
+
+        # Moyenne des puissances, puis seuls les bins du span sont conservés (spectre centré)
+        power = np.square(np.abs(spectra)).sum(axis=0)
+        power = np.fft.fftshift(power)[plan['first']:plan['last']]
+        power *= plan['scale']
+        return plan['freqs'], power
+
+
+class TraceAccumulator:
+    """
+    Traces d'un analyseur de spectre, accumulées en place dans des tableaux float32 préalloués.
+
+    Modes:
+    - 'live' : dernier spectre ;
+    - 'average' : moyenne exponentielle, poids alpha pour le nouveau spectre ;
+    - 'welch' : moyenne glissante des frames derniers spectres (chaque spectre étant lui-même une moyenne de
+      segments recouvrants, cf. SpanSpectrum), tenue par un anneau de spectres et leur somme ;
+    - 'max_hold', 'min_hold' : maximum ou minimum de chaque bin depuis la dernière remise à zéro.
+
+    Les tableaux ne sont réalloués que si le nombre de bins ou le mode change ; reset() (changement de LO,
+    de span ou de fréquence d'échantillonnage) fait repartir la trace du spectre suivant.
+    """
+
+    MODES = ('live', 'average', 'welch', 'max_hold', 'min_hold')
+
+    def __init__(self, mode='live', alpha=0.2, frames=8):
+        self.mode = None
+        self.alpha = alpha  # Poids du nouveau spectre en mode 'average'
+        self.frames = frames  # Nombre de spectres moyennés en mode 'welch'
+        self.trace = None
+        self.count = 0  # Spectres accumulés depuis la dernière remise à zéro
+        self.configure(mode)
+
+    def configure(self, mode=None, alpha=None, frames=None):
+        """ Change le mode ou ses paramètres (la trace repart de zéro). """
+        if mode is not None:
+            if mode not in self.MODES:
+                raise ValueError(f"Mode de trace inconnu: {mode} (valeurs possibles: {list(self.MODES)})")
+            self.mode = mode
+        if alpha is not None:
+            self.alpha = alpha
+        if frames is not None:
+            self.frames = frames
+        self.trace = None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+
+    def _allocate(self, n_bins):
+        """ Tableaux préalloués de la trace (et de l'anneau en mode 'welch'). """
+        self.trace = np.empty(n_bins, dtype=np.float32)
+        self.scratch = np.empty(n_bins, dtype=np.float32)
+        if self.mode == 'welch':
+            self.ring = np.empty((self.frames, n_bins), dtype=np.float32)
+            self.total = np.empty(n_bins, dtype=np.float64)  # Somme de l'anneau, en double précision
+            self.scratch64 = np.empty(n_bins, dtype=np.float64)
+
+    def update(self, power):
+        """
+        Ajoute un spectre.
+
+        Retourne:
+        - La trace (tableau float32 interne, modifié en place par l'appel suivant).
+        """
+        if self.trace is None or len(self.trace) != len(power):
+            self._allocate(len(power))
+            self.count = 0
+
+        trace = self.trace
+        if self.count == 0 or self.mode == 'live':
+            np.copyto(trace, power, casting='unsafe')
+            if self.mode == 'welch':
+                self.ring[0] = trace
+                np.copyto(self.total, trace)
+        elif self.mode == 'average':
+            # Conversions par copyto : les ufuncs à types mélangés alloueraient des tampons de conversion
+            np.copyto(self.scratch, power, casting='unsafe')
+            self.scratch *= self.alpha
+            trace *= 1 - self.alpha
+            trace += self.scratch
+        elif self.mode == 'welch':
+            # Le spectre le plus ancien de l'anneau sort de la somme, le nouveau le remplace
+            slot = self.count % self.frames
+            if self.count >= self.frames:
+                np.copyto(self.scratch64, self.ring[slot])
+                self.total -= self.scratch64
+            np.copyto(self.ring[slot], power, casting='unsafe')
+            np.copyto(self.scratch64, self.ring[slot])
+            self.total += self.scratch64
+            np.multiply(self.total, 1 / min(self.count + 1, self.frames), out=self.scratch64)
+            np.copyto(trace, self.scratch64, casting='unsafe')
+        elif self.mode == 'max_hold':
+            np.copyto(self.scratch, power, casting='unsafe')
+            np.maximum(trace, self.scratch, out=trace)
+        elif self.mode == 'min_hold':
+            np.copyto(self.scratch, power, casting='unsafe')
+            np.minimum(trace, self.scratch, out=trace)
+
+        self.count += 1
+        return trace
+
+
+class SpectrogramRing:
+    """
+    Lignes d'un waterfall (spectrogramme) dans un anneau préalloué.
+
+    Chaque spectre est réduit à columns colonnes (maximum de chaque colonne de la bande visible, cf.
+    MinMaxDecimator). Les spectres arrivés pendant row_interval secondes sont combinés (maximum) dans une
+    même ligne : aucun spectre ajouté n'est ignoré, quel que soit le rythme des lignes. Les lignes sont converties en
+    dB à leur écriture seulement.
+
+    Chaque ligne est écrite deux fois, aux indices k et k + depth d'un tableau de 2 * depth lignes : les depth
+    dernières lignes, de la plus ancienne à la plus récente, forment donc toujours une tranche contiguë, sans
+    np.roll. La ligne suivante remplaçant la plus ancienne de cette tranche, image() n'en retourne pas une
+    vue mais une copie, publiée comme PersistenceHistogram.image() : dans celui de deux tableaux préalloués
+    qui n'est pas en cours d'affichage, sous un verrou partagé avec l'écriture des lignes.
+    """
+
+    def __init__(self, depth=256, columns=512, row_interval=0.0, floor=-150.0):
+        self.depth = depth  # Nombre de lignes affichées
+        self.columns = columns  # Nombre maximal de colonnes d'une ligne
+        self.row_interval = row_interval  # Durée minimale d'une ligne en secondes (0 : une ligne par spectre)
+        self.floor = floor  # Valeur des lignes pas encore écrites (dB)
+        self.decimator = MinMaxDecimator()
+        self.ring = None
+        self.key = None
+        self.rows = 0  # Nombre de lignes écrites (sert aussi de version de l'image)
+        self.extent = None  # Fréquences de la première et de la dernière colonne
+        self.shown = None  # Dernier tableau retourné par image(), en cours d'affichage
+        self.lock = threading.Lock()  # Lignes écrites dans le thread de calcul, image() dans l'interface
+
+    def configure(self, depth=None, columns=None, row_interval=None):
+        """ Change la profondeur, le nombre de colonnes ou le rythme des lignes (l'anneau est réalloué). """
+        if depth is not None:
+            self.depth = depth
+        if columns is not None:
+            self.columns = columns
+        if row_interval is not None:
+            self.row_interval = row_interval
+        self.key = None
+
+    def _allocate(self, width):
+        with self.lock:
+            self.ring = np.full((2 * self.depth, width), self.floor, dtype=np.float32)
+            self.snapshots = (np.empty((self.depth, width), dtype=np.float32),
+                              np.empty((self.depth, width), dtype=np.float32))
+            self.shown = None
+        self.pending = np.empty(width, dtype=np.float32)  # Ligne en cours (maximum des spectres reçus)
+        self.pending_count = 0
+        self.last_row_time = None
+        self.rows = 0
+
+    def add(self, freqs, power, low, high, linear=False, timestamp=None):
+        """
+        Ajoute un spectre (puissances linéaires si linear, sinon en dB) réduit à la bande [low, high].
+
+        Retourne:
+        - True si une nouvelle ligne a été écrite.
+        """
+        x, y = self.decimator.decimate(power, freqs, low, high, self.columns)
+        if self.decimator.plan[2] is not None:
+            x, y = x[1::2], y[1::2]  # Maximum de chaque colonne
+
+        key = (len(y), float(x[0]), float(x[-1]), linear, self.depth)
+        if key != self.key:
+            self._allocate(len(y))
+            self.extent = (float(x[0]), float(x[-1]))
+            self.key = key
+
+        if self.pending_count == 0:
+            np.copyto(self.pending, y, casting='unsafe')
+        else:
+            np.maximum(self.pending, y, out=self.pending, casting='unsafe')
+        self.pending_count += 1
+
+        now = time.monotonic() if timestamp is None else timestamp
+        if self.last_row_time is not None and now - self.last_row_time < self.row_interval:
+            return False
+
+        # Écriture de la ligne aux deux emplacements de l'anneau
+        row = to_dbm(self.pending) if linear else self.pending
+        with self.lock:
+            slot = self.rows % self.depth
+            self.ring[slot] = row
+            self.ring[slot + self.depth] = row
+            self.rows += 1
+        self.pending_count = 0
+        self.last_row_time = now
+        return True
+
+    def image(self):
+        """
+        Copie des depth dernières lignes, de la plus ancienne à la plus récente, None avant le premier spectre.
+        Le tableau retourné n'est plus modifié tant qu'image() n'a pas retourné l'autre.
+        """
+        with self.lock:
+            if self.ring is None:
+                return None
+            buffer = self.snapshots[1] if self.snapshots[0] is self.shown else self.snapshots[0]
+            start = self.rows % self.depth
+            np.copyto(buffer, self.ring[start:start + self.depth])
+            self.shown = buffer
+            return buffer
+
+
+class PersistenceHistogram:
+    """
+    Affichage de persistance : histogramme 2-D (amplitude x fréquence) des points de chaque spectre, avec
+    oubli exponentiel.
+
+    Chaque spectre est réduit à une paire (min, max) par colonne de la bande visible (cf. MinMaxDecimator) ;
+    les points sont répartis en levels niveaux d'amplitude de amplitude_range (dB) et comptés en un appel
+    de np.bincount. L'histogramme est multiplié par decay à chaque spectre : un signal présent à chaque
+    spectre tend vers 1 / (1 - decay) coups par point, un signal intermittent reste visible quelques spectres.
+    Le coût par spectre (réduction, comptage et oubli de levels x columns cases) ne dépend pas de la durée
+    d'accumulation.
+
+    L'histogramme est publié dans l'un de deux tableaux préalloués (image()). pg.ImageItem lit le tableau
+    passé à setImage au moment de le dessiner, donc tant que l'affichage le garde : la publication n'écrit
+    jamais dans le dernier tableau retourné par image(), mais dans l'autre (éventuellement plusieurs fois, si
+    l'affichage n'a pas pris la publication précédente). Un verrou empêche image() de retourner un tableau
+    en cours d'écriture.
+    """
+
+    def __init__(self, columns=512, levels=200, amplitude_range=(-50.0, 50.0), decay=0.9):
+        self.columns = columns  # Nombre maximal de colonnes (fréquence)
+        self.levels = levels  # Nombre de niveaux d'amplitude
+        self.amplitude_range = amplitude_range  # Amplitudes (dB) du bas et du haut de l'histogramme
+        self.decay = decay  # Facteur d'oubli appliqué à chaque spectre
+        self.decimator = MinMaxDecimator()
+        self.key = None
+        self.published = None
+        self.shown = None  # Dernier tableau retourné par image(), en cours d'affichage
+        self.lock = threading.Lock()  # Publication dans le thread de calcul, image() dans l'interface
+        self.frames = 0  # Nombre de spectres accumulés (sert aussi de version de l'image)
+        self.extent = None  # Fréquences de la première et de la dernière colonne
+
+    def configure(self, columns=None, levels=None, amplitude_range=None, decay=None):
+        """ Change les dimensions, la plage d'amplitude ou l'oubli (l'histogramme est effacé). """
+        if columns is not None:
+            self.columns = columns
+        if levels is not None:
+            self.levels = levels
+        if amplitude_range is not None:
+            self.amplitude_range = amplitude_range
+        if decay is not None:
+            self.decay = decay
+        self.key = None
+
+    def saturation(self):
+        """ Nombre de coups d'un point atteint par chaque spectre (régime établi). """
+        return 1 / (1 - self.decay)
+
+    def _allocate(self, width, column_index):
+        self.histogram = np.zeros((self.levels, width), dtype=np.float32)
+        self.buffers = (np.zeros_like(self.histogram), np.zeros_like(self.histogram))
+        self.column_index = column_index  # Colonne de chaque point retourné par le décimateur
+        self.frames = 0
+        with self.lock:
+            self.published = None
+            self.shown = None
+
+    def add(self, freqs, power, low, high, linear=False):
+        """ Ajoute un spectre (puissances linéaires si linear, sinon en dB) réduit à la bande [low, high]. """
+        x, y = self.decimator.decimate(power, freqs, low, high, self.columns)
+        decimated = self.decimator.plan[2] is not None
+        width = len(x) // 2 if decimated else len(x)
+
+        key = (width, float(x[0]), float(x[-1]), self.levels, self.amplitude_range)
+        if key != self.key:
+            column_index = np.repeat(np.arange(width), 2) if decimated else np.arange(width)
+            self._allocate(width, column_index)
+            self.extent = (float(x[0]), float(x[-1]))
+            self.key = key
+
+        # Niveau d'amplitude de chaque point ; les points hors de la plage ne sont pas comptés
+        if linear:
+            y = to_dbm(y)
+        bottom, top = self.amplitude_range
+        level = np.floor((y - bottom) * (self.levels / (top - bottom))).astype(np.intp)
+        valid = (level >= 0) & (level < self.levels)
+        cells = level[valid] * width + self.column_index[valid]
+        hits = np.bincount(cells, minlength=self.levels * width).reshape(self.levels, width)
+
+        self.histogram *= self.decay
+        self.histogram += hits
+
+        # Publication dans le tampon qui n'est pas en cours d'affichage
+        with self.lock:
+            buffer = self.buffers[1] if self.buffers[0] is self.shown else self.buffers[0]
+            np.copyto(buffer, self.histogram)
+            self.published = buffer
+            self.frames += 1
+
+    def image(self):
+        """
+        Dernier histogramme publié (niveaux x colonnes, amplitude croissante), None avant le premier spectre.
+        Le tableau retourné n'est plus modifié tant qu'image() n'a pas retourné l'autre.
+        """
+        with self.lock:
+            self.shown = self.published
+            return self.shown
+
+
+class SpectrumMeasurements:
+    """
+    Mesures sur le dernier spectre : marqueurs, pics, plancher de bruit, puissance de canal, SNR et bande occupée.
+
+    Les bornes utilisées (bins visibles, bins du canal, bins du bruit) sont calculées une seule fois par
+    configuration (axe des fréquences, bande visible, canal) ; chaque spectre ne coûte ensuite que des
+    opérations vectorisées sur les bins visibles :
+    - pics : maxima locaux, puis les peaks plus hauts par np.argpartition, position et niveau affinés par une
+      parabole sur les trois bins du pic (en dB). Au-delà de 2 * peak_blocks bins visibles, les maxima locaux
+      ne sont cherchés que dans les blocs (peak_blocks blocs au total) dont le maximum est parmi les plus hauts
+      (np.maximum.reduceat) : deux pics d'un même bloc ne comptent alors que pour un ;
+    - plancher de bruit : puissance moyenne du bruit par bin, estimée par la médiane des bins hors du canal
+      (insensible aux raies) sur au plus noise_points bins régulièrement espacés, divisée par ln 2 : la
+      puissance d'un bin de bruit suit une loi exponentielle, dont la médiane vaut ln 2 fois la moyenne
+      (-1.59 dB). np.partition suffit, la médiane ne dépendant pas de l'unité. Sur une trace moyennée (cf.
+      TraceAccumulator), la loi se resserre et la correction surestime légèrement le plancher (au plus 1.59 dB) ;
+    - puissance de canal : somme des puissances linéaires des bins du canal, divisée par la bande
+      équivalente de bruit de la fenêtre (enbw, en bins ; 1.5 pour Hanning) ;
+    - SNR : puissance du canal moins le bruit attendu dans le canal, rapportée à ce bruit ;
+    - bande occupée : bins contenant la fraction occupied de la puissance du canal (somme cumulée).
+    Seuls les bins du canal (et trois bins par pic) sont convertis entre dBm et linéaire.
+    """
+
+    def __init__(self, peaks=5, noise_points=4096, enbw=1.5, occupied=0.99, peak_blocks=4096):
+        self.peaks = peaks  # Nombre de pics retournés
+        self.peak_blocks = peak_blocks  # Nombre de blocs de la recherche des pics sur les grands spectres
+        self.noise_points = noise_points  # Nombre maximal de bins utilisés pour la médiane du bruit
+        self.enbw = enbw  # Bande équivalente de bruit de la fenêtre, en bins
+        self.occupied = occupied  # Fraction de la puissance du canal définissant la bande occupée
+        self.key = None
+        self.plan = None
+
+    def get_plan(self, freqs, low, high, channel_center, channel_span):
+        """
+        Bornes pour l'axe freqs (croissant), la bande visible [low, high] et le canal centré sur channel_center
+        de largeur channel_span (unités de freqs).
+
+        Retourne:
+        - (first, last, channel, noise, blocks, step) : bins visibles first:last, tranche des bins du canal,
+          indices des bins du bruit, début de chaque bloc de la recherche des pics (relatif à first, None si la
+          recherche porte sur tous les bins) et écart entre bins.
+        """
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]), float(low), float(high),
+               float(channel_center), float(channel_span))
+        if key != self.key:
+            first = int(np.searchsorted(freqs, low, 'left'))
+            last = max(first + 1, min(len(freqs), int(np.searchsorted(freqs, high, 'right'))))
+            first = min(first, last - 1)
+
+            # Canal limité à la bande visible (au moins un bin)
+            start = int(np.searchsorted(freqs, channel_center - channel_span / 2, 'left'))
+            stop = int(np.searchsorted(freqs, channel_center + channel_span / 2, 'right'))
+            start = min(max(start, first), last - 1)
+            stop = min(max(stop, start + 1), last)
+            channel = slice(start, stop)
+
+            # Bruit : bins visibles hors du canal (tous les bins visibles si le canal les couvre), sous-échantillonnés
+            noise = np.r_[first:start, stop:last]
+            if len(noise) == 0:
+                noise = np.arange(first, last)
+            noise = noise[::max(1, -(-len(noise) // self.noise_points))]
+
+            n_bins = last - first
+            blocks = np.linspace(0, n_bins, self.peak_blocks + 1).astype(np.intp)[:-1] \
+                if n_bins > 2 * self.peak_blocks else None
+
+            step = float(freqs[1] - freqs[0]) if len(freqs) > 1 else 0.0
+            self.plan = (first, last, channel, noise, blocks, step)
+            self.key = key
+        return self.plan
+
+    @staticmethod
+    def marker(freqs, power, freq, linear=False):
+        """ Bin le plus proche de freq (recherche dichotomique) : (fréquence, puissance en dBm). """
+        index = int(np.searchsorted(freqs, freq))
+        if index == len(freqs) or (index > 0 and freq - freqs[index - 1] < freqs[index] - freq):
+            index -= 1
+        level = float(power[index])
+        return float(freqs[index]), float(to_dbm(level)) if linear else level
+
+    def find_peaks(self, freqs, power, first, last, blocks, step, linear=False):
+        """ Les peaks plus hauts maxima locaux de la bande visible : liste de (fréquence, dBm), niveau décroissant. """
+        visible = power[first:last]
+        if len(visible) < 3:
+            return []
+        if blocks is None:
+            center = visible[1:-1]
+            candidates = np.flatnonzero((center >= visible[:-2]) & (center > visible[2:])) + 1
+        else:
+            # Maximum des 2 * peaks blocs les plus hauts, gardé s'il est un maximum local (un pic à cheval sur
+            # deux blocs n'est compté qu'une fois)
+            block_max = np.maximum.reduceat(visible, blocks)
+            count = min(len(blocks), 2 * self.peaks)
+            top = np.argpartition(block_max, len(blocks) - count)[-count:]
+            ends = np.append(blocks[1:], len(visible))
+            candidates = np.array([start + int(np.argmax(visible[start:end]))
+                                   for start, end in zip(blocks[top], ends[top])], dtype=np.intp)
+            candidates = candidates[(candidates > 0) & (candidates < len(visible) - 1)]
+            center = visible[candidates]
+            candidates = candidates[(center >= visible[candidates - 1]) & (center > visible[candidates + 1])]
+        if len(candidates) > self.peaks:
+            top = np.argpartition(visible[candidates], len(candidates) - self.peaks)[-self.peaks:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(visible[candidates])[::-1]]
+
+        # Parabole sur les trois bins de chaque pic, en dB
+        neighbours = visible[candidates[:, None] + np.arange(-1, 2)]
+        if linear:
+            neighbours = to_dbm(neighbours)
+        left, middle, right = neighbours.T
+        curvature = left - 2 * middle + right
+        offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0.0)
+        level = middle - 0.25 * (left - right) * offset
+        frequency = freqs[first + candidates] + offset * step
+        return list(zip(frequency.tolist(), level.tolist()))
+
+    def measure(self, freqs, power, low, high, channel_center, channel_span, linear=False):
+        """
+        Mesures sur un spectre (puissances linéaires si linear, sinon en dBm).
+
+        Retourne:
+        - Un dictionnaire : pics [(fréquence, dBm)], plancher de bruit (dBm par bin), puissance du canal
+          (dBm), SNR (dB) et bande occupée (unité de freqs).
+        """
+        first, last, channel, noise, blocks, step = self.get_plan(freqs, low, high, channel_center, channel_span)
+
+        # Plancher de bruit : médiane des bins de bruit, ramenée à la moyenne (loi exponentielle : médiane = ln 2 . moyenne)
+        samples = power[noise]
+        median = float(np.partition(samples, len(samples) // 2)[len(samples) // 2])
+        noise_floor_mw = (median / P_REF if linear else 10 ** (median / 10)) / np.log(2)
+        noise_floor = float(to_dbm(noise_floor_mw * P_REF))
+
+        # Puissance du canal et bande occupée (puissances linéaires en mW des seuls bins du canal)
+        channel_mw = power[channel] / P_REF if linear else 10 ** (power[channel] / 10)
+        cumulative = np.cumsum(channel_mw)
+        total = float(cumulative[-1])
+        channel_power = total / self.enbw
+        bounds = np.searchsorted(cumulative, total * np.array([(1 - self.occupied) / 2, (1 + self.occupied) / 2]))
+        occupied_bandwidth = (min(int(bounds[1]), len(cumulative) - 1) - int(bounds[0]) + 1) * step
+
+        # SNR : puissance du canal au-dessus du bruit attendu dans le canal
+        noise_power = noise_floor_mw * len(channel_mw) / self.enbw
+        signal_power = max(channel_power - noise_power, 1e-30)
+
+        return {'peaks': self.find_peaks(freqs, power, first, last, blocks, step, linear),
+                'noise_floor_dbm': noise_floor,
+                'channel_power_dbm': 10 * np.log10(channel_power + 1e-30),
+                'snr_db': 10 * np.log10(signal_power / max(noise_power, 1e-30)),
+                'occupied_bandwidth': occupied_bandwidth}
@@ -0,0 +1,159 @@
+import bisect
+import math
+
+import numpy as np
+
+
+class StreamingStats:
+    """
+    Statistiques glissantes sur les window_size dernières valeurs (déphasages en degrés).
+
+    Les valeurs sont conservées dans un anneau numpy préalloué ; chaque ajout met à jour en O(1)
+    les sommes (moyenne, variance), les sommes des cosinus/sinus (moyenne circulaire) et
+    l'histogramme. Changer la taille de la fenêtre ne réalloue l'anneau que si elle dépasse
+    sa capacité (qui double alors).
+    """
+
+    def __init__(self, window_size=1, capacity=1024, bin_deg=0.1):
+        self.window_size = max(1, int(window_size))
+        self.capacity = max(capacity, self.window_size)
+        self.values = np.zeros(self.capacity)  # Anneau des valeurs
+        self.head = 0  # Prochain emplacement d'écriture
+        self.count = 0  # Nombre de valeurs dans la fenêtre
+
+        # Histogramme sur [-180, 180[ (les valeurs sont ramenées dans cet intervalle)
+        self.bin_deg = bin_deg
+        self.bin_edges = np.arange(-180, 180 + bin_deg / 2, bin_deg)
+        self.edges_list = self.bin_edges.tolist()  # Bords des bins pour bisect (cf. _bin)
+        self.histogram_counts = np.zeros(len(self.bin_edges) - 1, dtype=np.int64)
+
+        # Sommes glissantes, recalculées exactement tous les capacity ajouts pour éviter les dérives d'arrondi
+        self.updates = 0
+        self.recompute()
+
+    ####################################################################################################################
+    ############################################# Mise à jour ##########################################################
+    ####################################################################################################################
+
+    def _bin(self, value):
+        """
+        Indice du bin d'une valeur ramenée dans [-180, 180[ (recherche dans les bords des bins). Seule règle
+        utilisée, par push comme par recompute : une valeur sur un bord tombe dans le même bin par les deux chemins.
+        """
+        wrapped = (value + 180) % 360 - 180
+        return min(max(bisect.bisect_right(self.edges_list, wrapped) - 1, 0), len(self.histogram_counts) - 1)
+
+    def _add(self, value, sign):
+        rad = math.radians(value)
+        self.sum += sign * value
+        self.sum_sq += sign * value * value
+        self.sum_cos += sign * math.cos(rad)
+        self.sum_sin += sign * math.sin(rad)
+        self.histogram_counts[self._bin(value)] += sign
+
+    def push(self, value):
+        """ Ajoute une valeur ; la plus ancienne sort de la fenêtre si celle-ci est pleine. """
+        value = float(value)
+        if self.count == self.window_size:
+            self._add(self.values[(self.head - self.count) % self.capacity], -1)
+            self.count -= 1
+
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count += 1
+        self._add(value, +1)
+
+        self.updates += 1
+        if self.updates >= self.capacity:
+            self.recompute()
+
+    def recompute(self):
+        """ Recalcule exactement toutes les sommes à partir des valeurs de la fenêtre. """
+        window = self.window_values()
+        rad = np.deg2rad(window)
+        self.sum = float(np.sum(window))
+        self.sum_sq = float(np.dot(window, window))
+        self.sum_cos = float(np.sum(np.cos(rad)))
+        self.sum_sin = float(np.sum(np.sin(rad)))
+        bins = np.fromiter((self._bin(value) for value in window.tolist()), dtype=np.intp, count=len(window))
+        self.histogram_counts[:] = np.bincount(bins, minlength=len(self.histogram_counts))
+        self.updates = 0
+
+    def resize(self, window_size):
+        """ Change la taille de la fenêtre en conservant les valeurs les plus récentes. """
+        window_size = max(1, int(window_size))
+        if window_size > self.capacity:
+            # Réallocation (rare) : capacité doublée jusqu'à contenir la fenêtre
+            window = self.window_values()
+            while self.capacity < window_size:
+                self.capacity *= 2
+            self.values = np.zeros(self.capacity)
+            self.values[:len(window)] = window
+            self.head = len(window) % self.capacity
+
+        self.window_size = window_size
+        self.count = min(self.count, window_size)
+        self.recompute()
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self.recompute()
+
+    ####################################################################################################################
+    ############################################# Statistiques #########################################################
+    ####################################################################################################################
+
+    def is_full(self):
+        return self.count == self.window_size
+
+    def window_values(self):
+        """ Valeurs de la fenêtre, de la plus ancienne à la plus récente. """
+        indices = np.arange(self.head - self.count, self.head) % self.capacity
+        return self.values[indices]
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def variance(self):
+        if not self.count:
+            return None
+        mean = self.sum / self.count
+        return max(self.sum_sq / self.count - mean * mean, 0.0)
+
+    def std(self):
+        variance = self.variance()
+        return None if variance is None else np.sqrt(variance)
+
+    def circular_mean(self):
+        """ Moyenne circulaire en degrés dans [-180, 180[, correcte autour de ±180°. """
+        if not self.count:
+            return None
+        return float(np.rad2deg(np.arctan2(self.sum_sin, self.sum_cos)))
+
+    def resultant_length(self):
+        """ Longueur du vecteur moyen (1 : phases identiques, 0 : phases uniformément réparties). """
+        if not self.count:
+            return None
+        return float(np.hypot(self.sum_cos, self.sum_sin) / self.count)
+
+    def circular_std(self):
+        """ Écart-type circulaire en degrés. """
+        R = self.resultant_length()
+        if R is None:
+            return None
+        return float(np.rad2deg(np.sqrt(-2 * np.log(max(R, 1e-12)))))
+
+    def histogram(self):
+        """ Histogramme des valeurs de la fenêtre (ramenées dans [-180, 180[) et bords des bins. """
+        return self.histogram_counts.copy(), self.bin_edges
+
+    def percentile(self, q):
+        """ Percentile(s) q (0-100) des valeurs de la fenêtre. """
+        if not self.count:
+            return None
+        return np.percentile(self.window_values(), q)
+
+    def distinct_values(self):
+        """ Valeurs distinctes de la fenêtre et leurs occurrences. """
+        return np.unique(self.window_values(), return_counts=True)